@@ -0,0 +1,108 @@
+# benchmarks/embedding_backends.py
+"""
+Compares the embedding backends on this machine: load time, encode throughput,
+peak RSS and how closely the ONNX vectors match the PyTorch ones.
+
+Each backend runs in its own subprocess so their memory doesn't mix.
+
+    python -m benchmarks.embedding_backends
+    python -m benchmarks.embedding_backends --texts 2000 --batch-size 64 --onnx-file onnx/model_quint8_avx2.onnx
+"""
+import argparse
+import json
+import random
+import resource
+import subprocess
+import sys
+import time
+
+import numpy as np
+
+BACKENDS = ("sentence-transformers", "onnx")
+WORDS = (
+    "fund nav report reconciliation failed timeout jira ticket deploy rollback crm "
+    "sync error dashboard client onboarding pricing invoice export csv salesforce "
+    "permission access token expired retry webhook latency outage resolved"
+).split()
+
+
+def _sample_texts(count: int, seed: int = 7) -> list:
+    """Thread-like texts between ~20 and ~300 words, like real Slack threads."""
+    rng = random.Random(seed)
+    return [
+        f"User 'user{i}' started a thread:\n" + " ".join(rng.choices(WORDS, k=rng.randint(20, 300)))
+        for i in range(count)
+    ]
+
+
+def _peak_rss_mb() -> float:
+    # ru_maxrss is in kilobytes on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def run_backend(backend: str, args) -> dict:
+    """Runs inside the subprocess: loads one backend and times it."""
+    from src.services.embeddings import create_embedding_backend
+
+    texts = _sample_texts(args.texts)
+    rss_before = _peak_rss_mb()
+    started = time.perf_counter()
+    model = create_embedding_backend(backend, args.model, onnx_file=args.onnx_file)
+    load_seconds = time.perf_counter() - started
+
+    model.encode(texts[:args.batch_size], batch_size=args.batch_size) # warm-up
+    started = time.perf_counter()
+    vectors = model.encode(texts, batch_size=args.batch_size)
+    encode_seconds = time.perf_counter() - started
+
+    query_latencies = []
+    for text in texts[:50]:
+        started = time.perf_counter()
+        model.encode(text[:200])
+        query_latencies.append((time.perf_counter() - started) * 1000)
+
+    np.save(args.vectors_path.format(backend=backend), np.asarray(vectors, dtype=np.float32))
+    return {
+        "backend": backend,
+        "load_seconds": round(load_seconds, 2),
+        "texts_per_second": round(len(texts) / encode_seconds, 1),
+        "query_p50_ms": round(float(np.percentile(query_latencies, 50)), 2),
+        "peak_rss_mb": round(_peak_rss_mb(), 1),
+        "rss_added_mb": round(_peak_rss_mb() - rss_before, 1)
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--texts", type=int, default=1000)
+    parser.add_argument("--batch-size", type=int, default=64)
+    parser.add_argument("--model", default="all-MiniLM-L6-v2")
+    parser.add_argument("--onnx-file", default="onnx/model_qint8_avx512.onnx")
+    parser.add_argument("--vectors-path", default="/tmp/embedding_benchmark_{backend}.npy")
+    parser.add_argument("--backend", choices=BACKENDS, help=argparse.SUPPRESS) # set for the per-backend subprocess
+    args = parser.parse_args()
+
+    if args.backend:
+        print(json.dumps(run_backend(args.backend, args)))
+        return
+
+    results = []
+    for backend in BACKENDS:
+        command = [sys.executable, "-m", "benchmarks.embedding_backends", *sys.argv[1:], "--backend", backend]
+        output = subprocess.run(command, capture_output=True, text=True, check=True).stdout
+        results.append(json.loads(output.strip().splitlines()[-1]))
+
+    reference = np.load(args.vectors_path.format(backend=BACKENDS[0]))
+    candidate = np.load(args.vectors_path.format(backend=BACKENDS[1]))
+    cosine = (reference * candidate).sum(axis=1) / (np.linalg.norm(reference, axis=1) * np.linalg.norm(candidate, axis=1))
+
+    columns = ["backend", "load_seconds", "texts_per_second", "query_p50_ms", "peak_rss_mb", "rss_added_mb"]
+    print(" | ".join(columns))
+    for result in results:
+        print(" | ".join(str(result[column]) for column in columns))
+    print(f"\nONNX vs PyTorch cosine similarity: mean {cosine.mean():.4f}, min {cosine.min():.4f}")
+    print("Vectors are interchangeable in one collection when the minimum stays above ~0.98.")
+
+
+if __name__ == "__main__":
+    main()
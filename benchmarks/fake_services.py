@@ -0,0 +1,328 @@
+# benchmarks/fake_services.py
+"""
+Local stand-ins for Slack, Jira and Gemini so the pipeline can be benchmarked
+offline and reproducibly.
+
+- FakeApiServer serves recorded (or generated) Slack Web API and Jira search
+  payloads over HTTP, so the real extractor, HTTP pool and rate limiter run
+  unchanged against SLACK_API_BASE_URL / JIRA_BASE_URL.
+- FakeGenAI has the shape of google.generativeai and returns deterministic
+  answers after a fixed latency; pass it to gemini_client.configure().
+
+Fixtures are one JSON file:
+
+    {
+      "channel_id": "C...",
+      "history": [parent messages, newest first, as conversations.history returns them],
+      "replies": {"<parent ts>": [reply messages, oldest first, without the parent]},
+      "users": [users.info / users.list user objects],
+      "usergroups": [usergroups.list objects],
+      "jira_issues": [{"key": "OPS-1", "fields": {...}} as Jira search returns them]
+    }
+"""
+import asyncio
+import hashlib
+import json
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional
+from urllib.parse import parse_qs, urlsplit
+
+BENCH_CHANNEL_ID = "CBENCH0001"
+# Fixed so generated fixtures (and therefore reports) don't depend on when they were made.
+BASE_TS = 1_735_689_600.0 # 2025-01-01 UTC
+
+PROJECTS = ("OPS", "CRM", "NAV", "DATA", "PAY")
+TOPICS = (
+    "fund nav report reconciliation failed timeout deploy rollback crm sync error dashboard "
+    "client onboarding pricing invoice export csv salesforce permission access token expired "
+    "retry webhook latency outage resolved migration backfill cron schedule alert pager "
+    "duplicate missing stale cache index query slow memory spike login sso certificate"
+).split()
+
+
+# --- Fixtures ---
+
+def _adf(text: str) -> Dict:
+    """Wraps text in the Atlassian Document Format Jira returns for rich-text fields."""
+    return {"type": "doc", "content": [{"type": "paragraph", "content": [{"type": "text", "text": text}]}]}
+
+
+def generate_fixtures(threads: int, seed: int = 7, max_replies: int = 12) -> Dict:
+    """Deterministic Slack channel + Jira payloads with `threads` parent messages."""
+    rng = random.Random(seed)
+    users = [
+        {"id": f"U{i:07d}", "name": f"user{i}", "real_name": f"Bench User {i}", "profile": {"real_name": f"Bench User {i}"}}
+        for i in range(max(20, threads // 50))
+    ]
+    usergroups = [{"id": f"S{i:07d}", "handle": f"team-{name}"} for i, name in enumerate(("oncall", "data", "crm", "payments"))]
+    issue_keys = [f"{rng.choice(PROJECTS)}-{i}" for i in range(1, max(50, threads // 10) + 1)]
+
+    def text() -> str:
+        words = rng.choices(TOPICS, k=rng.randint(8, 60))
+        if rng.random() < 0.3:
+            words.insert(rng.randrange(len(words)), rng.choice(issue_keys))
+        if rng.random() < 0.2:
+            words.insert(0, f"<@{rng.choice(users)['id']}>")
+        if rng.random() < 0.1:
+            words.append(f"<!subteam^{rng.choice(usergroups)['id']}>")
+        if rng.random() < 0.1:
+            words.append(f"https://example.atlassian.net/browse/{rng.choice(issue_keys)}")
+        return " ".join(words)
+
+    history, replies = [], {}
+    for i in range(threads):
+        ts = f"{BASE_TS + i * 60:.6f}"
+        reply_count = rng.choice((0, 0, 1, 2, 3, rng.randint(1, max_replies)))
+        parent = {"type": "message", "ts": ts, "user": rng.choice(users)["id"], "text": text(), "reply_count": reply_count}
+        if reply_count:
+            replies[ts] = [
+                {"type": "message", "ts": f"{float(ts) + j + 1:.6f}", "thread_ts": ts, "user": rng.choice(users)["id"], "text": text()}
+                for j in range(reply_count)
+            ]
+            parent["latest_reply"] = replies[ts][-1]["ts"]
+        history.append(parent)
+    history.reverse() # conversations.history is newest first
+
+    jira_issues = [
+        {
+            "key": key,
+            "fields": {
+                "summary": " ".join(rng.choices(TOPICS, k=6)),
+                "description": _adf(" ".join(rng.choices(TOPICS, k=40))),
+                "comment": {"comments": [
+                    {"author": {"displayName": rng.choice(users)["real_name"]}, "created": "2025-01-02T10:00:00.000+0000", "body": _adf(" ".join(rng.choices(TOPICS, k=20)))}
+                    for _ in range(rng.randint(0, 3))
+                ]},
+                "updated": "2025-01-02T10:00:00.000+0000"
+            }
+        }
+        for key in issue_keys
+    ]
+    return {"channel_id": BENCH_CHANNEL_ID, "history": history, "replies": replies, "users": users, "usergroups": usergroups, "jira_issues": jira_issues}
+
+
+def load_fixtures(path: str, threads: Optional[int] = None) -> Dict:
+    """Loads recorded fixtures, keeping only the newest `threads` parents when given."""
+    with open(path, "r", encoding="utf-8") as f:
+        fixtures = json.load(f)
+    if threads is not None:
+        fixtures["history"] = fixtures["history"][:threads]
+    return fixtures
+
+
+def sample_queries(fixtures: Dict, count: int, seed: int = 11) -> List[str]:
+    """Questions built from the corpus' own vocabulary, a third of them naming a Jira key."""
+    rng = random.Random(seed)
+    keys = [issue["key"] for issue in fixtures["jira_issues"]] or ["OPS-1"]
+    queries = []
+    for i in range(count):
+        words = rng.choices(TOPICS, k=rng.randint(3, 8))
+        if i % 3 == 0:
+            words.append(rng.choice(keys))
+        queries.append(f"why is the {' '.join(words)}?")
+    return queries
+
+
+# --- Slack + Jira ---
+
+class _Handler(BaseHTTPRequestHandler):
+    server: "FakeApiServer"
+
+    def log_message(self, format, *args):
+        pass # keep benchmark output readable
+
+    def _send(self, payload: Dict, status: int = 200):
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _route(self, method: str):
+        url = urlsplit(self.path)
+        params = {key: values[0] for key, values in parse_qs(url.query).items()}
+        length = int(self.headers.get("Content-Length") or 0)
+        body = json.loads(self.rfile.read(length)) if length else {}
+        name = url.path.rsplit("/", 1)[-1]
+        handler = self.server.routes.get((method, name))
+        if handler is None:
+            self._send({"ok": False, "error": "unknown_method"}, status=404)
+            return
+        self.server.count(name)
+        if self.server.latency_seconds:
+            time.sleep(self.server.latency_seconds)
+        self._send(handler(params, body))
+
+    def do_GET(self):
+        self._route("GET")
+
+    def do_POST(self):
+        self._route("POST")
+
+
+def _page(items: List, params: Dict, key: str) -> Dict:
+    """Cursor pagination the way Slack does it: an opaque next_cursor, empty on the last page."""
+    offset = int(params.get("cursor") or 0)
+    limit = int(params.get("limit") or 100)
+    end = offset + limit
+    return {"ok": True, key: items[offset:end], "response_metadata": {"next_cursor": str(end) if end < len(items) else ""}}
+
+
+class FakeApiServer(ThreadingHTTPServer):
+    """
+    Serves the Slack Web API methods the bot calls plus Jira's search endpoint
+    from fixtures, on 127.0.0.1. `latency_ms` is added to every response to
+    stand in for network round trips. Request counts are kept per method.
+    """
+    daemon_threads = True
+
+    def __init__(self, fixtures: Dict, latency_ms: float = 0.0, port: int = 0):
+        super().__init__(("127.0.0.1", port), _Handler)
+        self.latency_seconds = latency_ms / 1000
+        self.requests: Dict[str, int] = {}
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+
+        self.history = fixtures["history"]
+        self.parents = {message["ts"]: message for message in self.history}
+        self.replies = fixtures["replies"]
+        self._history_since: Dict[float, List[Dict]] = {}
+        self.users = {user["id"]: user for user in fixtures["users"]}
+        self.usergroups = fixtures["usergroups"]
+        self.issues = {issue["key"]: issue for issue in fixtures["jira_issues"]}
+        self.posted = 0
+        self.routes = {
+            ("GET", "conversations.history"): self._history,
+            ("GET", "conversations.replies"): self._replies,
+            ("GET", "users.info"): self._user_info,
+            ("GET", "users.list"): lambda params, _: _page(list(self.users.values()), params, "members"),
+            ("GET", "usergroups.list"): lambda params, _: {"ok": True, "usergroups": self.usergroups},
+            ("POST", "chat.postMessage"): self._post_message,
+            ("POST", "jql"): self._jira_search
+        }
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.server_address[1]}"
+
+    def count(self, name: str):
+        with self._lock:
+            self.requests[name] = self.requests.get(name, 0) + 1
+
+    def _history(self, params: Dict, _) -> Dict:
+        oldest = float(params.get("oldest") or 0)
+        # Filtered once per `oldest`, not once per page
+        if oldest not in self._history_since:
+            self._history_since[oldest] = [m for m in self.history if float(m["ts"]) >= oldest]
+        return _page(self._history_since[oldest], params, "messages")
+
+    def _replies(self, params: Dict, _) -> Dict:
+        parent = self.parents.get(params.get("ts"))
+        if parent is None:
+            return {"ok": False, "error": "thread_not_found"}
+        # Like Slack, the parent comes first on the first page
+        return _page([parent, *self.replies.get(parent["ts"], [])], params, "messages")
+
+    def _user_info(self, params: Dict, _) -> Dict:
+        user = self.users.get(params.get("user"))
+        return {"ok": True, "user": user} if user else {"ok": False, "error": "user_not_found"}
+
+    def _post_message(self, _, body: Dict) -> Dict:
+        with self._lock:
+            self.posted += 1
+        return {"ok": True, "channel": body.get("channel"), "ts": f"{time.time():.6f}"}
+
+    def _jira_search(self, _, body: Dict) -> Dict:
+        keys = re.findall(r"[A-Z][A-Z0-9]+-\d+", body.get("jql", ""))
+        fields = body.get("fields") or []
+        issues = [
+            {"key": key, "fields": {name: value for name, value in self.issues[key]["fields"].items() if not fields or name in fields}}
+            for key in keys if key in self.issues
+        ]
+        # Everything fits on one page: the bot asks for maxResults = number of keys
+        return {"issues": issues, "isLast": True}
+
+    def start(self) -> "FakeApiServer":
+        self._thread = threading.Thread(target=self.serve_forever, name="fake-api", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+
+# --- Gemini ---
+
+class _Usage:
+    def __init__(self, prompt: str, text: str):
+        # Roughly four characters per token, like Gemini's own estimate for English
+        self.prompt_token_count = len(prompt) // 4
+        self.candidates_token_count = len(text) // 4
+
+
+class _Chunk:
+    def __init__(self, text: str):
+        self.text = text
+
+
+class _Response:
+    def __init__(self, prompt: str, text: str, chunks: Optional[List[str]] = None, delay_seconds: float = 0.0):
+        self.text = text
+        self.usage_metadata = _Usage(prompt, text)
+        self._chunks = chunks or []
+        self._delay = delay_seconds
+
+    async def __aiter__(self):
+        for chunk in self._chunks:
+            await asyncio.sleep(self._delay)
+            yield _Chunk(chunk)
+
+
+class FakeGenerativeModel:
+    """Answers deterministically from a hash of the prompt after `latency_ms`."""
+    def __init__(self, model_name: str, generation_config: Optional[Dict] = None, latency_ms: float = 0.0, stream_chunks: int = 8):
+        self.model_name = model_name
+        self.json_mode = (generation_config or {}).get("response_mime_type") == "application/json"
+        self.latency_seconds = latency_ms / 1000
+        self.stream_chunks = stream_chunks
+
+    def _answer(self, prompt: str) -> str:
+        rng = random.Random(hashlib.sha256(prompt.encode("utf-8")).hexdigest())
+        summary = " ".join(rng.choices(TOPICS, k=40))
+        if not self.json_mode:
+            return f"Based on similar threads, {summary}. Escalate to @team-oncall if it persists."
+        return json.dumps({"blocks": [
+            {"type": "header", "text": {"type": "plain_text", "text": "Suggested resolution"}},
+            {"type": "section", "text": {"type": "mrkdwn", "text": f"*Likely cause:* {summary}"}},
+            {"type": "divider"},
+            {"type": "context", "elements": [{"type": "mrkdwn", "text": "Escalate to @team-oncall if it persists."}]}
+        ]})
+
+    async def generate_content_async(self, prompt: str, stream: bool = False, request_options: Optional[Dict] = None):
+        text = self._answer(prompt)
+        if not stream:
+            await asyncio.sleep(self.latency_seconds)
+            return _Response(prompt, text)
+        size = max(1, len(text) // self.stream_chunks + 1)
+        chunks = [text[i:i + size] for i in range(0, len(text), size)]
+        # Time to first chunk is a quarter of the latency; the rest is spread over the chunks
+        await asyncio.sleep(self.latency_seconds / 4)
+        return _Response(prompt, text, chunks, delay_seconds=self.latency_seconds * 3 / 4 / len(chunks))
+
+
+class FakeGenAI:
+    """Drop-in for the google.generativeai module as gemini_client uses it."""
+    def __init__(self, latency_ms: float = 0.0):
+        self.latency_ms = latency_ms
+
+    def configure(self, api_key: str = None):
+        pass
+
+    def GenerativeModel(self, model_name: str, generation_config: Optional[Dict] = None) -> FakeGenerativeModel:
+        return FakeGenerativeModel(model_name, generation_config, latency_ms=self.latency_ms)
@@ -0,0 +1,303 @@
+# benchmarks/pipeline.py
+"""
+Offline end-to-end benchmark: extraction throughput and query latency against
+local stand-ins for Slack, Jira and Gemini (see benchmarks/fake_services.py).
+
+For each corpus size, in its own subprocess with its own scratch data dir:
+  1. extract_and_store_knowledge over the fake channel (threads/s, per-batch
+     latency, then an incremental re-run with nothing new),
+  2. KnowledgeStore.query_knowledge, dense and hybrid (p50/p95/p99),
+  3. POST /api/v1/query and /api/v2/query in-process through the ASGI app.
+
+Results go to a JSON report; pass an earlier report as --baseline to flag
+regressions (non-zero exit). The embedding model must already be in the local
+Hugging Face cache (set HF_HUB_OFFLINE=1 to be sure nothing is downloaded).
+
+    python -m benchmarks.pipeline
+    python -m benchmarks.pipeline --sizes 1000 10000 --output bench.json
+    python -m benchmarks.pipeline --baseline bench_main.json --tolerance 0.15
+    python -m benchmarks.pipeline --fixtures recorded_channel.json --slack-latency-ms 40 --llm-latency-ms 1500
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+from typing import Dict, List
+
+import numpy as np
+
+from .fake_services import FakeApiServer, FakeGenAI, generate_fixtures, load_fixtures, sample_queries
+
+# Whether a bigger number is better, by metric name suffix; anything else isn't compared.
+HIGHER_IS_BETTER = ("_per_second",)
+LOWER_IS_BETTER = ("_ms", "_seconds", "_mb", "_errors")
+
+
+def _peak_rss_mb() -> float:
+    # ru_maxrss is in kilobytes on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def _latency_summary(prefix: str, seconds: List[float]) -> Dict:
+    if not seconds:
+        return {}
+    p50, p95, p99 = np.percentile(np.asarray(seconds) * 1000, [50, 95, 99])
+    return {f"{prefix}_p50_ms": round(float(p50), 2), f"{prefix}_p95_ms": round(float(p95), 2), f"{prefix}_p99_ms": round(float(p99), 2)}
+
+
+def configure_scratch_environment(workdir: str):
+    """Fills the required settings with placeholders and keeps every data file under `workdir`. Call before importing src."""
+    for name, value in {
+        "SLACK_BOT_TOKEN": "xoxb-benchmark",
+        "JIRA_BASE_URL": "http://127.0.0.1:9", # discard port; nothing should reach it
+        "JIRA_USER_EMAIL": "bench@example.com",
+        "JIRA_API_TOKEN": "benchmark",
+        "OPENAI_API_KEY": "benchmark",
+        "GOOGLE_API_KEY": "benchmark",
+        "SLACK_ESCALATION_CHANNEL_ID": "CBENCHESC1"
+    }.items():
+        os.environ.setdefault(name, value)
+    os.environ.update({
+        "CHROMA_DB_PATH": os.path.join(workdir, "chroma_db"),
+        "BM25_INDEX_PATH": os.path.join(workdir, "bm25_index.sqlite3"),
+        "EMBEDDING_CACHE_PATH": os.path.join(workdir, "embedding_cache.sqlite3"),
+        "JIRA_CACHE_PATH": os.path.join(workdir, "jira_cache.sqlite3"),
+        "SLACK_DIRECTORY_PATH": os.path.join(workdir, "slack_directory.json"),
+        "SLACK_OUTBOX_PATH": os.path.join(workdir, "slack_outbox.sqlite3"),
+        "SYNC_STATE_DIR": os.path.join(workdir, "sync_state"),
+        "JOBS_DB_PATH": os.path.join(workdir, "extraction_jobs.sqlite3")
+    })
+
+
+def _configure_environment(args, server: FakeApiServer, workdir: str):
+    """Points every setting at the fakes and the scratch dir, before src is imported."""
+    configure_scratch_environment(workdir)
+    os.environ.update({"SLACK_API_BASE_URL": f"{server.url}/api/", "JIRA_BASE_URL": server.url})
+    if not args.answer_cache:
+        # Every query should pay for retrieval and generation
+        os.environ["ANSWER_CACHE_MAX_ENTRIES"] = "0"
+
+
+def _bench_extraction(channel_id: str) -> Dict:
+    from src.services.slack_extractor import extract_and_store_knowledge
+
+    checkpoints = []
+    started = time.perf_counter()
+    stats = extract_and_store_knowledge(
+        channel_id, months_history=0, full_resync=True, oldest_ts=0,
+        on_checkpoint=lambda cursor, stats, progress_ts: checkpoints.append(time.perf_counter())
+    )
+    elapsed = time.perf_counter() - started
+    batch_seconds = np.diff([started, *checkpoints]).tolist()
+
+    # Nothing changed upstream, so this is pure watermark + history-paging cost
+    started = time.perf_counter()
+    extract_and_store_knowledge(channel_id, months_history=0, oldest_ts=0)
+    incremental = time.perf_counter() - started
+    return {
+        "extract_threads": stats["threads_processed"],
+        "extract_seconds": round(elapsed, 3),
+        "extract_threads_per_second": round(stats["threads_processed"] / elapsed, 2),
+        **_latency_summary("extract_batch", batch_seconds),
+        "incremental_extract_seconds": round(incremental, 3)
+    }
+
+
+def _bench_store(queries: List[str], n_results: int) -> Dict:
+    from src.services.knowledge_store import get_knowledge_store
+
+    store = get_knowledge_store()
+    results = {}
+    for mode in ("dense", "hybrid"):
+        for query in queries[:5]: # warm-up
+            store.query_knowledge(query, n_results=n_results, retrieval_mode=mode)
+        seconds = []
+        for query in queries:
+            started = time.perf_counter()
+            store.query_knowledge(query, n_results=n_results, retrieval_mode=mode)
+            seconds.append(time.perf_counter() - started)
+        results.update(_latency_summary(f"store_{mode}", seconds))
+    return results
+
+
+async def _bench_endpoints(queries: Dict[str, List[str]], n_results: int, concurrency: int) -> Dict:
+    import httpx
+    from src.main import app, lifespan
+    from src.services.readiness import readiness
+
+    results = {}
+    async with lifespan(app):
+        while not readiness.ready:
+            await asyncio.sleep(0.05)
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://benchmark", timeout=None) as client:
+            for path, path_queries in queries.items():
+                slots = asyncio.Semaphore(concurrency)
+                seconds, errors = [], 0
+
+                async def call(query: str):
+                    nonlocal errors
+                    async with slots:
+                        started = time.perf_counter()
+                        response = await client.post(path, json={"query": query, "top_k": n_results})
+                        seconds.append(time.perf_counter() - started)
+                        errors += response.status_code != 200
+
+                await call(path_queries[0]) # warm-up
+                seconds, errors = [], 0
+                started = time.perf_counter()
+                await asyncio.gather(*(call(query) for query in path_queries))
+                elapsed = time.perf_counter() - started
+
+                name = path.strip("/").replace("/", "_")
+                results.update(_latency_summary(name, seconds))
+                results[f"{name}_requests_per_second"] = round(len(path_queries) / elapsed, 2)
+                results[f"{name}_errors"] = errors
+    return results
+
+
+def run_size(size: int, args) -> Dict:
+    """Runs inside the subprocess: one corpus size, end to end."""
+    fixtures = load_fixtures(args.fixtures, size) if args.fixtures else generate_fixtures(size, seed=args.seed)
+    server = FakeApiServer(fixtures, latency_ms=args.slack_latency_ms).start()
+    workdir = tempfile.mkdtemp(prefix="synapse-benchmark-")
+    _configure_environment(args, server, workdir)
+
+    from src.config import settings
+    from src.services import slack_rate_limiter
+    from src.services.gemini_client import gemini_client
+
+    if not args.real_rate_limits:
+        # The fakes have no limits; Slack's tiers would turn this into a benchmark of time.sleep.
+        for tier in slack_rate_limiter.TIER_REQUESTS_PER_MINUTE:
+            slack_rate_limiter.TIER_REQUESTS_PER_MINUTE[tier] = 1e9
+    gemini_client.configure(FakeGenAI(latency_ms=args.llm_latency_ms))
+
+    try:
+        result = {
+            "threads": len(fixtures["history"]),
+            "messages": len(fixtures["history"]) + sum(len(replies) for replies in fixtures["replies"].values()),
+            "embedding_backend": settings.EMBEDDING_BACKEND,
+            **_bench_extraction(fixtures["channel_id"]),
+            **_bench_store(sample_queries(fixtures, args.queries, seed=args.seed + 1), args.top_k)
+        }
+        result.update(asyncio.run(_bench_endpoints(
+            {
+                "/api/v1/query": sample_queries(fixtures, args.requests, seed=args.seed + 2),
+                "/api/v2/query": sample_queries(fixtures, args.requests, seed=args.seed + 3)
+            },
+            args.top_k,
+            args.concurrency
+        )))
+        result["fake_api_requests"] = dict(sorted(server.requests.items()))
+        result["peak_rss_mb"] = round(_peak_rss_mb(), 1)
+        return result
+    finally:
+        server.stop()
+
+
+def compare(baseline: Dict, report: Dict, tolerance: float) -> List[Dict]:
+    """Metric-by-metric changes vs. the baseline report, for the sizes both have."""
+    rows = []
+    for size, current in report["results"].items():
+        previous = baseline.get("results", {}).get(size)
+        if not previous:
+            continue
+        for metric, value in current.items():
+            before = previous.get(metric)
+            if not isinstance(value, (int, float)) or not isinstance(before, (int, float)):
+                continue
+            if metric.endswith(HIGHER_IS_BETTER):
+                worse = value < before * (1 - tolerance)
+                better = value > before * (1 + tolerance)
+            elif metric.endswith(LOWER_IS_BETTER):
+                worse = value > before * (1 + tolerance) if before else value > 0
+                better = value < before * (1 - tolerance)
+            else:
+                continue
+            change = (value - before) / before * 100 if before else 0.0
+            rows.append({
+                "size": size, "metric": metric, "baseline": before, "current": value,
+                "change_percent": round(change, 1),
+                "status": "regression" if worse else "improvement" if better else "ok"
+            })
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000], help="corpus sizes, in parent threads")
+    parser.add_argument("--fixtures", help="recorded fixtures JSON (see fake_services.py); generated when omitted")
+    parser.add_argument("--save-fixtures", help="write the generated fixtures for the largest size here and exit")
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--queries", type=int, default=200, help="KnowledgeStore queries per retrieval mode")
+    parser.add_argument("--requests", type=int, default=100, help="requests per query endpoint")
+    parser.add_argument("--concurrency", type=int, default=1, help="concurrent endpoint requests")
+    parser.add_argument("--top-k", type=int, default=5)
+    parser.add_argument("--slack-latency-ms", type=float, default=0, help="added to every fake Slack/Jira response")
+    parser.add_argument("--llm-latency-ms", type=float, default=0, help="fake Gemini latency per call")
+    parser.add_argument("--real-rate-limits", action="store_true", help="keep Slack's per-tier limits")
+    parser.add_argument("--answer-cache", action="store_true", help="leave the semantic answer cache on")
+    parser.add_argument("--output", default="benchmark_report.json")
+    parser.add_argument("--baseline", help="earlier report to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.15, help="relative change that counts as a regression")
+    parser.add_argument("--size", type=int, help=argparse.SUPPRESS) # set for the per-size subprocess
+    args = parser.parse_args()
+
+    if args.size:
+        print(json.dumps(run_size(args.size, args)))
+        return
+    if args.save_fixtures:
+        with open(args.save_fixtures, "w", encoding="utf-8") as f:
+            json.dump(generate_fixtures(max(args.sizes), seed=args.seed), f)
+        print(f"Wrote fixtures for {max(args.sizes)} threads to {args.save_fixtures}.")
+        return
+
+    results = {}
+    for size in args.sizes:
+        print(f"Benchmarking {size} threads...")
+        command = [sys.executable, "-m", "benchmarks.pipeline", *sys.argv[1:], "--size", str(size)]
+        output = subprocess.run(command, capture_output=True, text=True, check=True).stdout
+        results[str(size)] = json.loads(output.strip().splitlines()[-1])
+
+    commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True).stdout.strip()
+    report = {
+        "created_at": datetime.now(timezone.utc).isoformat(),
+        "git_commit": commit or None,
+        "python": platform.python_version(),
+        "machine": f"{platform.machine()} x{os.cpu_count()}",
+        "settings": {key: value for key, value in vars(args).items() if key not in ("sizes", "size", "output", "baseline", "save_fixtures")},
+        "results": results
+    }
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+
+    columns = ["threads", "extract_threads_per_second", "extract_batch_p95_ms", "store_dense_p95_ms", "store_hybrid_p95_ms", "api_v1_query_p95_ms", "api_v2_query_p95_ms", "peak_rss_mb"]
+    print(" | ".join(columns))
+    for result in results.values():
+        print(" | ".join(str(result.get(column)) for column in columns))
+    print(f"\nFull report written to {args.output}.")
+
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+        if baseline.get("settings") != report["settings"]:
+            print("⚠️ The baseline was run with different settings; differences may not be regressions.")
+        rows = [row for row in compare(baseline, report, args.tolerance) if row["status"] != "ok"]
+        for row in rows:
+            print(f"{'❌' if row['status'] == 'regression' else '✅'} {row['size']} threads, {row['metric']}: {row['baseline']} -> {row['current']} ({row['change_percent']:+}%)")
+        regressions = sum(row["status"] == "regression" for row in rows)
+        print(f"\n{regressions} regression(s) beyond {args.tolerance:.0%} vs. {args.baseline} ({baseline.get('git_commit')}).")
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,271 @@
+# benchmarks/synthetic_corpus.py
+"""
+Scaling test for the knowledge store: bulk-loads synthetic threads in the
+shape _process_message emits (mentions resolved, Jira tickets enriched, links
+classified, heavy-tailed reply counts) and reports, at each corpus size,
+ingest rate, on-disk size, RSS and query latency.
+
+The store grows in place from one size to the next, so `--sizes 10000 100000
+1000000` embeds a million threads once, not 1.11 million. Embedding dominates
+ingest; on a CPU-only machine the 1M step takes hours with the PyTorch
+backend (EMBEDDING_BACKEND=onnx is several times faster).
+
+    python -m benchmarks.synthetic_corpus
+    python -m benchmarks.synthetic_corpus --sizes 10000 100000 1000000 --output scaling.json
+    python -m benchmarks.synthetic_corpus --dump 1000 > sample_threads.jsonl
+"""
+import argparse
+import json
+import math
+import os
+import random
+import tempfile
+import time
+from datetime import datetime, timezone
+from itertools import islice
+from typing import Dict, Iterator, List
+
+from .fake_services import BASE_TS, PROJECTS, TOPICS
+from .pipeline import _latency_summary, _peak_rss_mb, configure_scratch_environment
+
+CHANNELS = ("CSYNTH0001", "CSYNTH0002", "CSYNTH0003", "CSYNTH0004")
+PEOPLE = [f"Synthetic User {i}" for i in range(400)]
+TEAMS = ("@team-oncall", "@team-data", "@team-crm", "@team-payments", "@here", "@channel")
+# Product areas and identifiers make the vocabulary sparse the way real channels are,
+# which matters for BM25 posting-list sizes.
+AREAS = [f"{word}-{suffix}" for word in ("fund", "nav", "crm", "ledger", "feed", "report") for suffix in ("sync", "export", "api", "job", "ui")]
+LINKS = (
+    ("https://docs.google.com/document/d/{id}/edit", "google_doc"),
+    ("https://example.atlassian.net/wiki/spaces/OPS/pages/{id}", "confluence"),
+    ("https://example.atlassian.net/browse/{key}", "jira"),
+    ("https://grafana.example.com/d/{id}", "other")
+)
+ISSUES_PER_PROJECT = 20000
+
+
+def _rss_mb() -> float:
+    """Current resident set size (Linux); the peak elsewhere."""
+    try:
+        with open("/proc/self/status", "r", encoding="utf-8") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return _peak_rss_mb()
+
+
+def _disk_mb(path: str) -> float:
+    if os.path.isfile(path):
+        return os.path.getsize(path) / 1024 ** 2
+    return sum(os.path.getsize(os.path.join(root, name)) for root, _, names in os.walk(path) for name in names) / 1024 ** 2
+
+
+def _jira_key(rng: random.Random) -> str:
+    # Zipf-ish: a few incidents are discussed far more than the rest
+    return f"{rng.choice(PROJECTS)}-{int(ISSUES_PER_PROJECT ** rng.random())}"
+
+
+def _message(rng: random.Random, ts: float, is_reply: bool) -> Dict:
+    """One message as _process_message returns it, with replies left empty."""
+    words = rng.choices(TOPICS, k=max(3, int(rng.lognormvariate(3.0, 0.7))))
+    words.insert(rng.randrange(len(words)), rng.choice(AREAS))
+    ticket_ids = sorted({_jira_key(rng) for _ in range(rng.choice((0, 0, 0, 0, 0, 0, 1, 1, 2)))})
+    for ticket_id in ticket_ids:
+        words.insert(rng.randrange(len(words)), ticket_id)
+    if rng.random() < 0.25:
+        words.insert(0, f"@{rng.choice(PEOPLE)}")
+    if rng.random() < 0.08:
+        words.append(rng.choice(TEAMS))
+
+    links = []
+    for _ in range(rng.choice((0, 0, 0, 0, 0, 0, 0, 1, 1, 2))):
+        template, link_type = rng.choice(LINKS)
+        url = template.format(id=rng.randrange(10 ** 8), key=ticket_ids[0] if ticket_ids else _jira_key(rng))
+        words.append(url)
+        links.append({"url": url, "type": link_type})
+
+    files = [{"id": f"F{rng.randrange(10 ** 9):09d}", "name": rng.choice(("screenshot.png", "export.csv", "error.log"))}] if rng.random() < 0.05 else []
+    return {
+        "ts": f"{ts:.6f}",
+        "datetime_utc": datetime.fromtimestamp(ts, timezone.utc).replace(tzinfo=None).isoformat(),
+        "user": rng.choice(PEOPLE),
+        "text": " ".join(words),
+        "links": links,
+        "jira_tickets": [
+            {
+                "ticket_id": ticket_id,
+                "summary": " ".join(rng.choices(TOPICS, k=6)),
+                "description": " ".join(rng.choices(TOPICS, k=rng.randint(10, 60))),
+                "comments": [
+                    {"author": rng.choice(PEOPLE), "created": "2025-01-02T10:00:00.000+0000", "body": " ".join(rng.choices(TOPICS, k=rng.randint(5, 25)))}
+                    for _ in range(rng.randint(0, 3))
+                ]
+            }
+            for ticket_id in ticket_ids
+        ],
+        "files": files,
+        "is_thread_reply": is_reply,
+        "reply_count": 0,
+        "replies": []
+    }
+
+
+def generate_thread(index: int, seed: int = 7) -> Dict:
+    """Thread number `index`; the same (index, seed) always gives the same thread."""
+    rng = random.Random(seed * 1_000_003 + index)
+    # Newest first, one thread a minute going back from BASE_TS
+    ts = BASE_TS - index * 60
+    thread = _message(rng, ts, is_reply=False)
+    # About 40% of threads get no replies; the rest follow a long tail (rarely 100+)
+    reply_count = 0 if rng.random() < 0.4 else min(int(rng.paretovariate(1.2)) + rng.randint(0, 3), 300)
+    thread["reply_count"] = reply_count
+    thread["replies"] = [_message(rng, ts + (i + 1) * rng.randint(5, 600), is_reply=True) for i in range(reply_count)]
+    return thread
+
+
+def generate_threads(count: int, start: int = 0, seed: int = 7) -> Iterator[Dict]:
+    for index in range(start, start + count):
+        yield generate_thread(index, seed)
+
+
+def _batches(threads: Iterator[Dict], batch_size: int) -> Iterator[List[Dict]]:
+    while True:
+        batch = list(islice(threads, batch_size))
+        if not batch:
+            return
+        yield batch
+
+
+def bulk_load(store, threads: Iterator[Dict], batch_size: int) -> Dict:
+    """add_threads in batches, spreading batches across CHANNELS. Returns counts and timings."""
+    stats = {"threads": 0, "messages": 0, "threads_embedded": 0, "load_seconds": 0.0}
+    started = time.perf_counter()
+    for batch_number, batch in enumerate(_batches(threads, batch_size)):
+        stats["threads_embedded"] += store.add_threads(batch, channel_id=CHANNELS[batch_number % len(CHANNELS)])
+        stats["threads"] += len(batch)
+        stats["messages"] += sum(1 + len(thread["replies"]) for thread in batch)
+    stats["load_seconds"] = time.perf_counter() - started
+    return stats
+
+
+def _queries(count: int, seed: int) -> List[str]:
+    rng = random.Random(seed)
+    queries = []
+    for i in range(count):
+        words = rng.choices(TOPICS, k=rng.randint(3, 8)) + [rng.choice(AREAS)]
+        if i % 3 == 0:
+            words.append(_jira_key(rng))
+        queries.append(" ".join(words))
+    return queries
+
+
+def _query_latencies(store, queries: List[str], top_k: int) -> Dict:
+    """p50/p95/p99 per retrieval setup: dense, hybrid, filtered dense, and dense with recency decay."""
+    setups = {
+        "dense": {},
+        "hybrid": {"retrieval_mode": "hybrid"},
+        "filtered": {"filters": {"channel_id": CHANNELS[0], "has_jira_ticket": True}},
+        "recency": {"recency_half_life_days": 30}
+    }
+    results = {}
+    for name, options in setups.items():
+        for query in queries[:5]: # warm-up
+            store.query_knowledge(query, n_results=top_k, **options)
+        seconds = []
+        for query in queries:
+            started = time.perf_counter()
+            store.query_knowledge(query, n_results=top_k, **options)
+            seconds.append(time.perf_counter() - started)
+        results.update(_latency_summary(f"query_{name}", seconds))
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10000, 100000], help="corpus sizes to report at, in threads")
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--queries", type=int, default=100, help="queries per retrieval setup at each size")
+    parser.add_argument("--top-k", type=int, default=5)
+    parser.add_argument("--data-dir", help="where the store is written (a new temp dir by default)")
+    parser.add_argument("--output", default="scaling_report.json")
+    parser.add_argument("--dump", type=int, metavar="N", help="print N threads as JSON lines and exit")
+    args = parser.parse_args()
+
+    if args.dump:
+        for thread in generate_threads(args.dump, seed=args.seed):
+            print(json.dumps(thread, ensure_ascii=False))
+        return
+
+    data_dir = args.data_dir or tempfile.mkdtemp(prefix="synapse-scaling-")
+    os.makedirs(data_dir, exist_ok=True)
+    configure_scratch_environment(data_dir)
+    from src.config import settings
+    from src.services.knowledge_store import get_knowledge_store
+
+    print(f"Writing the store to {data_dir} ({settings.EMBEDDING_BACKEND}, chunking={settings.CHUNKING_MODE}).")
+    started = time.perf_counter()
+    store = get_knowledge_store()
+    store.warm_up()
+    load_seconds = time.perf_counter() - started
+    rss_empty = _rss_mb()
+
+    queries = _queries(args.queries, args.seed + 1)
+    results, loaded = [], 0
+    for size in sorted(set(args.sizes)):
+        print(f"Loading threads {loaded}..{size}...")
+        stats = bulk_load(store, generate_threads(size - loaded, start=loaded, seed=args.seed), settings.INGEST_BATCH_SIZE)
+        loaded = size
+
+        disk = {
+            "chroma_mb": _disk_mb(settings.CHROMA_DB_PATH),
+            "bm25_mb": _disk_mb(settings.BM25_INDEX_PATH),
+            "embedding_cache_mb": _disk_mb(settings.EMBEDDING_CACHE_PATH)
+        }
+        result = {
+            "threads": size,
+            "chunks": store.collection.count(),
+            "ingest_threads_per_second": round(stats["threads"] / stats["load_seconds"], 1),
+            "ingest_messages_per_second": round(stats["messages"] / stats["load_seconds"], 1),
+            **{name: round(mb, 1) for name, mb in disk.items()},
+            "disk_mb": round(sum(disk.values()), 1),
+            "disk_kb_per_thread": round(sum(disk.values()) * 1024 / size, 2),
+            "rss_mb": round(_rss_mb(), 1),
+            "rss_over_empty_mb": round(_rss_mb() - rss_empty, 1),
+            "peak_rss_mb": round(_peak_rss_mb(), 1),
+            **_query_latencies(store, queries, args.top_k)
+        }
+        results.append(result)
+        print(json.dumps(result))
+
+    report = {
+        "created_at": datetime.now(timezone.utc).isoformat(),
+        "embedding_backend": settings.EMBEDDING_BACKEND,
+        "embedding_model": settings.EMBEDDING_MODEL_NAME,
+        "chunking_mode": settings.CHUNKING_MODE,
+        "store_load_seconds": round(load_seconds, 2),
+        "data_dir": data_dir,
+        "results": results
+    }
+    # How p50 latency grows with corpus size: ~0 is flat, ~1 is linear
+    if len(results) > 1:
+        first, last = results[0], results[-1]
+        report["latency_growth_exponents"] = {
+            name: round(math.log(last[f"query_{name}_p50_ms"] / first[f"query_{name}_p50_ms"]) / math.log(last["threads"] / first["threads"]), 3)
+            for name in ("dense", "hybrid", "filtered", "recency")
+            if first[f"query_{name}_p50_ms"] > 0 and last[f"query_{name}_p50_ms"] > 0
+        }
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+
+    columns = ["threads", "chunks", "ingest_threads_per_second", "disk_mb", "rss_mb", "query_dense_p95_ms", "query_hybrid_p95_ms", "query_filtered_p95_ms"]
+    print(" | ".join(columns))
+    for result in results:
+        print(" | ".join(str(result[column]) for column in columns))
+    for name, growth in report.get("latency_growth_exponents", {}).items():
+        print(f"{name} p50 latency grows as corpus^{growth:.2f}")
+    print(f"\nFull report written to {args.output}.")
+
+
+if __name__ == "__main__":
+    main()
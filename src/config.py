@@ -8,18 +8,82 @@ class Settings(BaseSettings):
     # Load variables from a .env file
     model_config = SettingsConfigDict(env_file=".env", env_file_encoding='utf-8', extra='ignore')
 
-    print(f"Settings: {model_config}")
-
     # Slack settings
     SLACK_BOT_TOKEN: str
+    SLACK_API_BASE_URL: str = "https://slack.com/api/" # Point at a local stand-in to run without Slack (benchmarks)
+    SLACK_DIRECTORY_PATH: str = "./slack_directory.json" # Snapshot of users.list + usergroups.list
+    SLACK_DIRECTORY_REFRESH_HOURS: float = 24
 
     # # Jira settings
     JIRA_BASE_URL: str
     JIRA_USER_EMAIL: str
     JIRA_API_TOKEN: str
+    JIRA_CACHE_PATH: str = "./jira_cache.sqlite3" # On-disk ticket cache
+    JIRA_CACHE_TTL_HOURS: float = 24 # After this, cached tickets are revalidated against `updated`
     OPENAI_API_KEY: str
     GOOGLE_API_KEY: str
     SLACK_ESCALATION_CHANNEL_ID: str # Add this line
+    SLACK_OUTBOX_PATH: str = "./slack_outbox.sqlite3" # Persisted queue of outbound escalations
+    SLACK_OUTBOX_DEDUPE_SECONDS: float = 600 # Identical escalations within this window are dropped
+    SLACK_OUTBOX_MAX_ATTEMPTS: int = 8
+    SLACK_OUTBOX_MAX_BACKOFF_SECONDS: float = 300
+    SLACK_OUTBOX_MIN_INTERVAL_SECONDS: float = 1.0 # Pacing between chat.postMessage calls
+
+    # Outbound HTTP settings
+    HTTP_POOL_HOSTS: int = 10 # Distinct hosts kept in the connection pool
+    HTTP_POOL_MAXSIZE_PER_HOST: int = 20 # Keep-alive connections per host
+    HTTP_MAX_RETRIES: int = 3
+
+    # Knowledge store settings
+    CHROMA_DB_PATH: str = "./chroma_db"
+    EMBEDDING_MODEL_NAME: str = "all-MiniLM-L6-v2"
+    EMBEDDING_BACKEND: str = "sentence-transformers" # or "onnx" (ONNX Runtime, no torch needed at serve time)
+    EMBEDDING_ONNX_FILE: str = "onnx/model_qint8_avx512.onnx" # File in the model's Hugging Face repo
+    EMBEDDING_MAX_TOKENS: int = 256 # Word pieces kept per text (matches the model's own limit)
+    EMBEDDING_ONNX_THREADS: int = 0 # ONNX Runtime intra-op threads (0 = one per core)
+    EMBEDDING_CACHE_PATH: str = "./embedding_cache.sqlite3" # Vectors keyed by encoder + text SHA-256
+    EMBEDDING_CACHE_MAX_ENTRIES: int = 200000 # ~1.5 KB each for 384-d vectors; 0 disables the cache
+    EMBEDDING_BATCH_SIZE: int = 64 # Sentences per forward pass of the encoder
+    INGEST_BATCH_SIZE: int = 256 # Threads accumulated before each encode + upsert
+    CHUNKING_MODE: str = "thread" # "thread" (one document per thread) or "window" (overlapping reply windows)
+    CHUNK_MAX_WORDS: int = 180 # Keeps each window under the encoder's 256 word-piece limit
+    CHUNK_PARENT_MAX_WORDS: int = 60 # Parent text repeated at the top of every window
+    CHUNK_REPLY_OVERLAP: int = 1 # Replies shared between consecutive windows
+    CHUNK_QUERY_OVERFETCH: int = 4 # Chunks fetched per requested thread in window mode
+    BM25_INDEX_PATH: str = "./bm25_index.sqlite3" # Keyword index kept next to the Chroma collection
+    HYBRID_CANDIDATES_PER_RESULT: int = 4 # Dense and BM25 candidates fetched per requested thread before fusion
+    RRF_K: int = 60 # Reciprocal rank fusion constant
+    RECENCY_CANDIDATES_PER_RESULT: int = 4 # Candidates re-ranked per requested thread when recency decay is on
+
+    # Gemini client settings
+    GEMINI_MAX_IN_FLIGHT: int = 8 # Concurrent Gemini calls per worker; others wait for a slot
+    GEMINI_TIMEOUT_SECONDS: float = 60.0 # Deadline per call, including queueing and retries
+    GEMINI_MAX_RETRIES: int = 3 # Retries on 429/5xx/timeouts, with jittered backoff
+    GEMINI_HEDGE_AFTER_SECONDS: float = 0 # Send a duplicate request if none answered by then (0 = off)
+    BATCH_QUERY_LLM_CONCURRENCY: int = 4 # Generations one /api/v2/query/batch request may run at once
+
+    # LLM prompt context settings (estimated tokens)
+    LLM_CONTEXT_TOKEN_BUDGET: int = 6000 # Total for all retrieved threads in one prompt
+    LLM_CONTEXT_DOC_TOKEN_BUDGET: int = 1500 # Per retrieved thread
+
+    # Semantic answer cache settings
+    ANSWER_CACHE_SIMILARITY: float = 0.95 # Minimum cosine similarity to reuse an answer
+    ANSWER_CACHE_TTL_SECONDS: float = 3600
+    ANSWER_CACHE_MAX_ENTRIES: int = 1000
+
+    # Extraction settings
+    SLACK_REPLY_FETCH_WORKERS: int = 8 # Concurrent conversations.replies requests
+    SYNC_STATE_DIR: str = "./sync_state" # Per-channel incremental sync watermarks
+    JOBS_DB_PATH: str = "./extraction_jobs.sqlite3" # Background extraction job table
+    EXTRACTION_JOB_WORKERS: int = 1 # Extraction jobs run at the same time
+    EXTRACTION_JOB_STALE_SECONDS: int = 1800 # A 'running' job this long without a checkpoint is treated as orphaned by a crashed worker
+    EXTRACTION_JOB_SWEEP_SECONDS: float = 300 # How often to look for jobs orphaned by workers that exited
+
+    # Startup settings
+    COLD_START_BUDGET_SECONDS: float = 30.0 # Warn when a worker takes longer than this to become ready
+
+    # Observability settings
+    SERVER_TIMING_ENABLED: bool = False # Add a Server-Timing header with per-stage latencies to API responses
 
 # Create a single, importable instance of the settings
 settings = Settings()
\ No newline at end of file
@@ -1,25 +1,107 @@
 # src/main.py
-from fastapi import FastAPI, HTTPException
-from .models import ExtractionRequest, ExtractionResponse, QueryRequest, QueryResponse
+import asyncio
+import json
+import re
+import time
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import JSONResponse, Response, StreamingResponse
+from prometheus_client import CONTENT_TYPE_LATEST, generate_latest
+from typing import List
+from .services.readiness import readiness # First, so its clock covers the imports below
+from .config import settings
+from .models import ExtractionRequest, ExtractionResponse, ExtractionJob, QueryRequest, QueryResponse, BatchQueryRequest, BatchQueryItem, BatchQueryResponse
 # from .services.slack_extractor import extract_channel_knowledge
-from .services.slack_extractor import extract_and_store_knowledge
-from pydantic import BaseModel
-from .services.knowledge_store import KnowledgeStore
-from .services.llm_handler import generate_answer, generate_answer_v2 # <-- Import the new function
+from .services.extraction_jobs import init_job_store, submit_job, get_job, list_jobs, resume_incomplete_jobs, shutdown_jobs
+from .services.knowledge_store import get_knowledge_store
+from .services.llm_handler import generate_answer, generate_answer_v2, stream_answer, stream_answer_v2, GENERATION_ERROR_MESSAGE
+from .services.answer_cache import answer_cache
+from .services.context_builder import build_context
 from fastapi.middleware.cors import CORSMiddleware # Import the middleware
-from .services.slack_poster import post_escalation_to_slack, post_escalation_to_slack_v2
+from .services.slack_poster import build_escalation_payload, build_escalation_payload_v2
+from .services.slack_outbox import slack_outbox
+from .services.http_client import close_http_clients
+from .services.gemini_client import gemini_client
+from .services.user_directory import load_directory
+from .services.metrics import span, start_server_timing, format_server_timing
+
+
+async def _load_resources():
+    """
+    Loads the heavy resources in the background so the worker starts serving
+    /healthz immediately; /readyz turns 200 once the required ones are loaded.
+    """
+    try:
+        with readiness.stage("knowledge_store"):
+            store = await run_in_threadpool(get_knowledge_store)
+            # Re-extracted threads invalidate any cached answer built from them.
+            store.add_upsert_listener(answer_cache.invalidate_threads)
+            if store.needs_reindex:
+                # Vectors from another model give meaningless neighbours: stay unready until they're replaced
+                await run_in_threadpool(store.reindex)
+            await run_in_threadpool(store.warm_up)
+        with readiness.stage("gemini_client"):
+            await run_in_threadpool(gemini_client.configure)
+    except Exception as e:
+        print(f"❌ Startup failed; the worker will stay unready: {e}")
+        return
+    readiness.finish(settings.COLD_START_BUDGET_SECONDS)
+
+    # Only used to suggest on-call groups in prompts, so Slack being down must not block readiness.
+    try:
+        with readiness.stage("user_directory", required=False):
+            await run_in_threadpool(load_directory, {"Authorization": f"Bearer {settings.SLACK_BOT_TOKEN}"})
+    except Exception as e:
+        print(f"⚠️ Could not load the Slack user directory at startup: {e}")
+
+
+async def _sweep_orphaned_jobs():
+    """Periodically resumes jobs whose worker exited after this process started."""
+    while True:
+        await asyncio.sleep(settings.EXTRACTION_JOB_SWEEP_SECONDS)
+        try:
+            resumed = await run_in_threadpool(resume_incomplete_jobs)
+            if resumed:
+                print(f"Resumed {resumed} orphaned extraction job(s).")
+        except Exception as e:
+            print(f"⚠️ Extraction job sweep failed: {e}")
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """
+    Starts the cheap local services, then loads the embedding model, Chroma
+    client, Gemini SDK and Slack directory in the background.
+    """
+    readiness.record("imports", time.monotonic() - readiness.started_at)
+    for name in ("knowledge_store", "gemini_client"):
+        readiness.expect(name)
+    # Escalations are posted by a background worker; leftovers from the last run go first.
+    slack_outbox.start()
+    init_job_store()
+    # Before serving, so a job submitted now can't race its own resume (runs also claim their row).
+    resumed = resume_incomplete_jobs()
+    if resumed:
+        print(f"Resumed {resumed} unfinished extraction job(s).")
+    sweeper = asyncio.create_task(_sweep_orphaned_jobs())
+    loader = asyncio.create_task(_load_resources())
+    yield
+    # Running jobs stop at their next checkpoint and pick up from there on the next start.
+    sweeper.cancel()
+    await loader
+    await run_in_threadpool(shutdown_jobs)
+    await slack_outbox.stop()
+    await close_http_clients()
 
 
 app = FastAPI(
     title="Knowledge Base Extractor API",
     description="An API to extract conversational knowledge from Slack channels and enrich it with Jira data.",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan
 )
 
-class ExtractionStatusResponse(BaseModel):
-    status: str
-    threads_processed: int
-    message: str
 # This defines the list of "origins" (frontends) that are allowed to talk to your API.
 origins = [
     "http://localhost",
@@ -37,76 +119,170 @@ app.add_middleware(
     allow_headers=["*"], # Allow all headers
 )
 
+if settings.SERVER_TIMING_ENABLED:
+    @app.middleware("http")
+    async def server_timing(request: Request, call_next):
+        """Reports each pipeline stage of the request in a Server-Timing header."""
+        timings = start_server_timing()
+        response = await call_next(request)
+        if timings:
+            response.headers["Server-Timing"] = format_server_timing(timings)
+        return response
+
+
+def _ready_store():
+    """Returns the knowledge store, or answers 503 while the worker is still loading it."""
+    if not readiness.ready:
+        raise HTTPException(status_code=503, detail="The service is still starting up", headers={"Retry-After": "5"})
+    return get_knowledge_store()
+
+
+@app.get("/healthz")
+def healthz():
+    """Liveness: the process is up and serving requests."""
+    return {"status": "ok"}
+
+
+@app.get("/readyz")
+def readyz():
+    """Readiness: 200 once the embedding model, vector store and LLM client are loaded."""
+    snapshot = {**readiness.snapshot(), "cold_start_budget_seconds": settings.COLD_START_BUDGET_SECONDS}
+    if not snapshot["ready"]:
+        return JSONResponse(status_code=503, content=snapshot)
+    return snapshot
+
+
+@app.get("/metrics")
+def metrics():
+    """Prometheus scrape endpoint: per-stage latencies, external calls, retries, rate limits, caches and tokens."""
+    return Response(generate_latest(), media_type=CONTENT_TYPE_LATEST)
+
 
-@app.post("/api/v1/extract", response_model=ExtractionStatusResponse)
-async def run_extraction(request: ExtractionRequest):
+@app.post("/api/v1/extract", response_model=ExtractionJob, status_code=202)
+def run_extraction(request: ExtractionRequest):
     """
-    Triggers the extraction process for a given Slack channel.
-    This is a long-running process and may time out on serverless platforms.
+    Queues an extraction job for a given Slack channel and returns immediately.
+    Poll /api/v1/extract/jobs/{job_id} for progress, throughput and ETA.
     """
     try:
-        print(f"Starting extraction for channel: {request.channel_id}")
-        # Run the blocking I/O operation in a thread pool to avoid blocking the event loop
-        import asyncio
-        result = await asyncio.get_event_loop().run_in_executor(
-            None,
-            extract_and_store_knowledge,
-            request.channel_id,
-            request.months_history
-        )
-
-        return result
+        print(f"Queueing extraction for channel: {request.channel_id}")
+        return submit_job(request.channel_id, request.months_history, request.full_resync)
     except Exception as e:
-        # Catch-all for unexpected errors during the process
+        # Catch-all for unexpected errors while recording the job
         print(f"An unexpected error occurred: {e}")
         raise HTTPException(
             status_code=500,
             detail=f"An internal error occurred: {str(e)}"
         )
 
+@app.get("/api/v1/extract/jobs", response_model=List[ExtractionJob])
+def list_extraction_jobs(limit: int = 50):
+    """Lists the most recent extraction jobs."""
+    return list_jobs(limit)
+
+@app.get("/api/v1/extract/jobs/{job_id}", response_model=ExtractionJob)
+def get_extraction_job(job_id: str):
+    """Returns the progress of a single extraction job."""
+    job = get_job(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail=f"Extraction job {job_id} not found")
+    return job
+
+def _retrieve(store, request: QueryRequest, query_vector: list) -> dict:
+    """Runs the retrieval configured on the request (blocking; call it from the threadpool)."""
+    return store.query_knowledge(
+        query_text=request.query,
+        n_results=request.top_k,
+        query_vector=query_vector,
+        retrieval_mode=request.retrieval_mode,
+        filters=request.filters(),
+        recency_half_life_days=request.recency_half_life_days
+    )
+
+def _cache_namespace(version: str, request: QueryRequest) -> str:
+    """Cached answers are only reused for requests that would retrieve the same way."""
+    return f"{version}:{request.model_dump_json(exclude={'query'})}"
+
+def _format_sources(search_results: dict) -> list:
+    """Formats the sources for better readability."""
+    return [
+        {
+            "document": doc,
+            "metadata": meta,
+            "distance": dist
+        }
+        for doc, meta, dist in zip(search_results['documents'][0], search_results['metadatas'][0], search_results['distances'][0])
+    ]
+
+def _on_call_team(answer: str) -> str:
+    on_call_team_match = re.search(r'@[\w-]+', answer)
+    return on_call_team_match.group(0) if on_call_team_match else "@on-call-team" # Fallback
+
+def _summarize_blocks(answer_json: dict) -> str:
+    """Joins the text from all the 'section' blocks for a clean summary."""
+    summary_text = "\n\n".join(
+        block.get("text", {}).get("text", "")
+        for block in answer_json.get("blocks", [])
+        if block.get("type") == "section"
+    ).strip()
+    return summary_text or "Analysis was posted to Slack, but a text summary could not be generated."
+
+def _sse(event: str, data) -> str:
+    """Formats one server-sent event."""
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+SSE_HEADERS = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+
+NO_RESULTS_ANSWER = "I couldn't find any relevant information in the knowledge base."
+
 @app.post("/api/v1/query", response_model=QueryResponse)
-def query_knowledge_base(request: QueryRequest):
+async def query_knowledge_base(request: QueryRequest):
     """
     Performs the full RAG pipeline: retrieves context and generates an answer.
     """
+    store = _ready_store()
     try:
-        # 1. Retrieve (The part that's already working)
-        store = KnowledgeStore()
-        search_results = store.query_knowledge(
-            query_text=request.query, 
-            n_results=request.top_k
-        )
+        # Encoding and the Chroma lookup are CPU-bound, so they run off the event loop.
+        with span("query_v1", "embed"):
+            query_vector = await run_in_threadpool(store.embed_query, request.query)
 
-        if not search_results or not search_results.get('documents') or not search_results['documents'][0]:
-             return QueryResponse(answer="I couldn't find any relevant information in the knowledge base.", sources=[])
-        
-        # 2. Generate (The new step)
-        answer = generate_answer(request.query, search_results.get('documents', []))
+        # 0. Serve repeated and near-duplicate questions from the answer cache
+        cache_namespace = _cache_namespace("v1", request)
+        with span("query_v1", "answer_cache"):
+            cached = answer_cache.lookup(cache_namespace, query_vector)
+        context_stats = None
+        if cached:
+            answer, sources = cached["answer"], cached["sources"]
+        else:
+            # 1. Retrieve (The part that's already working)
+            with span("query_v1", "retrieve"):
+                search_results = await run_in_threadpool(_retrieve, store, request, query_vector)
+
+            if not search_results or not search_results.get('documents') or not search_results['documents'][0]:
+                 return QueryResponse(answer=NO_RESULTS_ANSWER, sources=[])
+
+            # 2. Generate (The new step) from a token-budgeted, de-duplicated context
+            with span("query_v1", "build_context"):
+                context_docs, context_stats = build_context(search_results['documents'][0])
+            with span("query_v1", "generate"):
+                answer = await generate_answer(request.query, context_docs)
+
+            # 3. Respond
+            sources = _format_sources(search_results)
+            if answer != GENERATION_ERROR_MESSAGE:
+                answer_cache.store(cache_namespace, query_vector, {"answer": answer, "sources": sources}, search_results['ids'][0])
 
         # print(answer)
-        import re
-        # 3. Respond
-        # We can format the sources for better readability
-        sources = [
-            {
-                "document": doc,
-                "metadata": meta,
-                "distance": dist
-            }
-            for doc, meta, dist in zip(search_results['documents'][0], search_results['metadatas'][0], search_results['distances'][0])
-        ]
-    
-        on_call_team_match = re.search(r'@[\w-]+', answer)
-        on_call_team = on_call_team_match.group(0) if on_call_team_match else "@on-call-team" # Fallback
-        
-        post_escalation_to_slack(
-            original_query=request.query,
-            llm_analysis=answer,
-            on_call_team=on_call_team,
-            sources=sources
-        )
+        # Queued (a local SQLite write, off the event loop): the response doesn't wait on chat.postMessage.
+        with span("query_v1", "enqueue_escalation"):
+            await run_in_threadpool(slack_outbox.enqueue, build_escalation_payload(
+                original_query=request.query,
+                llm_analysis=answer,
+                on_call_team=_on_call_team(answer),
+                sources=sources
+            ))
 
-        return QueryResponse(answer=answer, sources=sources)
+        return QueryResponse(answer=answer, sources=sources, cached=bool(cached), context_stats=context_stats)
         
     except Exception as e:
         print(f"An unexpected error occurred during query: {e}")
@@ -114,57 +290,280 @@ def query_knowledge_base(request: QueryRequest):
 
 
 @app.post("/api/v2/query", response_model=QueryResponse)
-def query_knowledge_base(request: QueryRequest):
+async def query_knowledge_base(request: QueryRequest):
     """
-    Performs RAG, generates a Slack Block Kit message, posts it automatically,
+    Performs RAG, generates a Slack Block Kit message, queues it for posting,
     and returns a text summary to the caller.
     """
+    store = _ready_store()
     try:
-        # 1. Retrieve context
-        store = KnowledgeStore()
-        search_results = store.query_knowledge(
-            query_text=request.query, 
-            n_results=request.top_k
-        )
+        # Encoding and the Chroma lookup are CPU-bound, so they run off the event loop.
+        with span("query_v2", "embed"):
+            query_vector = await run_in_threadpool(store.embed_query, request.query)
 
-        if not search_results or not search_results.get('documents') or not search_results['documents'][0]:
-             return QueryResponse(answer="I couldn't find any relevant information in the knowledge base.", sources=[])
-        
-        # 2. Generate the Block Kit JSON from the LLM
-        # The 'answer_json' variable will be a dictionary like {"blocks": [...]}
-        answer_json = generate_answer_v2(request.query, search_results.get('documents', []))
+        # 0. Serve repeated and near-duplicate questions from the answer cache
+        cache_namespace = _cache_namespace("v2", request)
+        with span("query_v2", "answer_cache"):
+            cached = answer_cache.lookup(cache_namespace, query_vector)
+        context_stats = None
+        if cached:
+            answer_json, sources = cached["answer"], cached["sources"]
+        else:
+            # 1. Retrieve context
+            with span("query_v2", "retrieve"):
+                search_results = await run_in_threadpool(_retrieve, store, request, query_vector)
 
-        print(answer_json)
+            if not search_results or not search_results.get('documents') or not search_results['documents'][0]:
+                 return QueryResponse(answer=NO_RESULTS_ANSWER, sources=[])
 
-        # 3. Post the rich message directly to Slack
-        post_escalation_to_slack_v2(
-            llm_json_response=answer_json,
-            original_query=request.query
-        )
+            # 2. Generate the Block Kit JSON from the LLM
+            # The 'answer_json' variable will be a dictionary like {"blocks": [...]}
+            with span("query_v2", "build_context"):
+                context_docs, context_stats = build_context(search_results['documents'][0])
+            with span("query_v2", "generate"):
+                answer_json = await generate_answer_v2(request.query, context_docs)
+
+            print(answer_json)
+
+            sources = _format_sources(search_results)
+            if not answer_json.get("error"):
+                answer_cache.store(cache_namespace, query_vector, {"answer": answer_json, "sources": sources}, search_results['ids'][0])
+
+        # 3. Queue the rich message for Slack; the response doesn't wait on chat.postMessage.
+        with span("query_v2", "enqueue_escalation"):
+            await run_in_threadpool(slack_outbox.enqueue, build_escalation_payload_v2(
+                llm_json_response=answer_json,
+                original_query=request.query
+            ))
 
         # 4. Create a simple text summary for the API response
-        # This joins the text from all the 'section' blocks for a clean summary.
-        summary_text = "\n\n".join(
-            block.get("text", {}).get("text", "")
-            for block in answer_json.get("blocks", [])
-            if block.get("type") == "section"
-        ).strip()
-        
-        if not summary_text:
-            summary_text = "Analysis was posted to Slack, but a text summary could not be generated."
-
-        # 5. Format sources and return the final response
-        sources = [
-            {
-                "document": doc,
-                "metadata": meta,
-                "distance": dist
-            }
-            for doc, meta, dist in zip(search_results['documents'][0], search_results['metadatas'][0], search_results['distances'][0])
-        ]
+        summary_text = _summarize_blocks(answer_json)
 
-        return QueryResponse(answer=summary_text, sources=sources)
+        # 5. Return the final response
+        return QueryResponse(answer=summary_text, sources=sources, cached=bool(cached), context_stats=context_stats)
         
     except Exception as e:
         print(f"An unexpected error occurred during query: {e}")
-        raise HTTPException(status_code=500, detail="Internal server error")
\ No newline at end of file
+        raise HTTPException(status_code=500, detail="Internal server error")
+
+
+@app.post("/api/v2/query/batch", response_model=BatchQueryResponse)
+async def batch_query_knowledge_base(request: BatchQueryRequest):
+    """
+    Answers many questions at once, as /api/v2/query would: all questions are
+    embedded in one batch and retrieved with one Chroma query, and Block Kit
+    generation fans out with at most BATCH_QUERY_LLM_CONCURRENCY calls at a time.
+    Escalations are only queued when post_escalations is set.
+    """
+    store = _ready_store()
+    started = time.perf_counter()
+    items = [QueryRequest(query=query, **request.model_dump(exclude={"queries", "post_escalations"})) for query in request.queries]
+    try:
+        with span("query_batch", "embed"):
+            query_vectors = await run_in_threadpool(store.embed_texts, request.queries)
+        embedded = time.perf_counter()
+
+        # 0. Cached answers first; only the misses are retrieved and generated
+        namespaces = [_cache_namespace("v2", item) for item in items]
+        with span("query_batch", "answer_cache"):
+            cached = [answer_cache.lookup(namespace, vector) for namespace, vector in zip(namespaces, query_vectors)]
+        misses = [i for i, hit in enumerate(cached) if not hit]
+
+        # 1. One retrieval call for every miss
+        search_results = {}
+        if misses:
+            with span("query_batch", "retrieve"):
+                results = await run_in_threadpool(
+                    store.query_knowledge_many,
+                    [request.queries[i] for i in misses],
+                    n_results=request.top_k,
+                    query_vectors=[query_vectors[i] for i in misses],
+                    retrieval_mode=request.retrieval_mode,
+                    filters=request.filters(),
+                    recency_half_life_days=request.recency_half_life_days
+                )
+            search_results = dict(zip(misses, results))
+        retrieved = time.perf_counter()
+    except Exception as e:
+        print(f"An unexpected error occurred during batch query: {e}")
+        raise HTTPException(status_code=500, detail="Internal server error")
+
+    # Threads shared by several questions are fitted once, by thread ID, and reused in each prompt
+    thread_ids = [thread_id for result in search_results.values() for thread_id in result['ids'][0]]
+    fitted_threads = {}
+    llm_slots = asyncio.Semaphore(settings.BATCH_QUERY_LLM_CONCURRENCY)
+
+    async def answer(i: int) -> BatchQueryItem:
+        item = items[i]
+        item_started = time.perf_counter()
+        if cached[i]:
+            answer_json, sources = cached[i]["answer"], cached[i]["sources"]
+            return BatchQueryItem(query=item.query, answer=_summarize_blocks(answer_json), blocks=answer_json.get("blocks", []), sources=sources, cached=True)
+
+        result = search_results[i]
+        if not result['documents'][0]:
+            return BatchQueryItem(query=item.query, answer=NO_RESULTS_ANSWER, sources=[])
+
+        with span("query_batch", "build_context"):
+            context_docs, context_stats = build_context(result['documents'][0], thread_ids=result['ids'][0], fitted_threads=fitted_threads)
+        context_built = time.perf_counter()
+
+        async with llm_slots:
+            with span("query_batch", "generate"):
+                answer_json = await generate_answer_v2(item.query, context_docs)
+        generated = time.perf_counter()
+
+        sources = _format_sources(result)
+        if not answer_json.get("error"):
+            answer_cache.store(namespaces[i], query_vectors[i], {"answer": answer_json, "sources": sources}, result['ids'][0])
+            if request.post_escalations:
+                await run_in_threadpool(slack_outbox.enqueue, build_escalation_payload_v2(llm_json_response=answer_json, original_query=item.query))
+
+        return BatchQueryItem(
+            query=item.query,
+            answer=_summarize_blocks(answer_json),
+            blocks=answer_json.get("blocks", []),
+            sources=sources,
+            context_stats=context_stats,
+            error="generation_failed" if answer_json.get("error") else None,
+            timings_ms={
+                "context_ms": round((context_built - item_started) * 1000, 1),
+                "generate_ms": round((generated - context_built) * 1000, 1)
+            }
+        )
+
+    async def answer_isolated(i: int) -> BatchQueryItem:
+        # One failing question must not fail the rest of the batch
+        try:
+            return await answer(i)
+        except Exception as e:
+            print(f"❌ Batch item {i} failed: {e}")
+            return BatchQueryItem(query=items[i].query, answer="An unexpected error occurred while answering this question.", sources=[], error="internal_error")
+
+    results = await asyncio.gather(*(answer_isolated(i) for i in range(len(items))))
+    return BatchQueryResponse(
+        results=results,
+        timings_ms={
+            "embed_ms": round((embedded - started) * 1000, 1),
+            "retrieve_ms": round((retrieved - embedded) * 1000, 1),
+            "total_ms": round((time.perf_counter() - started) * 1000, 1)
+        },
+        unique_context_threads=len(set(thread_ids)),
+        context_thread_references=len(thread_ids)
+    )
+
+
+@app.post("/api/v1/query/stream")
+async def stream_query_knowledge_base(request: QueryRequest):
+    """
+    Streaming variant of /api/v1/query over server-sent events: a 'sources'
+    event, then 'token' events as Gemini generates the answer, then 'done'.
+    """
+    store = _ready_store()
+
+    async def event_stream():
+        try:
+            with span("query_v1_stream", "embed"):
+                query_vector = await run_in_threadpool(store.embed_query, request.query)
+
+            cache_namespace = _cache_namespace("v1", request)
+            with span("query_v1_stream", "answer_cache"):
+                cached = answer_cache.lookup(cache_namespace, query_vector)
+            context_stats = None
+            if cached:
+                answer, sources = cached["answer"], cached["sources"]
+                yield _sse("sources", sources)
+                yield _sse("token", {"text": answer})
+            else:
+                with span("query_v1_stream", "retrieve"):
+                    search_results = await run_in_threadpool(_retrieve, store, request, query_vector)
+                if not search_results or not search_results.get('documents') or not search_results['documents'][0]:
+                    yield _sse("token", {"text": NO_RESULTS_ANSWER})
+                    yield _sse("done", {"cached": False})
+                    return
+
+                sources = _format_sources(search_results)
+                yield _sse("sources", sources)
+
+                parts = []
+                with span("query_v1_stream", "build_context"):
+                    context_docs, context_stats = build_context(search_results['documents'][0])
+                # Includes the time the client takes to read each event
+                with span("query_v1_stream", "generate"):
+                    async for text in stream_answer(request.query, context_docs):
+                        parts.append(text)
+                        yield _sse("token", {"text": text})
+                answer = "".join(parts)
+                # Like the non-stream path, never cache an empty or failed answer;
+                # a stream that broke off raises before reaching this point.
+                if answer.strip() and answer != GENERATION_ERROR_MESSAGE:
+                    answer_cache.store(cache_namespace, query_vector, {"answer": answer, "sources": sources}, search_results['ids'][0])
+
+            await run_in_threadpool(slack_outbox.enqueue, build_escalation_payload(
+                original_query=request.query,
+                llm_analysis=answer,
+                on_call_team=_on_call_team(answer),
+                sources=sources
+            ))
+            yield _sse("done", {"cached": bool(cached), "context_stats": context_stats})
+        except Exception as e:
+            print(f"An unexpected error occurred during streaming query: {e}")
+            yield _sse("error", {"detail": "Internal server error"})
+
+    return StreamingResponse(event_stream(), media_type="text/event-stream", headers=SSE_HEADERS)
+
+
+@app.post("/api/v2/query/stream")
+async def stream_query_knowledge_base_v2(request: QueryRequest):
+    """
+    Streaming variant of /api/v2/query over server-sent events: a 'sources'
+    event, one 'block' event per validated Block Kit block as soon as the model
+    finishes it, then 'done' with the text summary once the message is queued.
+    """
+    store = _ready_store()
+
+    async def event_stream():
+        try:
+            with span("query_v2_stream", "embed"):
+                query_vector = await run_in_threadpool(store.embed_query, request.query)
+
+            cache_namespace = _cache_namespace("v2", request)
+            with span("query_v2_stream", "answer_cache"):
+                cached = answer_cache.lookup(cache_namespace, query_vector)
+            context_stats = None
+            if cached:
+                answer_json, sources = cached["answer"], cached["sources"]
+                yield _sse("sources", sources)
+                for block in answer_json.get("blocks", []):
+                    yield _sse("block", block)
+            else:
+                with span("query_v2_stream", "retrieve"):
+                    search_results = await run_in_threadpool(_retrieve, store, request, query_vector)
+                if not search_results or not search_results.get('documents') or not search_results['documents'][0]:
+                    yield _sse("done", {"summary": NO_RESULTS_ANSWER, "cached": False})
+                    return
+
+                sources = _format_sources(search_results)
+                yield _sse("sources", sources)
+
+                blocks = []
+                with span("query_v2_stream", "build_context"):
+                    context_docs, context_stats = build_context(search_results['documents'][0])
+                with span("query_v2_stream", "generate"):
+                    async for block in stream_answer_v2(request.query, context_docs):
+                        blocks.append(block)
+                        yield _sse("block", block)
+                answer_json = {"blocks": blocks}
+                if blocks:
+                    answer_cache.store(cache_namespace, query_vector, {"answer": answer_json, "sources": sources}, search_results['ids'][0])
+
+            await run_in_threadpool(slack_outbox.enqueue, build_escalation_payload_v2(
+                llm_json_response=answer_json,
+                original_query=request.query
+            ))
+            yield _sse("done", {"summary": _summarize_blocks(answer_json), "cached": bool(cached), "context_stats": context_stats})
+        except Exception as e:
+            print(f"An unexpected error occurred during streaming query: {e}")
+            yield _sse("error", {"detail": "Internal server error"})
+
+    return StreamingResponse(event_stream(), media_type="text/event-stream", headers=SSE_HEADERS)
@@ -1,6 +1,7 @@
 # src/models.py
 from pydantic import BaseModel, Field
-from typing import List, Dict, Any
+from datetime import datetime
+from typing import List, Dict, Any, Literal, Optional
 
 class ExtractionRequest(BaseModel):
     """Defines the request body for the extraction endpoint."""
@@ -14,6 +15,10 @@ class ExtractionRequest(BaseModel):
         le=12,
         description="The number of months of history to fetch (1-12)."
     )
+    full_resync: bool = Field(
+        default=False,
+        description="Ignore the channel's sync watermark and re-process every thread in the window."
+    )
 
 class ExtractionResponse(BaseModel):
     """Defines the successful response structure."""
@@ -23,12 +28,82 @@ class ExtractionResponse(BaseModel):
     data: List[Dict[str, Any]]
 
 
-class QueryRequest(BaseModel):
-    query: str = Field(..., description="The user's question.")
+class ExtractionJob(BaseModel):
+    """Progress of a background extraction job."""
+    job_id: str
+    channel_id: str
+    months_history: int
+    full_resync: bool
+    status: str = Field(..., description="queued, running, interrupted, completed or failed.")
+    threads_completed: int
+    threads_embedded: int
+    threads_skipped: int
+    threads_per_second: float
+    progress: float = Field(..., description="Fraction of the history window covered so far (0-1).")
+    eta_seconds: Optional[float] = None
+    created_at: float
+    updated_at: float
+    finished_at: Optional[float] = None
+    error: Optional[str] = None
+    result: Optional[Dict[str, Any]] = None
+
+
+class RetrievalOptions(BaseModel):
+    """How context is retrieved for a question; shared by single and batch queries."""
     top_k: int = Field(3, description="Number of results to return for context.")
+    retrieval_mode: Literal["dense", "hybrid"] = Field(
+        "dense",
+        description="'dense' for vector search only, 'hybrid' to fuse it with BM25 keyword search (better for Jira keys and error codes)."
+    )
+    channel_id: Optional[str] = Field(None, description="Only search threads from this Slack channel.")
+    since: Optional[datetime] = Field(None, description="Only search threads started at or after this time.")
+    until: Optional[datetime] = Field(None, description="Only search threads started at or before this time.")
+    has_jira_ticket: Optional[bool] = Field(None, description="Only search threads that do (true) or don't (false) reference a Jira ticket.")
+    min_replies: Optional[int] = Field(None, ge=0, description="Only search threads with at least this many replies.")
+    recency_half_life_days: Optional[float] = Field(
+        None,
+        gt=0,
+        description="If set, halves a thread's relevance score for every this-many days of age, so fresher threads rank higher."
+    )
+
+    def filters(self) -> Dict[str, Any]:
+        return {
+            "channel_id": self.channel_id,
+            "since": self.since,
+            "until": self.until,
+            "has_jira_ticket": self.has_jira_ticket,
+            "min_replies": self.min_replies
+        }
+
+class QueryRequest(RetrievalOptions):
+    query: str = Field(..., description="The user's question.")
 
 # NEW: A clean response model for the final answer
 class QueryResponse(BaseModel):
     answer: str
     # escalation_message: str
-    sources: List[Dict]
\ No newline at end of file
+    sources: List[Dict]
+    cached: bool = Field(False, description="True if the answer came from the semantic answer cache.")
+    context_stats: Optional[Dict[str, int]] = Field(None, description="Estimated prompt-context tokens before/after trimming and tokens saved.")
+
+
+class BatchQueryRequest(RetrievalOptions):
+    """Several questions answered with the same retrieval options."""
+    queries: List[str] = Field(..., min_length=1, max_length=100, description="The questions to answer.")
+    post_escalations: bool = Field(False, description="Also queue a Slack escalation for every answered question.")
+
+class BatchQueryItem(BaseModel):
+    query: str
+    answer: str
+    blocks: List[Dict] = Field(default_factory=list, description="The Block Kit answer that would be posted to Slack.")
+    sources: List[Dict]
+    cached: bool = False
+    context_stats: Optional[Dict[str, int]] = None
+    error: Optional[str] = None
+    timings_ms: Dict[str, float] = Field(default_factory=dict, description="Per-item stage durations (context building, generation).")
+
+class BatchQueryResponse(BaseModel):
+    results: List[BatchQueryItem]
+    timings_ms: Dict[str, float] = Field(..., description="Shared stage durations (embedding, retrieval) and the total.")
+    unique_context_threads: int = Field(..., description="Distinct threads retrieved across the batch.")
+    context_thread_references: int = Field(..., description="Threads retrieved summed over all items (shared threads counted once per item).")
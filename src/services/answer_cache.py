@@ -0,0 +1,93 @@
+# src/services/answer_cache.py
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Iterable, List, Optional
+
+import numpy as np
+
+from ..config import settings
+
+
+class SemanticAnswerCache:
+    """
+    Caches generated answers keyed by the query embedding. A new query reuses a
+    cached answer when its cosine similarity to the cached query is at least
+    `similarity_threshold`, so near-duplicate questions hit too.
+
+    Entries expire after `ttl_seconds`, the least recently used entry is evicted
+    beyond `max_entries`, and entries are dropped as soon as any thread they
+    were answered from is re-upserted.
+    """
+    def __init__(self, similarity_threshold: float, ttl_seconds: float, max_entries: int):
+        self.similarity_threshold = similarity_threshold
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[int, Dict]" = OrderedDict()
+        self._next_key = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def _normalize(vector: List[float]) -> np.ndarray:
+        array = np.asarray(vector, dtype=np.float32)
+        norm = np.linalg.norm(array)
+        return array / norm if norm else array
+
+    def _evict_expired(self, now: float):
+        expired = [key for key, entry in self._entries.items() if now - entry["created_at"] > self.ttl_seconds]
+        for key in expired:
+            del self._entries[key]
+
+    def lookup(self, namespace: str, query_vector: List[float]) -> Optional[Any]:
+        """Returns the cached value for the most similar query in `namespace`, if close enough."""
+        query = self._normalize(query_vector)
+        with self._lock:
+            self._evict_expired(time.time())
+            candidates = [(key, entry) for key, entry in self._entries.items() if entry["namespace"] == namespace]
+            if candidates:
+                similarities = np.stack([entry["vector"] for _, entry in candidates]) @ query
+                best = int(np.argmax(similarities))
+                if similarities[best] >= self.similarity_threshold:
+                    key, entry = candidates[best]
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return entry["value"]
+            self.misses += 1
+            return None
+
+    def store(self, namespace: str, query_vector: List[float], value: Any, source_ids: Iterable[str]):
+        """Caches `value` for this query; `source_ids` are the thread IDs it was built from."""
+        with self._lock:
+            self._entries[self._next_key] = {
+                "namespace": namespace,
+                "vector": self._normalize(query_vector),
+                "value": value,
+                "source_ids": set(source_ids),
+                "created_at": time.time()
+            }
+            self._next_key += 1
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate_threads(self, thread_ids: Iterable[str]):
+        """Drops every cached answer that used any of these threads as context."""
+        changed = set(thread_ids)
+        with self._lock:
+            stale = [key for key, entry in self._entries.items() if entry["source_ids"] & changed]
+            for key in stale:
+                del self._entries[key]
+        if stale:
+            print(f"Invalidated {len(stale)} cached answers after knowledge base update.")
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+# --- Shared instance (one per worker process) ---
+answer_cache = SemanticAnswerCache(
+    similarity_threshold=settings.ANSWER_CACHE_SIMILARITY,
+    ttl_seconds=settings.ANSWER_CACHE_TTL_SECONDS,
+    max_entries=settings.ANSWER_CACHE_MAX_ENTRIES
+)
@@ -0,0 +1,208 @@
+# src/services/block_kit.py
+import json
+import re
+from typing import Dict, List, Optional, Tuple
+
+# Block types Synapse is allowed to emit (a subset of Slack's layout blocks).
+ALLOWED_BLOCK_TYPES = {"header", "section", "divider", "context"}
+
+# Slack's own limits; longer values make chat.postMessage reject the whole message.
+MAX_BLOCKS = 50
+MAX_HEADER_CHARS = 150
+MAX_SECTION_CHARS = 3000
+MAX_CONTEXT_ELEMENTS = 10
+
+_BLOCKS_ARRAY_START = re.compile(r'"blocks"\s*:\s*\[')
+_CODE_FENCE = re.compile(r"^```(?:json)?\s*(.*?)\s*(?:```)?\s*$", re.DOTALL)
+
+# Passed to Gemini as response_schema so v2 output is constrained to this shape.
+_TEXT_SCHEMA = {
+    "type": "OBJECT",
+    "properties": {
+        "type": {"type": "STRING", "enum": ["mrkdwn", "plain_text"]},
+        "text": {"type": "STRING"}
+    },
+    "required": ["type", "text"]
+}
+BLOCK_KIT_RESPONSE_SCHEMA = {
+    "type": "OBJECT",
+    "properties": {
+        "blocks": {
+            "type": "ARRAY",
+            "items": {
+                "type": "OBJECT",
+                "properties": {
+                    "type": {"type": "STRING", "enum": sorted(ALLOWED_BLOCK_TYPES)},
+                    "text": _TEXT_SCHEMA,
+                    "elements": {"type": "ARRAY", "items": _TEXT_SCHEMA}
+                },
+                "required": ["type"]
+            }
+        }
+    },
+    "required": ["blocks"]
+}
+
+# How v2 responses were parsed: cleanly, after a local repair, or not at all.
+repair_stats = {"parsed": 0, "repaired": 0, "failed": 0}
+
+
+def validate_block(block) -> bool:
+    """Checks that a block has the minimal shape Slack will accept for its type."""
+    if not isinstance(block, dict) or block.get("type") not in ALLOWED_BLOCK_TYPES:
+        return False
+    block_type = block["type"]
+    if block_type == "header":
+        return isinstance(block.get("text"), dict) and bool(block["text"].get("text"))
+    if block_type == "section":
+        has_text = isinstance(block.get("text"), dict) and bool(block["text"].get("text"))
+        return has_text or bool(block.get("fields"))
+    if block_type == "context":
+        return isinstance(block.get("elements"), list) and bool(block["elements"])
+    return True
+
+
+def _clip(text: str, limit: int) -> str:
+    return text if len(text) <= limit else text[:limit - 1].rstrip() + "…"
+
+
+def normalize_block(block) -> Optional[Dict]:
+    """
+    Fixes defects Slack would reject (over-length text, markdown in headers,
+    too many context elements) and returns the block, or None if it can't be used.
+    """
+    if not isinstance(block, dict):
+        return None
+    block_type = block.get("type")
+    if block_type == "header" and isinstance(block.get("text"), dict):
+        # Headers only accept plain_text, so mrkdwn bold markers are dropped
+        text = str(block["text"].get("text", ""))
+        cleaned = _clip(text.replace("*", "").strip(), MAX_HEADER_CHARS)
+        if block["text"].get("type") != "plain_text" or cleaned != text:
+            block = {**block, "text": {"type": "plain_text", "text": cleaned, "emoji": True}}
+    elif block_type == "section" and isinstance(block.get("text"), dict):
+        text = str(block["text"].get("text", ""))
+        if len(text) > MAX_SECTION_CHARS:
+            block = {**block, "text": {**block["text"], "text": _clip(text, MAX_SECTION_CHARS)}}
+    elif block_type == "context" and isinstance(block.get("elements"), list):
+        if len(block["elements"]) > MAX_CONTEXT_ELEMENTS:
+            block = {**block, "elements": block["elements"][:MAX_CONTEXT_ELEMENTS]}
+    return block if validate_block(block) else None
+
+
+def parse_blocks_response(response_text: str) -> Tuple[Dict, bool]:
+    """
+    Parses a Block Kit answer from the model, repairing common defects without
+    another LLM call: code fences, text before or after the JSON, a bare array,
+    a response cut off mid-array (complete blocks are kept), and invalid or
+    over-length blocks. Returns ({"blocks": [...]}, repaired) and raises
+    ValueError if no usable block can be recovered.
+    """
+    text = response_text.strip()
+    repaired = False
+
+    # Only a fence around the whole response; ``` inside a JSON string is mrkdwn, not wrapping
+    fenced = _CODE_FENCE.match(text)
+    if fenced:
+        text, repaired = fenced.group(1), True
+
+    try:
+        parsed = json.loads(text)
+    except json.JSONDecodeError:
+        repaired = True
+        parsed = None
+        start = min((i for i in (text.find("{"), text.find("[")) if i >= 0), default=-1)
+        if start >= 0:
+            try:
+                # raw_decode stops at the end of the first JSON value, ignoring trailing text
+                parsed, _ = json.JSONDecoder().raw_decode(text[start:])
+            except json.JSONDecodeError:
+                pass
+        if parsed is None:
+            # Truncated output: salvage every block that was completed
+            parser = BlockStreamParser()
+            blocks = parser.feed(text if _BLOCKS_ARRAY_START.search(text) else '{"blocks": ' + text[max(start, 0):])
+            parsed = {"blocks": blocks}
+
+    if isinstance(parsed, list):
+        parsed, repaired = {"blocks": parsed}, True
+    raw_blocks = parsed.get("blocks") if isinstance(parsed, dict) else None
+    if not isinstance(raw_blocks, list):
+        repair_stats["failed"] += 1
+        raise ValueError("Response has no 'blocks' array")
+
+    blocks = [block for block in (normalize_block(raw) for raw in raw_blocks) if block]
+    if blocks != raw_blocks or len(blocks) > MAX_BLOCKS:
+        repaired = True
+    if not blocks:
+        repair_stats["failed"] += 1
+        raise ValueError("Response contains no valid blocks")
+
+    repair_stats["repaired" if repaired else "parsed"] += 1
+    return {**parsed, "blocks": blocks[:MAX_BLOCKS]}, repaired
+
+
+class BlockStreamParser:
+    """
+    Incrementally pulls complete blocks out of a streamed {"blocks": [...]} JSON
+    document. feed() returns the blocks completed by each new chunk, so they can
+    be forwarded before the model has finished the whole message.
+    """
+    def __init__(self):
+        self.buffer = ""
+        self.array_start = None # Index just past '"blocks": ['
+        self.position = 0 # Next character to scan
+        self.depth = 0
+        self.in_string = False
+        self.escaped = False
+        self.block_start = None
+        self.done = False
+        self.rejected = 0
+
+    def feed(self, chunk: str) -> List[Dict]:
+        self.buffer += chunk
+        if self.done:
+            return []
+        if self.array_start is None:
+            match = _BLOCKS_ARRAY_START.search(self.buffer)
+            if not match:
+                return []
+            self.array_start = self.position = match.end()
+
+        completed = []
+        while self.position < len(self.buffer):
+            char = self.buffer[self.position]
+            if self.in_string:
+                if self.escaped:
+                    self.escaped = False
+                elif char == "\\":
+                    self.escaped = True
+                elif char == '"':
+                    self.in_string = False
+            elif char == '"':
+                self.in_string = True
+            elif char == "{":
+                if self.depth == 0:
+                    self.block_start = self.position
+                self.depth += 1
+            elif char == "}":
+                self.depth -= 1
+                if self.depth == 0 and self.block_start is not None:
+                    completed.extend(self._emit(self.buffer[self.block_start:self.position + 1]))
+                    self.block_start = None
+            elif char == "]" and self.depth == 0:
+                self.done = True
+                self.position += 1
+                break
+            self.position += 1
+        return completed
+
+    def _emit(self, raw_block: str) -> List[Dict]:
+        try:
+            block = normalize_block(json.loads(raw_block))
+        except json.JSONDecodeError:
+            block = None
+        if block is None:
+            self.rejected += 1
+            return []
+        return [block]
@@ -0,0 +1,202 @@
+# src/services/bm25_index.py
+import heapq
+import json
+import math
+import re
+import sqlite3
+import threading
+from collections import Counter, defaultdict
+from contextlib import contextmanager
+from typing import Dict, Iterable, List, Optional, Tuple
+
+# Identifiers such as CRM-1234, ERR_TIMEOUT or 10.2.3 are kept whole, and their
+# parts are indexed too so "CRM" alone still matches.
+_TOKEN = re.compile(r"[a-z0-9]+(?:[-_./][a-z0-9]+)*")
+_STOPWORDS = frozenset(
+    "a an and are as at be but by for from has have i in is it its of on or that the this "
+    "to was were will with we you user replied started thread replies".split()
+)
+
+def tokenize(text: str) -> List[str]:
+    """Lower-cases text and splits it into BM25 terms."""
+    tokens = []
+    for token in _TOKEN.findall(text.lower()):
+        if token in _STOPWORDS:
+            continue
+        tokens.append(token)
+        parts = re.split(r"[-_./]", token)
+        if len(parts) > 1:
+            tokens.extend(part for part in parts if part and part not in _STOPWORDS)
+    return tokens
+
+
+class BM25Index:
+    """
+    In-memory inverted index with Okapi BM25 scoring, persisted to SQLite.
+
+    Each document's term frequencies are stored as one row, so an upsert only
+    rewrites the rows it touches; the postings are rebuilt from the table the
+    first time the index is used in a process.
+
+    Searches score terms rarest first and stop opening new documents once the
+    remaining terms' upper bounds can no longer lift one into the top `limit`
+    (term-at-a-time MaxScore), so common terms only rescore the candidates.
+    Terms found in over half the documents (zero or negative idf in classic
+    BM25, as SQLite FTS5's bm25() treats them) are skipped while a rarer query
+    term has matched.
+    """
+    def __init__(self, path: str, k1: float = 1.2, b: float = 0.75):
+        self.path = path
+        self.k1 = k1
+        self.b = b
+        self._postings: Dict[str, Dict[str, int]] = defaultdict(dict)
+        self._doc_terms: Dict[str, Dict[str, int]] = {}
+        self._doc_lengths: Dict[str, int] = {}
+        self._total_length = 0
+        # Upper-bound inputs: never lowered on delete, which only loosens the bound
+        self._max_frequency: Dict[str, int] = {}
+        self._min_length: Optional[int] = None
+        self._lock = threading.RLock()
+        self._loaded = False
+
+    @contextmanager
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=30)
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def _ensure_loaded(self):
+        if self._loaded:
+            return
+        with self._connect() as conn:
+            conn.execute("CREATE TABLE IF NOT EXISTS bm25_documents (doc_id TEXT PRIMARY KEY, terms TEXT NOT NULL)")
+            rows = conn.execute("SELECT doc_id, terms FROM bm25_documents").fetchall()
+        for doc_id, terms in rows:
+            self._index(doc_id, json.loads(terms))
+        self._loaded = True
+        print(f"Loaded BM25 index with {len(self._doc_terms)} documents.")
+
+    def _index(self, doc_id: str, terms: Dict[str, int]):
+        self._unindex(doc_id)
+        for term, frequency in terms.items():
+            self._postings[term][doc_id] = frequency
+            if frequency > self._max_frequency.get(term, 0):
+                self._max_frequency[term] = frequency
+        length = sum(terms.values())
+        self._doc_terms[doc_id] = terms
+        self._doc_lengths[doc_id] = length
+        self._total_length += length
+        if self._min_length is None or length < self._min_length:
+            self._min_length = length
+
+    def _unindex(self, doc_id: str):
+        terms = self._doc_terms.pop(doc_id, None)
+        if terms is None:
+            return
+        for term in terms:
+            postings = self._postings[term]
+            postings.pop(doc_id, None)
+            if not postings:
+                del self._postings[term]
+                self._max_frequency.pop(term, None)
+        self._total_length -= self._doc_lengths.pop(doc_id)
+
+    def __len__(self) -> int:
+        with self._lock:
+            self._ensure_loaded()
+            return len(self._doc_terms)
+
+    def upsert(self, documents: Dict[str, str]):
+        """Indexes (or re-indexes) the given documents, keyed by document ID."""
+        if not documents:
+            return
+        with self._lock:
+            self._ensure_loaded()
+            rows = []
+            for doc_id, text in documents.items():
+                terms = dict(Counter(tokenize(text)))
+                self._index(doc_id, terms)
+                rows.append((doc_id, json.dumps(terms)))
+            with self._connect() as conn:
+                conn.executemany("INSERT OR REPLACE INTO bm25_documents (doc_id, terms) VALUES (?, ?)", rows)
+
+    def delete(self, doc_ids: Iterable[str]):
+        doc_ids = list(doc_ids)
+        if not doc_ids:
+            return
+        with self._lock:
+            self._ensure_loaded()
+            for doc_id in doc_ids:
+                self._unindex(doc_id)
+            with self._connect() as conn:
+                conn.executemany("DELETE FROM bm25_documents WHERE doc_id = ?", [(doc_id,) for doc_id in doc_ids])
+
+    def _query_terms(self, query_text: str) -> List[str]:
+        # An indexed identifier already implies its parts; querying "crm" next to
+        # "crm-1500" would only open nearly every posting list for little score.
+        terms = set()
+        for token in _TOKEN.findall(query_text.lower()):
+            if token in _STOPWORDS:
+                continue
+            terms.add(token)
+            parts = re.split(r"[-_./]", token)
+            if len(parts) > 1 and token not in self._postings:
+                terms.update(part for part in parts if part and part not in _STOPWORDS)
+        return list(terms)
+
+    def search(self, query_text: str, limit: int) -> List[Tuple[str, float]]:
+        """Returns up to `limit` (doc_id, score) pairs, best first."""
+        with self._lock:
+            self._ensure_loaded()
+            doc_count = len(self._doc_terms)
+            query_terms = self._query_terms(query_text)
+            if not doc_count or not query_terms or limit <= 0:
+                return []
+            # norm(d) = k1 * (1 - b + b * |d| / avgdl) = base_norm + length_norm * |d|
+            k1 = self.k1
+            base_norm = k1 * (1 - self.b)
+            length_norm = k1 * self.b * doc_count / self._total_length
+            doc_lengths = self._doc_lengths
+
+            rare, common = [], []
+            for term in query_terms:
+                postings = self._postings.get(term)
+                if not postings:
+                    continue
+                weight = (k1 + 1) * math.log(1 + (doc_count - len(postings) + 0.5) / (len(postings) + 0.5))
+                max_frequency = self._max_frequency[term]
+                bound = weight * max_frequency / (max_frequency + base_norm + length_norm * self._min_length)
+                (common if 2 * len(postings) > doc_count else rare).append((bound, weight, postings))
+            weighted = sorted(rare or common, key=lambda item: item[0], reverse=True)
+
+            remaining = sum(bound for bound, _, _ in weighted)
+            scores: Dict[str, float] = {}
+            threshold = 0.0
+            for bound, weight, postings in weighted:
+                if len(scores) >= limit and remaining < threshold:
+                    # No unseen document can reach the top `limit` any more
+                    scores = {doc_id: score for doc_id, score in scores.items() if score + remaining >= threshold}
+                    for doc_id in scores.keys() & postings.keys():
+                        frequency = postings[doc_id]
+                        scores[doc_id] += weight * frequency / (frequency + base_norm + length_norm * doc_lengths[doc_id])
+                else:
+                    get = scores.get
+                    for doc_id, frequency in postings.items():
+                        scores[doc_id] = get(doc_id, 0.0) + weight * frequency / (frequency + base_norm + length_norm * doc_lengths[doc_id])
+                remaining -= bound
+                if len(scores) >= limit:
+                    threshold = heapq.nlargest(limit, scores.values())[-1]
+        return heapq.nlargest(limit, scores.items(), key=lambda item: item[1])
+
+
+def reciprocal_rank_fusion(rankings: List[List[str]], k: int = 60, weights: Optional[List[float]] = None) -> List[Tuple[str, float]]:
+    """Fuses several ranked ID lists: score(d) = sum(weight / (k + rank)), best first."""
+    weights = weights or [1.0] * len(rankings)
+    scores: Dict[str, float] = defaultdict(float)
+    for ranking, weight in zip(rankings, weights):
+        for rank, doc_id in enumerate(ranking, start=1):
+            scores[doc_id] += weight / (k + rank)
+    return sorted(scores.items(), key=lambda item: item[1], reverse=True)
@@ -0,0 +1,144 @@
+# src/services/context_builder.py
+import hashlib
+import math
+from typing import Dict, List, Optional, Tuple
+
+from ..config import settings
+# Documents are built by KnowledgeStore._create_chunk_from_thread.
+from .knowledge_store import _MESSAGE_HEADER, _REPLIES_MARKER
+
+# Gemini's rule of thumb is ~4 characters per token for English text. We only
+# need a budget, not an exact count, so this avoids a count_tokens round-trip.
+CHARS_PER_TOKEN = 4
+
+# Below this many tokens a trimmed document isn't worth including.
+MIN_DOCUMENT_TOKENS = 40
+
+
+def count_tokens(text: str) -> int:
+    """Estimates the number of LLM tokens in a piece of text."""
+    return math.ceil(len(text) / CHARS_PER_TOKEN)
+
+
+def _split_messages(document: str) -> List[str]:
+    """Splits a thread document into its messages, each starting with its 'User ...' header."""
+    starts = [m.start() for m in _MESSAGE_HEADER.finditer(document)]
+    if not starts:
+        return [document.strip()]
+    messages = [document[start:end].replace(_REPLIES_MARKER, "").strip()
+                for start, end in zip(starts, starts[1:] + [len(document)])]
+    return [m for m in messages if m]
+
+
+def _fingerprint(message: str) -> str:
+    """Identifies a message's content regardless of who posted it or how it was spaced."""
+    body = message.split("\n", 1)[1] if "\n" in message else message
+    return hashlib.sha1(" ".join(body.lower().split()).encode("utf-8")).hexdigest()
+
+
+def _truncate(text: str, max_tokens: int) -> str:
+    max_chars = max_tokens * CHARS_PER_TOKEN
+    return text if len(text) <= max_chars else text[:max_chars].rstrip() + " [...]"
+
+
+def _fit_thread(parent: Optional[str], replies: List[str], max_tokens: int) -> str:
+    """
+    Fits a thread into max_tokens: the parent and first reply give the problem,
+    the latest replies usually hold the resolution, so the middle is dropped first.
+    `parent` is None when a higher-ranked document already showed it; the first
+    reply then leads the document and is truncated rather than dropped.
+    """
+    parts, remaining = [], max_tokens
+    if parent is not None:
+        parent = _truncate(parent, max(max_tokens // 2, MIN_DOCUMENT_TOKENS))
+        parts.append(parent)
+        remaining -= count_tokens(parent)
+    kept_head, kept_tail = [], []
+    if replies and (parent is None or count_tokens(replies[0]) <= remaining):
+        kept_head.append(_truncate(replies[0], remaining))
+        remaining -= count_tokens(kept_head[0])
+    for reply in reversed(replies[len(kept_head):]):
+        if count_tokens(reply) > remaining:
+            break
+        kept_tail.insert(0, reply)
+        remaining -= count_tokens(reply)
+
+    omitted = len(replies) - len(kept_head) - len(kept_tail)
+    if kept_head or kept_tail:
+        parts.append(_REPLIES_MARKER)
+        parts.extend(kept_head)
+        if omitted:
+            parts.append(f"[... {omitted} replies omitted ...]")
+        parts.extend(kept_tail)
+    elif omitted:
+        parts.append(f"[... {omitted} replies omitted ...]")
+    return "\n".join(parts)
+
+
+def build_context(
+    documents: List[str],
+    total_budget: Optional[int] = None,
+    document_budget: Optional[int] = None,
+    thread_ids: Optional[List[str]] = None,
+    fitted_threads: Optional[Dict[str, str]] = None
+) -> Tuple[List[str], Dict]:
+    """
+    Turns retrieved thread documents (in rank order) into the context for an LLM prompt.
+
+    Messages already seen in a higher-ranked document are dropped, each thread
+    is trimmed to `document_budget` tokens, and documents are added until
+    `total_budget` is used up. Returns (documents, stats) where stats reports
+    the estimated tokens before and after and how many were saved.
+
+    Given the documents' `thread_ids`, whole threads fitted at the full
+    `document_budget` are kept in `fitted_threads` by ID, so callers building
+    several contexts (a batch) fit each shared thread once.
+    """
+    total_budget = total_budget or settings.LLM_CONTEXT_TOKEN_BUDGET
+    document_budget = document_budget or settings.LLM_CONTEXT_DOC_TOKEN_BUDGET
+
+    seen = set()
+    context, used = [], 0
+    original_tokens = sum(count_tokens(doc) for doc in documents)
+    for index, document in enumerate(documents):
+        remaining = total_budget - used
+        if remaining < MIN_DOCUMENT_TOKENS:
+            break
+
+        all_messages = _split_messages(document)
+        # A chunk always repeats its thread's parent first; a headerless document is all parent
+        has_parent = not all_messages[0].split("\n", 1)[0].endswith(" replied:")
+        parent, replies = None, []
+        for position, message in enumerate(all_messages):
+            fingerprint = _fingerprint(message)
+            if fingerprint in seen:
+                continue
+            seen.add(fingerprint)
+            if position == 0 and has_parent:
+                parent = message
+            else:
+                replies.append(message)
+        if parent is None and not replies:
+            continue # Nothing in this thread that the model hasn't already seen
+        kept = len(replies) + (parent is not None)
+
+        budget = min(document_budget, remaining)
+        # Only an untouched thread at the full budget fits the same way in every context
+        cache_key = thread_ids[index] if thread_ids and fitted_threads is not None else None
+        if cache_key is None or kept < len(all_messages) or budget < document_budget:
+            fitted = _fit_thread(parent, replies, budget)
+        elif cache_key in fitted_threads:
+            fitted = fitted_threads[cache_key]
+        else:
+            fitted = fitted_threads[cache_key] = _fit_thread(parent, replies, budget)
+        context.append(fitted)
+        used += count_tokens(fitted)
+
+    stats = {
+        "original_tokens": original_tokens,
+        "context_tokens": used,
+        "tokens_saved": max(original_tokens - used, 0),
+        "documents_retrieved": len(documents),
+        "documents_used": len(context)
+    }
+    return context, stats
@@ -0,0 +1,101 @@
+# src/services/embedding_cache.py
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterable, Optional
+
+import numpy as np
+
+
+class EmbeddingCache:
+    """
+    Persistent cache of embedding vectors keyed by (encoder, SHA-256 of the text),
+    so byte-identical documents and repeated queries are never encoded twice.
+
+    Vectors are stored as float32 blobs in SQLite. Beyond `max_entries` the
+    least recently used rows are evicted; `max_entries=0` disables the cache.
+    """
+    def __init__(self, path: str, max_entries: int):
+        self.path = path
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._initialized = False
+        self._entry_count: Optional[int] = None
+        self.hits = 0
+        self.misses = 0
+
+    @contextmanager
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=30)
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def _ensure_table(self, conn: sqlite3.Connection):
+        if self._initialized:
+            return
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS embeddings (
+                encoder TEXT NOT NULL,
+                text_hash TEXT NOT NULL,
+                vector BLOB NOT NULL,
+                last_used REAL NOT NULL,
+                PRIMARY KEY (encoder, text_hash)
+            )
+        """)
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_embeddings_last_used ON embeddings (last_used)")
+        self._entry_count = conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+        self._initialized = True
+
+    def get_many(self, encoder: str, text_hashes: Iterable[str]) -> Dict[str, np.ndarray]:
+        """Returns the cached vectors for whichever of the hashes are present."""
+        text_hashes = list(text_hashes)
+        if not self.max_entries or not text_hashes:
+            return {}
+        found: Dict[str, np.ndarray] = {}
+        with self._lock, self._connect() as conn:
+            self._ensure_table(conn)
+            # Stay well under SQLite's bound-parameter limit
+            for start in range(0, len(text_hashes), 500):
+                chunk = text_hashes[start:start + 500]
+                placeholders = ",".join("?" * len(chunk))
+                rows = conn.execute(
+                    f"SELECT text_hash, vector FROM embeddings WHERE encoder = ? AND text_hash IN ({placeholders})",
+                    (encoder, *chunk)
+                ).fetchall()
+                for text_hash, vector in rows:
+                    found[text_hash] = np.frombuffer(vector, dtype=np.float32)
+            if found:
+                now = time.time()
+                conn.executemany(
+                    "UPDATE embeddings SET last_used = ? WHERE encoder = ? AND text_hash = ?",
+                    [(now, encoder, text_hash) for text_hash in found]
+                )
+        self.hits += len(found)
+        self.misses += len(text_hashes) - len(found)
+        return found
+
+    def put_many(self, encoder: str, vectors: Dict[str, np.ndarray]):
+        """Stores vectors by text hash, evicting the least recently used rows if over capacity."""
+        if not self.max_entries or not vectors:
+            return
+        now = time.time()
+        with self._lock, self._connect() as conn:
+            self._ensure_table(conn)
+            before = conn.total_changes
+            conn.executemany(
+                "INSERT OR IGNORE INTO embeddings (encoder, text_hash, vector, last_used) VALUES (?, ?, ?, ?)",
+                [(encoder, text_hash, np.asarray(vector, dtype=np.float32).tobytes(), now) for text_hash, vector in vectors.items()]
+            )
+            self._entry_count += conn.total_changes - before
+
+            overflow = self._entry_count - self.max_entries
+            if overflow > 0:
+                conn.execute(
+                    "DELETE FROM embeddings WHERE rowid IN (SELECT rowid FROM embeddings ORDER BY last_used LIMIT ?)",
+                    (overflow,)
+                )
+                self._entry_count -= overflow
@@ -0,0 +1,112 @@
+# src/services/embeddings.py
+import os
+from typing import List, Union
+
+import numpy as np
+
+# Texts to encode: one string gives one vector, a list gives a 2-D array (as SentenceTransformer.encode does).
+Texts = Union[str, List[str]]
+
+
+class SentenceTransformerBackend:
+    """Full PyTorch model through sentence-transformers (the original serving path)."""
+    name = "sentence-transformers"
+
+    def __init__(self, model_name: str):
+        # Imported here so the ONNX backend never loads torch.
+        from sentence_transformers import SentenceTransformer
+        self.model_name = model_name
+        self.model = SentenceTransformer(model_name)
+        # Identifies vectors this exact encoder produced (used as the embedding cache key)
+        self.encoder_id = f"{self.name}:{model_name}"
+        self.dimension = self.model.get_sentence_embedding_dimension()
+
+    def encode(self, texts: Texts, batch_size: int = 32) -> np.ndarray:
+        return self.model.encode(texts, batch_size=batch_size)
+
+
+class OnnxBackend:
+    """
+    The same sentence-transformers model exported to ONNX (int8-quantized by
+    default), run with ONNX Runtime on CPU. Tokenization, the 256 word-piece
+    truncation, mean pooling and L2 normalization reproduce the PyTorch
+    pipeline; the vectors are close to the PyTorch ones but are kept in their
+    own embedding space (see embedding_space), so switching backends means
+    re-indexing.
+    """
+    name = "onnx"
+
+    def __init__(self, model_name: str, model_file: str, max_tokens: int = 256, threads: int = 0):
+        import onnxruntime
+        from huggingface_hub import hf_hub_download
+        from tokenizers import Tokenizer
+
+        repo_id = model_name if "/" in model_name else f"sentence-transformers/{model_name}"
+        self.model_name = model_name
+        self.model_file = model_file
+        self.encoder_id = f"{self.name}:{model_name}:{model_file}:{max_tokens}"
+
+        self.tokenizer = Tokenizer.from_file(hf_hub_download(repo_id, "tokenizer.json"))
+        self.tokenizer.enable_truncation(max_length=max_tokens)
+        self.tokenizer.enable_padding()
+
+        options = onnxruntime.SessionOptions()
+        if threads:
+            options.intra_op_num_threads = threads
+        self.session = onnxruntime.InferenceSession(
+            hf_hub_download(repo_id, model_file),
+            sess_options=options,
+            providers=["CPUExecutionProvider"]
+        )
+        self._input_names = {model_input.name for model_input in self.session.get_inputs()}
+        self.dimension = self.session.get_outputs()[0].shape[-1]
+        if not isinstance(self.dimension, int): # Dynamic axis in the exported graph
+            self.dimension = self._encode_batch(["dimension probe"]).shape[1]
+
+    def _encode_batch(self, texts: List[str]) -> np.ndarray:
+        encodings = self.tokenizer.encode_batch(texts)
+        feed = {
+            "input_ids": np.array([e.ids for e in encodings], dtype=np.int64),
+            "attention_mask": np.array([e.attention_mask for e in encodings], dtype=np.int64),
+            "token_type_ids": np.array([e.type_ids for e in encodings], dtype=np.int64)
+        }
+        token_embeddings = self.session.run(None, {k: v for k, v in feed.items() if k in self._input_names})[0]
+
+        # Mean pooling over real tokens, then unit length (the model's Normalize layer)
+        mask = feed["attention_mask"][..., None].astype(np.float32)
+        pooled = (token_embeddings * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None)
+        return pooled / np.clip(np.linalg.norm(pooled, axis=1, keepdims=True), 1e-12, None)
+
+    def encode(self, texts: Texts, batch_size: int = 32) -> np.ndarray:
+        if isinstance(texts, str):
+            return self._encode_batch([texts])[0]
+        if not texts:
+            return np.zeros((0, self.dimension), dtype=np.float32)
+        # Sorting by length keeps padding per batch small; the original order is restored after.
+        order = np.argsort([len(text) for text in texts])
+        vectors = np.vstack([
+            self._encode_batch([texts[i] for i in order[start:start + batch_size]])
+            for start in range(0, len(texts), batch_size)
+        ])
+        result = np.empty_like(vectors)
+        result[order] = vectors
+        return result
+
+
+def embedding_space(backend) -> str:
+    """
+    Identifies which vectors can share a collection. The backend and, for ONNX,
+    the exported file (and so its quantization) are part of it: their vectors
+    have not been measured to agree closely enough to mix with PyTorch ones.
+    """
+    variant = f":{backend.model_file}" if backend.name == "onnx" else ""
+    return f"{backend.name}:{os.path.basename(backend.model_name)}{variant}:{backend.dimension}"
+
+
+def create_embedding_backend(backend: str, model_name: str, onnx_file: str, max_tokens: int = 256, threads: int = 0):
+    """Builds the backend selected by EMBEDDING_BACKEND."""
+    if backend == "onnx":
+        return OnnxBackend(model_name, onnx_file, max_tokens=max_tokens, threads=threads)
+    if backend == "sentence-transformers":
+        return SentenceTransformerBackend(model_name)
+    raise ValueError(f"Unknown embedding backend '{backend}' (expected 'sentence-transformers' or 'onnx')")
@@ -0,0 +1,272 @@
+# src/services/extraction_jobs.py
+import json
+import os
+import socket
+import sqlite3
+from contextlib import contextmanager
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
+
+from ..config import settings
+from .slack_extractor import extract_and_store_knowledge
+
+# Jobs that were queued or running when the process stopped are picked up again on startup
+# and by the periodic sweep. A 'running' job is only taken over once its owner is known to be
+# gone or its checkpoints have gone stale (see _claim_job).
+RESUMABLE_STATUSES = ("queued", "running", "interrupted")
+
+# Identifies this process in the owner column: host, pid and a per-boot token,
+# so a restart that reuses the pid (e.g. pid 1 in a container) still counts as a new owner.
+WORKER_ID = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+_executor: Optional[ThreadPoolExecutor] = None
+_executor_lock = threading.Lock()
+_shutdown = threading.Event()
+_scheduled = set() # Job ids submitted to this process's executor that haven't started yet
+_scheduled_lock = threading.Lock()
+
+
+# --- SQLite job table ---
+
+@contextmanager
+def _connect():
+    """Opens a short-lived connection, committing on success and always closing it."""
+    conn = sqlite3.connect(settings.JOBS_DB_PATH, timeout=30)
+    conn.row_factory = sqlite3.Row
+    try:
+        with conn:
+            yield conn
+    finally:
+        conn.close()
+
+def init_job_store():
+    """Creates the job table if it doesn't exist yet and adds columns missing from older tables."""
+    _shutdown.clear()
+    with _connect() as conn:
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS extraction_jobs (
+                job_id TEXT PRIMARY KEY,
+                channel_id TEXT NOT NULL,
+                months_history INTEGER NOT NULL,
+                full_resync INTEGER NOT NULL DEFAULT 0,
+                oldest_ts REAL NOT NULL,
+                status TEXT NOT NULL,
+                cursor TEXT,
+                progress_ts REAL,
+                threads_completed INTEGER NOT NULL DEFAULT 0,
+                threads_embedded INTEGER NOT NULL DEFAULT 0,
+                threads_skipped INTEGER NOT NULL DEFAULT 0,
+                active_seconds REAL NOT NULL DEFAULT 0,
+                created_at REAL NOT NULL,
+                updated_at REAL NOT NULL,
+                finished_at REAL,
+                error TEXT,
+                result TEXT,
+                owner TEXT
+            )
+        """)
+        columns = {row["name"] for row in conn.execute("PRAGMA table_info(extraction_jobs)")}
+        if "owner" not in columns:
+            conn.execute("ALTER TABLE extraction_jobs ADD COLUMN owner TEXT")
+
+def _update_job(job_id: str, **fields):
+    fields["updated_at"] = time.time()
+    assignments = ", ".join(f"{name} = ?" for name in fields)
+    with _connect() as conn:
+        conn.execute(f"UPDATE extraction_jobs SET {assignments} WHERE job_id = ?", (*fields.values(), job_id))
+
+def _row_to_job(row: sqlite3.Row) -> Dict:
+    job = dict(row)
+    job["full_resync"] = bool(job["full_resync"])
+    job["result"] = json.loads(job["result"]) if job["result"] else None
+
+    # Throughput and ETA from how far back in the window the run has got.
+    # Slack returns history newest-first, so progress_ts walks from "now" down to oldest_ts.
+    active = job["active_seconds"]
+    job["threads_per_second"] = round(job["threads_completed"] / active, 2) if active > 0 else 0.0
+    job["progress"] = 1.0 if job["status"] == "completed" else 0.0
+    job["eta_seconds"] = None
+    if job["status"] != "completed" and job["progress_ts"]:
+        window = job["created_at"] - job["oldest_ts"]
+        covered = job["created_at"] - job["progress_ts"]
+        if window > 0 and covered > 0:
+            job["progress"] = round(min(covered / window, 1.0), 3)
+            job["eta_seconds"] = round(active * (1 - job["progress"]) / job["progress"], 1)
+    return job
+
+def get_job(job_id: str) -> Optional[Dict]:
+    with _connect() as conn:
+        row = conn.execute("SELECT * FROM extraction_jobs WHERE job_id = ?", (job_id,)).fetchone()
+    return _row_to_job(row) if row else None
+
+def list_jobs(limit: int = 50) -> List[Dict]:
+    with _connect() as conn:
+        rows = conn.execute("SELECT * FROM extraction_jobs ORDER BY created_at DESC LIMIT ?", (limit,)).fetchall()
+    return [_row_to_job(row) for row in rows]
+
+
+# --- Job execution ---
+
+def _get_executor() -> ThreadPoolExecutor:
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=settings.EXTRACTION_JOB_WORKERS, thread_name_prefix="extraction-job")
+        return _executor
+
+def _owner_is_gone(owner: Optional[str]) -> bool:
+    """
+    True when the worker that owns a 'running' row has certainly exited: an earlier boot
+    of this process, or a pid on this host that no longer exists. Owners on other hosts
+    can't be checked from here; those rows are taken over once their checkpoints go stale.
+    """
+    if not owner or owner == WORKER_ID:
+        return False
+    host, pid, _ = owner.rsplit(":", 2)
+    if host != socket.gethostname() or not pid.isdigit():
+        return False
+    if int(pid) == os.getpid():
+        return True
+    try:
+        os.kill(int(pid), 0)
+    except ProcessLookupError:
+        return True
+    except PermissionError:
+        return False
+    return False
+
+def _claim_job(job_id: str, orphaned_owner: Optional[str] = None) -> bool:
+    """
+    Atomically marks a job as running in this process. Fails for finished jobs
+    and for jobs another live worker is running (its checkpoints keep updated_at
+    fresh), so a job submitted and resumed at once still runs only once.
+    A 'running' row is taken over when its checkpoints are stale, or when it still
+    belongs to `orphaned_owner`, a worker the caller found to have exited.
+    """
+    now = time.time()
+    with _connect() as conn:
+        claimed = conn.execute(
+            """UPDATE extraction_jobs SET status = 'running', owner = ?, error = NULL, updated_at = ?
+               WHERE job_id = ? AND (status IN ('queued', 'interrupted')
+                   OR (status = 'running' AND (updated_at < ? OR owner = ?)))""",
+            (WORKER_ID, now, job_id, now - settings.EXTRACTION_JOB_STALE_SECONDS, orphaned_owner)
+        ).rowcount
+    return claimed == 1
+
+def _schedule(job_id: str, orphaned_owner: Optional[str] = None) -> bool:
+    """Submits a job to this process's executor unless it's already waiting there."""
+    with _scheduled_lock:
+        if job_id in _scheduled:
+            return False
+        _scheduled.add(job_id)
+    _get_executor().submit(_run_job, job_id, orphaned_owner)
+    return True
+
+def _run_job(job_id: str, orphaned_owner: Optional[str] = None):
+    with _scheduled_lock:
+        _scheduled.discard(job_id)
+    if not _claim_job(job_id, orphaned_owner):
+        return
+    job = get_job(job_id)
+
+    base = {name: job[name] for name in ("threads_completed", "threads_embedded", "threads_skipped", "active_seconds")}
+    run_started_at = time.monotonic()
+    print(f"Running extraction job {job_id} for channel {job['channel_id']} (resume cursor: {job['cursor']})...")
+
+    def checkpoint(cursor: Optional[str], stats: Dict, progress_ts: float):
+        _update_job(
+            job_id,
+            cursor=cursor,
+            progress_ts=progress_ts,
+            threads_completed=base["threads_completed"] + stats["threads_processed"],
+            threads_embedded=base["threads_embedded"] + stats["threads_embedded"],
+            threads_skipped=base["threads_skipped"] + stats["threads_skipped"],
+            active_seconds=base["active_seconds"] + (time.monotonic() - run_started_at)
+        )
+
+    try:
+        result = extract_and_store_knowledge(
+            job["channel_id"],
+            job["months_history"],
+            full_resync=job["full_resync"],
+            oldest_ts=job["oldest_ts"],
+            resume_cursor=job["cursor"],
+            on_checkpoint=checkpoint,
+            should_stop=_shutdown.is_set
+        )
+        fields = dict(
+            threads_completed=base["threads_completed"] + result["threads_processed"],
+            threads_embedded=base["threads_embedded"] + result["threads_embedded"],
+            threads_skipped=base["threads_skipped"] + result["threads_skipped"],
+            active_seconds=base["active_seconds"] + (time.monotonic() - run_started_at),
+            result=json.dumps(result)
+        )
+        if result["status"] == "stopped":
+            _update_job(job_id, status="interrupted", **fields)
+        else:
+            _update_job(job_id, status="completed", finished_at=time.time(), **fields)
+        print(f"Extraction job {job_id} finished with status {result['status']}.")
+    except Exception as e:
+        print(f"Extraction job {job_id} failed: {e}")
+        _update_job(job_id, status="failed", finished_at=time.time(), error=str(e))
+
+def submit_job(channel_id: str, months_history: int, full_resync: bool = False) -> Dict:
+    """Records a new extraction job and schedules it in the background."""
+    job_id = uuid.uuid4().hex
+    now = time.time()
+    # The window is fixed when the job is created so a resumed run covers the same range.
+    oldest_ts = (datetime.now() - timedelta(days=months_history * 30)).timestamp()
+    with _connect() as conn:
+        conn.execute(
+            """INSERT INTO extraction_jobs
+               (job_id, channel_id, months_history, full_resync, oldest_ts, status, created_at, updated_at)
+               VALUES (?, ?, ?, ?, ?, 'queued', ?, ?)""",
+            (job_id, channel_id, months_history, int(full_resync), oldest_ts, now, now)
+        )
+    _schedule(job_id)
+    return get_job(job_id)
+
+def resume_incomplete_jobs() -> int:
+    """
+    Re-schedules jobs left unfinished by an exited worker, from their last checkpoint.
+    Called at startup and then periodically, so a job orphaned by a worker on another
+    host is picked up once its checkpoints go stale, without waiting for a restart.
+    """
+    if _shutdown.is_set():
+        return 0
+    placeholders = ", ".join("?" for _ in RESUMABLE_STATUSES)
+    stale_before = time.time() - settings.EXTRACTION_JOB_STALE_SECONDS
+    with _connect() as conn:
+        rows = conn.execute(
+            f"SELECT job_id, status, owner, updated_at FROM extraction_jobs WHERE status IN ({placeholders}) ORDER BY created_at",
+            RESUMABLE_STATUSES
+        ).fetchall()
+    resumed = 0
+    for row in rows:
+        orphaned_owner = None
+        if row["status"] == "running":
+            if row["owner"] == WORKER_ID:
+                continue # Running in this process right now
+            if _owner_is_gone(row["owner"]):
+                orphaned_owner = row["owner"]
+            elif row["updated_at"] >= stale_before:
+                continue # Still owned by a live worker (or this one)
+        if _schedule(row["job_id"], orphaned_owner):
+            print(f"Resuming extraction job {row['job_id']}...")
+            resumed += 1
+    return resumed
+
+def shutdown_jobs():
+    """Asks running jobs to stop at their next checkpoint; they resume on the next startup."""
+    global _executor
+    _shutdown.set()
+    with _executor_lock:
+        if _executor is not None:
+            _executor.shutdown(wait=True, cancel_futures=True)
+            _executor = None
+    with _scheduled_lock:
+        _scheduled.clear()
@@ -0,0 +1,230 @@
+# src/services/gemini_client.py
+import asyncio
+import json
+import random
+import threading
+import time
+from typing import Any, AsyncIterator, Dict, Optional
+
+from ..config import settings
+from .metrics import RETRIES, record_llm_usage
+
+# HTTP status codes (exposed as `.code` on google.api_core errors) worth retrying.
+RETRYABLE_CODES = {429, 500, 502, 503, 504}
+
+
+class GeminiTimeoutError(Exception):
+    """The call didn't finish within its deadline, retries included."""
+
+
+def _is_retryable(error: Exception) -> bool:
+    return isinstance(error, asyncio.TimeoutError) or getattr(error, "code", None) in RETRYABLE_CODES
+
+
+class GeminiClient:
+    """
+    Shared async access to Gemini for every request worker.
+
+    - At most `max_in_flight` calls run at once; the rest wait for a slot
+      instead of piling up in the threadpool.
+    - Each call has a deadline covering queueing, retries and hedges.
+    - 429/5xx and timeouts are retried with jittered exponential backoff.
+    - With `hedge_after_seconds`, a second identical request is started if the
+      first hasn't answered by then (and a slot is free); the first to finish wins.
+
+    The API key is configured and GenerativeModel objects are built once per process.
+    """
+    def __init__(self, max_in_flight: int, timeout_seconds: float, max_retries: int, hedge_after_seconds: float = 0):
+        self.max_in_flight = max_in_flight
+        self.timeout_seconds = timeout_seconds
+        self.max_retries = max_retries
+        self.hedge_after_seconds = hedge_after_seconds
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._models: Dict[str, Any] = {}
+        self._configured = False
+        self._genai = None
+        self._lock = threading.Lock()
+        self.stats = {
+            "calls": 0,
+            "failures": 0,
+            "retries": 0,
+            "timeouts": 0,
+            "hedges": 0,
+            "hedge_wins": 0,
+            "queue_wait_seconds": 0.0,
+            "model_seconds": 0.0
+        }
+
+    def configure(self, genai=None):
+        """
+        Imports the SDK and sets the API key; done once, at startup or on first use.
+        `genai` replaces google.generativeai with a module of the same shape
+        (the benchmarks pass a deterministic local stand-in).
+        """
+        with self._lock:
+            if genai is not None:
+                self._models.clear()
+            elif not self._configured:
+                # Imported here: the SDK (and grpc) is slow to import and not needed until the first call.
+                import google.generativeai as genai
+            else:
+                return
+            genai.configure(api_key=settings.GOOGLE_API_KEY)
+            self._genai = genai
+            self._configured = True
+
+    def _model(self, model_name: str, generation_config: Optional[Dict] = None):
+        key = f"{model_name}:{json.dumps(generation_config, sort_keys=True, default=str)}"
+        self.configure()
+        with self._lock:
+            if key not in self._models:
+                self._models[key] = self._genai.GenerativeModel(model_name, generation_config=generation_config)
+            return self._models[key]
+
+    def _slots(self) -> asyncio.Semaphore:
+        # Created on first use so it belongs to the running event loop.
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_in_flight)
+        return self._semaphore
+
+    async def _acquire(self, deadline: float):
+        started = time.monotonic()
+        try:
+            await asyncio.wait_for(self._slots().acquire(), timeout=max(deadline - started, 0))
+        except asyncio.TimeoutError:
+            self.stats["timeouts"] += 1
+            raise GeminiTimeoutError("Timed out waiting for a free Gemini slot")
+        finally:
+            self.stats["queue_wait_seconds"] += time.monotonic() - started
+
+    async def _attempt(self, model, model_name: str, prompt: str, deadline: float) -> str:
+        """One request, bounded by the remaining deadline. The caller holds a slot."""
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            raise asyncio.TimeoutError()
+        response = await asyncio.wait_for(
+            model.generate_content_async(prompt, request_options={"timeout": remaining}),
+            timeout=remaining
+        )
+        record_llm_usage(model_name, getattr(response, "usage_metadata", None))
+        return response.text
+
+    async def _hedged_attempt(self, model, model_name: str, prompt: str, deadline: float) -> str:
+        """One attempt, plus a hedge if it's slow. Only the winner's latency counts as model time."""
+        winner_started = time.monotonic()
+        primary = asyncio.ensure_future(self._attempt(model, model_name, prompt, deadline))
+        pending = set()
+        try:
+            if not self.hedge_after_seconds:
+                return await primary
+
+            done, _ = await asyncio.wait({primary}, timeout=self.hedge_after_seconds)
+            # Only hedge with spare capacity, so hedges never queue behind real requests.
+            if done or self._slots().locked():
+                return await primary
+
+            await self._slots().acquire()
+            self.stats["hedges"] += 1
+            hedge_started = time.monotonic()
+            hedge = asyncio.ensure_future(self._attempt(model, model_name, prompt, deadline))
+            hedge.add_done_callback(lambda _: self._slots().release())
+            pending = {primary, hedge}
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        if task is hedge:
+                            self.stats["hedge_wins"] += 1
+                            winner_started = hedge_started
+                        return task.result()
+            # Both failed: surface the primary's error for the retry decision
+            return primary.result()
+        finally:
+            self.stats["model_seconds"] += time.monotonic() - winner_started
+            for task in pending:
+                task.cancel()
+
+    async def generate(self, model_name: str, prompt: str, generation_config: Optional[Dict] = None, timeout_seconds: Optional[float] = None) -> str:
+        """Returns the response text, retrying transient failures until the deadline."""
+        model = self._model(model_name, generation_config)
+        deadline = time.monotonic() + (timeout_seconds or self.timeout_seconds)
+        self.stats["calls"] += 1
+
+        await self._acquire(deadline)
+        try:
+            for attempt in range(self.max_retries + 1):
+                try:
+                    return await self._hedged_attempt(model, model_name, prompt, deadline)
+                except Exception as e:
+                    if attempt == self.max_retries or not _is_retryable(e):
+                        self.stats["failures"] += 1
+                        if isinstance(e, asyncio.TimeoutError):
+                            self.stats["timeouts"] += 1
+                            raise GeminiTimeoutError(f"Gemini call exceeded its deadline after {attempt + 1} attempt(s)") from e
+                        raise
+                    backoff = min(0.5 * (2 ** attempt), 8) * random.uniform(0.5, 1.5)
+                    if time.monotonic() + backoff >= deadline:
+                        self.stats["failures"] += 1
+                        self.stats["timeouts"] += 1
+                        raise GeminiTimeoutError("No time left in the deadline to retry the Gemini call") from e
+                    self.stats["retries"] += 1
+                    RETRIES.labels("gemini").inc()
+                    print(f"⚠️ Gemini call failed ({e}); retrying in {backoff:.1f}s...")
+                    await asyncio.sleep(backoff)
+        finally:
+            self._slots().release()
+
+    async def stream(self, model_name: str, prompt: str, generation_config: Optional[Dict] = None, timeout_seconds: Optional[float] = None) -> AsyncIterator[str]:
+        """
+        Yields response text chunks. Failures before the first chunk are retried
+        like generate(); once text has been yielded the call can't be replayed.
+        Streams aren't hedged.
+        """
+        model = self._model(model_name, generation_config)
+        deadline = time.monotonic() + (timeout_seconds or self.timeout_seconds)
+        self.stats["calls"] += 1
+
+        await self._acquire(deadline)
+        started = time.monotonic()
+        try:
+            for attempt in range(self.max_retries + 1):
+                yielded = False
+                try:
+                    response = await asyncio.wait_for(
+                        model.generate_content_async(prompt, stream=True, request_options={"timeout": deadline - time.monotonic()}),
+                        timeout=max(deadline - time.monotonic(), 0)
+                    )
+                    chunks = response.__aiter__()
+                    while True:
+                        try:
+                            chunk = await asyncio.wait_for(chunks.__anext__(), timeout=max(deadline - time.monotonic(), 0))
+                        except StopAsyncIteration:
+                            # Streamed responses report usage once, on the final chunk
+                            record_llm_usage(model_name, getattr(response, "usage_metadata", None))
+                            return
+                        if chunk.text:
+                            yielded = True
+                            yield chunk.text
+                except Exception as e:
+                    out_of_time = time.monotonic() >= deadline
+                    if yielded or out_of_time or attempt == self.max_retries or not _is_retryable(e):
+                        self.stats["failures"] += 1
+                        if isinstance(e, asyncio.TimeoutError):
+                            self.stats["timeouts"] += 1
+                            raise GeminiTimeoutError("Gemini stream exceeded its deadline") from e
+                        raise
+                    self.stats["retries"] += 1
+                    RETRIES.labels("gemini").inc()
+                    await asyncio.sleep(min(0.5 * (2 ** attempt), 8) * random.uniform(0.5, 1.5))
+        finally:
+            self.stats["model_seconds"] += time.monotonic() - started
+            self._slots().release()
+
+
+# --- Shared instance (one per worker process) ---
+gemini_client = GeminiClient(
+    max_in_flight=settings.GEMINI_MAX_IN_FLIGHT,
+    timeout_seconds=settings.GEMINI_TIMEOUT_SECONDS,
+    max_retries=settings.GEMINI_MAX_RETRIES,
+    hedge_after_seconds=settings.GEMINI_HEDGE_AFTER_SECONDS
+)
@@ -0,0 +1,163 @@
+# src/services/http_client.py
+import asyncio
+import importlib.util
+import random
+import threading
+import time
+from typing import Optional
+
+import httpx
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from ..config import settings
+from .metrics import EXTERNAL_CALLS, EXTERNAL_CALL_SECONDS, RATE_LIMITED, RETRIES, service_for_url
+
+# (connect, read) seconds, applied to every request that doesn't set its own.
+DEFAULT_TIMEOUT = (5, 30)
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+# Slack 429s are handled by the shared rate limiter, which pauses every worker
+# instead of having each call sleep on its own Retry-After.
+SLACK_RETRY_STATUSES = (500, 502, 503, 504)
+SLACK_URL_PREFIX = settings.SLACK_API_BASE_URL
+
+
+def slack_api_url(api_method: str) -> str:
+    """URL of a Slack Web API method under SLACK_API_BASE_URL."""
+    return f"{settings.SLACK_API_BASE_URL.rstrip('/')}/{api_method}"
+
+
+def _record_call(service: str, started: float, response=None):
+    outcome = str(response.status_code) if response is not None else "error"
+    EXTERNAL_CALLS.labels(service, outcome).inc()
+    EXTERNAL_CALL_SECONDS.labels(service).observe(time.perf_counter() - started)
+    if response is not None and response.status_code == 429:
+        RATE_LIMITED.labels(service).inc()
+
+
+class _PooledSession(requests.Session):
+    """A requests.Session that always applies a timeout and records call metrics."""
+    def request(self, method, url, **kwargs):
+        kwargs.setdefault("timeout", DEFAULT_TIMEOUT)
+        started = time.perf_counter()
+        try:
+            response = super().request(method, url, **kwargs)
+        except Exception:
+            _record_call(service_for_url(url), started)
+            raise
+        _record_call(service_for_url(url), started, response)
+        return response
+
+
+class _CountingRetry(Retry):
+    """urllib3 Retry that counts every retry it schedules."""
+    def increment(self, method=None, url=None, response=None, error=None, _pool=None, _stacktrace=None):
+        # Raises MaxRetryError once exhausted, so only retries that will be sent are counted
+        retry = super().increment(method, url, response, error, _pool, _stacktrace)
+        host = getattr(_pool, "host", None) or ""
+        RETRIES.labels(service_for_url(f"https://{host}")).inc()
+        return retry
+
+
+def _adapter(statuses, retry_posts: bool) -> HTTPAdapter:
+    retry = _CountingRetry(
+        total=settings.HTTP_MAX_RETRIES,
+        backoff_factor=0.5,
+        status_forcelist=statuses,
+        # None retries every method; otherwise urllib3's idempotent-only default.
+        allowed_methods=None if retry_posts else Retry.DEFAULT_ALLOWED_METHODS,
+        respect_retry_after_header=True,
+        raise_on_status=False # Hand the final response back so callers can inspect it
+    )
+    # pool_maxsize is the number of keep-alive connections kept per host.
+    return HTTPAdapter(
+        pool_connections=settings.HTTP_POOL_HOSTS,
+        pool_maxsize=settings.HTTP_POOL_MAXSIZE_PER_HOST,
+        max_retries=retry
+    )
+
+
+# --- Shared clients (one per worker process) ---
+_session: Optional[requests.Session] = None
+_session_lock = threading.Lock()
+_async_client: Optional[httpx.AsyncClient] = None
+
+
+def get_session() -> requests.Session:
+    """Returns the process-wide pooled session used by all blocking Slack/Jira calls."""
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                session = _PooledSession()
+                # Jira searches are POSTs but read-only, so they are safe to retry.
+                session.mount("https://", _adapter(RETRY_STATUSES, retry_posts=True))
+                session.mount("http://", _adapter(RETRY_STATUSES, retry_posts=True))
+                # A retried chat.postMessage could post twice, so Slack POSTs are not retried here.
+                session.mount(SLACK_URL_PREFIX, _adapter(SLACK_RETRY_STATUSES, retry_posts=False))
+                _session = session
+    return _session
+
+
+def get_async_client() -> httpx.AsyncClient:
+    """Returns the process-wide async client; HTTP/2 is used when the `h2` package is installed."""
+    global _async_client
+    if _async_client is None:
+        _async_client = httpx.AsyncClient(
+            http2=importlib.util.find_spec("h2") is not None,
+            limits=httpx.Limits(
+                max_connections=settings.HTTP_POOL_HOSTS * settings.HTTP_POOL_MAXSIZE_PER_HOST,
+                max_keepalive_connections=settings.HTTP_POOL_MAXSIZE_PER_HOST
+            ),
+            timeout=httpx.Timeout(DEFAULT_TIMEOUT[1], connect=DEFAULT_TIMEOUT[0])
+        )
+    return _async_client
+
+
+# Failures that happen before the request reaches the server, so even a POST is safe to resend.
+_NOT_SENT_ERRORS = (httpx.ConnectError, httpx.ConnectTimeout, httpx.PoolTimeout)
+
+
+async def async_request(method: str, url: str, retry_statuses=RETRY_STATUSES, **kwargs) -> httpx.Response:
+    """
+    Sends a request on the shared async client, retrying `retry_statuses` and
+    transport errors with jittered exponential backoff (honoring Retry-After).
+    For POSTs, only errors that happened before the request was sent are
+    retried, so a message is never delivered twice by this layer.
+    """
+    client = get_async_client()
+    service = service_for_url(url)
+    retry_errors = _NOT_SENT_ERRORS if method.upper() == "POST" else httpx.TransportError
+    for attempt in range(settings.HTTP_MAX_RETRIES + 1):
+        last_attempt = attempt == settings.HTTP_MAX_RETRIES
+        if attempt:
+            RETRIES.labels(service).inc()
+        started = time.perf_counter()
+        try:
+            response = await client.request(method, url, **kwargs)
+        except httpx.TransportError as e:
+            _record_call(service, started)
+            if last_attempt or not isinstance(e, retry_errors):
+                raise
+        else:
+            _record_call(service, started, response)
+            if response.status_code not in retry_statuses or last_attempt:
+                return response
+            retry_after = response.headers.get("Retry-After")
+            if retry_after and retry_after.isdigit():
+                await asyncio.sleep(int(retry_after))
+                continue
+        await asyncio.sleep(0.5 * (2 ** attempt) * random.uniform(0.5, 1.5))
+
+
+async def close_http_clients():
+    """Closes the pooled connections; called on application shutdown."""
+    global _session, _async_client
+    if _async_client is not None:
+        await _async_client.aclose()
+        _async_client = None
+    with _session_lock:
+        if _session is not None:
+            _session.close()
+            _session = None
@@ -1,8 +1,17 @@
 # src/services/jira_enricher.py
 import requests
 import re
-from functools import lru_cache
+import json
+import sqlite3
+import time
+from contextlib import contextmanager
+from typing import Dict, List, Optional
 from ..config import settings
+from .http_client import get_session
+
+# JQL `key in (...)` lists are kept well under Jira's query length limits.
+JQL_KEYS_PER_REQUEST = 100
+FULL_FIELDS = ["summary", "description", "comment", "updated"]
 
 # --- Jira Helper Functions ---
 
@@ -17,39 +26,166 @@ def _parse_adf_text(adf_node):
             text_content += _parse_adf_text(child_node)
     return text_content.strip()
 
-@lru_cache(maxsize=128) # Cache results for recently fetched tickets
-def fetch_jira_ticket_details(ticket_id: str):
-    """Fetches ticket summary, description, and comments from the Jira API."""
-    if not all([settings.JIRA_BASE_URL, settings.JIRA_USER_EMAIL, settings.JIRA_API_TOKEN]):
-        return None
+def _parse_issue_fields(fields: Dict) -> Dict:
+    """Turns an issue's 'fields' object into the summary/description/comments shape we store."""
+    description = _parse_adf_text(fields.get("description"))
+    
+    comments_data = []
+    if fields.get("comment", {}).get("comments"):
+        for comment in fields["comment"]["comments"]:
+            comments_data.append({
+                "author": comment.get("author", {}).get("displayName", "Unknown"),
+                "created": comment.get("created"),
+                "body": _parse_adf_text(comment.get("body"))
+            })
+    
+    return {
+        "summary": fields.get("summary"),
+        "description": description,
+        "comments": comments_data
+    }
 
-    try:
-        url = f"{settings.JIRA_BASE_URL.rstrip('/')}/rest/api/3/issue/{ticket_id}?fields=summary,description,comment"
-        auth = requests.auth.HTTPBasicAuth(settings.JIRA_USER_EMAIL, settings.JIRA_API_TOKEN)
-        headers = {"Accept": "application/json"}
-        
-        resp = requests.get(url, headers=headers, auth=auth, timeout=15)
+def _search_chunk(chunk: List[str], fields: List[str], found: Dict[str, Dict]):
+    """
+    One `key in (...)` query on the enhanced search endpoint, following nextPageToken.
+    Unlike the old /search, it can't be told to ignore keys it doesn't know
+    (regex matches like 'UTF-8'): a 400 is bisected until the bad keys are
+    isolated and dropped.
+    """
+    url = f"{settings.JIRA_BASE_URL.rstrip('/')}/rest/api/3/search/jql"
+    auth = requests.auth.HTTPBasicAuth(settings.JIRA_USER_EMAIL, settings.JIRA_API_TOKEN)
+    headers = {"Accept": "application/json", "Content-Type": "application/json"}
+    payload = {"jql": f"key in ({', '.join(chunk)})", "fields": fields, "maxResults": len(chunk)}
+    while True:
+        resp = get_session().post(url, headers=headers, auth=auth, json=payload, timeout=30)
+        if resp.status_code == 400:
+            if len(chunk) > 1:
+                middle = len(chunk) // 2
+                _search_chunk(chunk[:middle], fields, found)
+                _search_chunk(chunk[middle:], fields, found)
+            return
         resp.raise_for_status()
-        
         data = resp.json()
-        fields = data.get("fields", {})
-        
-        description = _parse_adf_text(fields.get("description"))
-        
-        comments_data = []
-        if fields.get("comment", {}).get("comments"):
-            for comment in fields["comment"]["comments"]:
-                comments_data.append({
-                    "author": comment.get("author", {}).get("displayName", "Unknown"),
-                    "created": comment.get("created"),
-                    "body": _parse_adf_text(comment.get("body"))
-                })
-        
-        return {
-            "summary": fields.get("summary"),
-            "description": description,
-            "comments": comments_data
-        }
+        for issue in data.get("issues", []):
+            found[issue["key"]] = issue.get("fields", {})
+        if data.get("isLast", True) or not data.get("nextPageToken"):
+            return
+        payload["nextPageToken"] = data["nextPageToken"]
+
+def _search_issues(ticket_ids: List[str], fields: List[str]) -> Dict[str, Dict]:
+    """
+    Resolves many tickets with JQL `key in (...)` searches instead of one request per ticket.
+    Returns {ticket_id: raw fields}; keys Jira doesn't know are simply absent.
+    """
+    found = {}
+    for i in range(0, len(ticket_ids), JQL_KEYS_PER_REQUEST):
+        _search_chunk(ticket_ids[i:i + JQL_KEYS_PER_REQUEST], fields, found)
+    return found
+
+# --- Persistent ticket cache ---
+
+@contextmanager
+def _connect_cache():
+    """Opens a short-lived connection, committing on success and always closing it."""
+    conn = sqlite3.connect(settings.JIRA_CACHE_PATH, timeout=30)
+    try:
+        with conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS jira_tickets (
+                    ticket_id TEXT PRIMARY KEY,
+                    details TEXT,
+                    updated TEXT,
+                    fetched_at REAL NOT NULL
+                )
+            """)
+            yield conn
+    finally:
+        conn.close()
+
+def _load_cached(ticket_ids: List[str]) -> Dict[str, tuple]:
+    placeholders = ", ".join("?" for _ in ticket_ids)
+    with _connect_cache() as conn:
+        rows = conn.execute(
+            f"SELECT ticket_id, details, updated, fetched_at FROM jira_tickets WHERE ticket_id IN ({placeholders})",
+            ticket_ids
+        ).fetchall()
+    return {row[0]: row[1:] for row in rows}
+
+def _store_cached(entries: List[tuple]):
+    """entries: (ticket_id, details dict or None for unknown keys, updated)."""
+    now = time.time()
+    with _connect_cache() as conn:
+        conn.executemany(
+            "INSERT OR REPLACE INTO jira_tickets (ticket_id, details, updated, fetched_at) VALUES (?, ?, ?, ?)",
+            [(ticket_id, json.dumps(details) if details is not None else None, updated, now)
+             for ticket_id, details, updated in entries]
+        )
+
+def _touch_cached(ticket_ids: List[str]):
+    now = time.time()
+    with _connect_cache() as conn:
+        conn.executemany("UPDATE jira_tickets SET fetched_at = ? WHERE ticket_id = ?", [(now, t) for t in ticket_ids])
+
+def fetch_jira_tickets_bulk(ticket_ids: List[str]) -> Dict[str, Dict]:
+    """
+    Fetches summary, description, and comments for many tickets at once.
+
+    Fresh cache entries are used as-is. Entries past JIRA_CACHE_TTL_HOURS are
+    revalidated with a cheap `updated`-only search and only re-fetched in full
+    if the ticket changed. Tickets Jira doesn't know about are cached as misses.
+    Returns {ticket_id: details} for the tickets that exist.
+    """
+    ticket_ids = sorted(set(ticket_ids))
+    if not ticket_ids or not all([settings.JIRA_BASE_URL, settings.JIRA_USER_EMAIL, settings.JIRA_API_TOKEN]):
+        return {}
+
+    cached = _load_cached(ticket_ids)
+    ttl_seconds = settings.JIRA_CACHE_TTL_HOURS * 3600
+    now = time.time()
+
+    results, stale = {}, []
+    to_fetch = [t for t in ticket_ids if t not in cached]
+    for ticket_id, (details, updated, fetched_at) in cached.items():
+        if now - fetched_at < ttl_seconds:
+            if details is not None:
+                results[ticket_id] = json.loads(details)
+        elif details is None:
+            to_fetch.append(ticket_id) # An expired miss has no `updated` to compare against
+        else:
+            stale.append(ticket_id)
+
+    try:
+        if stale:
+            current = _search_issues(stale, ["updated"])
+            unchanged = []
+            for ticket_id in stale:
+                details, updated, _ = cached[ticket_id]
+                if current.get(ticket_id, {}).get("updated") == updated:
+                    unchanged.append(ticket_id)
+                    results[ticket_id] = json.loads(details)
+                else:
+                    to_fetch.append(ticket_id)
+            _touch_cached(unchanged)
+
+        if to_fetch:
+            print(f"Fetching {len(to_fetch)} Jira tickets in bulk...")
+            found = _search_issues(to_fetch, FULL_FIELDS)
+            entries = []
+            for ticket_id in to_fetch:
+                fields = found.get(ticket_id)
+                details = _parse_issue_fields(fields) if fields is not None else None
+                entries.append((ticket_id, details, fields.get("updated") if fields else None))
+                if details is not None:
+                    results[ticket_id] = details
+            _store_cached(entries)
     except requests.exceptions.RequestException as e:
-        print(f"An error occurred while fetching Jira ticket {ticket_id}: {e}")
-        return None
\ No newline at end of file
+        print(f"An error occurred while fetching Jira tickets {to_fetch or stale}: {e}")
+        # Serve whatever we had, even if it's past its TTL.
+        for ticket_id in stale:
+            results.setdefault(ticket_id, json.loads(cached[ticket_id][0]))
+
+    return results
+
+def fetch_jira_ticket_details(ticket_id: str) -> Optional[Dict]:
+    """Fetches ticket summary, description, and comments from the Jira API (via the ticket cache)."""
+    return fetch_jira_tickets_bulk([ticket_id]).get(ticket_id)
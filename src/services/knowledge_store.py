@@ -1,28 +1,204 @@
 # src/services/knowledge_store.py
 
-import chromadb
-from sentence_transformers import SentenceTransformer
-from typing import List, Dict
+import hashlib
+import os
+import re
+import threading
+import time
+from datetime import datetime, timezone
+from typing import List, Dict, Optional, Callable
+
+from ..config import settings
+from .bm25_index import BM25Index, reciprocal_rank_fusion
+from .embeddings import create_embedding_backend, embedding_space
+from .embedding_cache import EmbeddingCache
+from .metrics import span
+
+# Matches the per-message headers written by KnowledgeStore._create_chunk_from_thread.
+_MESSAGE_HEADER = re.compile(r"^User '.*' (?:started a thread|replied):$", re.MULTILINE)
+_REPLIES_MARKER = "--- Replies ---"
+
+def _truncate_words(text: str, max_words: int) -> str:
+    words = text.split()
+    return text if len(words) <= max_words else " ".join(words[:max_words]) + " [...]"
+
+def _utc_epoch(value: datetime) -> float:
+    """Timestamps without a timezone are taken as UTC, like the stored datetime_utc."""
+    return (value if value.tzinfo else value.replace(tzinfo=timezone.utc)).timestamp()
+
+def _split_replies(chunk: str) -> List[str]:
+    """Returns the 'User ... replied:' messages contained in a chunk."""
+    starts = [m.start() for m in _MESSAGE_HEADER.finditer(chunk)]
+    messages = [chunk[start:end].strip() for start, end in zip(starts, starts[1:] + [len(chunk)])]
+    return [m for m in messages if " replied:\n" in m]
 
 class KnowledgeStore:
     """
     Manages the vector database (ChromaDB) and the embedding model.
     """
-    def __init__(self, path: str = "./chroma_db"):
-        # 1. Load a powerful but lightweight embedding model
-        print("Loading embedding model...")
-        self.model = SentenceTransformer('all-MiniLM-L6-v2')
+    def __init__(
+        self,
+        path: str = "./chroma_db",
+        model_name: str = "all-MiniLM-L6-v2",
+        bm25_path: str = "./bm25_index.sqlite3",
+        backend: str = "sentence-transformers"
+    ):
+        # 1. Load a powerful but lightweight embedding model (PyTorch or ONNX Runtime)
+        print(f"Loading embedding model ({backend})...")
+        self.model = create_embedding_backend(
+            backend,
+            model_name,
+            onnx_file=settings.EMBEDDING_ONNX_FILE,
+            max_tokens=settings.EMBEDDING_MAX_TOKENS,
+            threads=settings.EMBEDDING_ONNX_THREADS
+        )
+        # The tokenizer behind encode() is not safe to call from several threads
+        # at once, and the store is shared by every request worker.
+        self._encode_lock = threading.Lock()
+        # Called with the thread IDs of every upserted batch, e.g. to invalidate cached answers.
+        self._upsert_listeners: List[Callable[[List[str]], None]] = []
         
         # 2. Set up the ChromaDB client and collection
         # This will create the DB in a local folder named 'chroma_db'
+        self.path = path
+        import chromadb # Deferred so importing this module stays cheap; the store itself is built at startup
         self.client = chromadb.PersistentClient(path=path)
         
         # A 'collection' is like a table in a traditional database
         self.collection = self.client.get_or_create_collection(
             name="slack_knowledge_base"
         )
+        self.embedding_space = embedding_space(self.model)
+        self.needs_reindex = self._check_embedding_space()
+
+        # 3. Keyword index over whole threads, for exact identifiers (Jira keys, error codes)
+        self.lexical_index = BM25Index(bm25_path)
+
+        # 4. Vectors already computed for identical text, by this exact encoder
+        self.embedding_cache = EmbeddingCache(settings.EMBEDDING_CACHE_PATH, settings.EMBEDDING_CACHE_MAX_ENTRIES)
         print("Knowledge store initialized.")
 
+    def _check_embedding_space(self) -> bool:
+        """
+        Compares the model the collection was built with against the one loaded
+        now. Returns True (and warns) if stored vectors aren't comparable to new
+        query vectors, i.e. the collection must be re-indexed (see reindex()).
+        """
+        metadata = self.collection.metadata or {}
+        # Chunks stored before per-chunk stamps existed are in the collection's space
+        self.stored_embedding_space = metadata.get("embedding_space")
+        if self.stored_embedding_space == self.embedding_space:
+            return False
+        if self.stored_embedding_space and self.collection.count() > 0:
+            print(f"⚠️ Collection was embedded with '{self.stored_embedding_space}' but the loaded model is '{self.embedding_space}'. It is re-embedded before queries are served.")
+            return True
+        # New or pre-existing unstamped collection: record the current model.
+        self._stamp_collection()
+        return False
+
+    def _stamp_collection(self):
+        """Records the current embedding space on the collection."""
+        metadata = self.collection.metadata or {}
+        # (hnsw:* settings are fixed at creation and can't be passed to modify().)
+        self.collection.modify(metadata={
+            **{key: value for key, value in metadata.items() if not key.startswith("hnsw:")},
+            "embedding_space": self.embedding_space
+        })
+        self.stored_embedding_space = self.embedding_space
+
+    def reindex(self, page_size: int = 500) -> int:
+        """
+        Re-embeds every chunk that isn't in the current embedding space from the
+        documents Chroma already holds (no Slack or Jira calls), then stamps the
+        collection. Workers sharing the store take turns; whoever comes second
+        finds nothing left to do. Returns the number of chunks re-embedded.
+        """
+        import fcntl # POSIX only; deferred so importing the store works everywhere
+        with open(os.path.join(self.path, "reindex.lock"), "w") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            if (self.collection.metadata or {}).get("embedding_space") == self.embedding_space:
+                self.stored_embedding_space = self.embedding_space
+                self.needs_reindex = False
+                return 0
+
+            print(f"Re-embedding the collection into '{self.embedding_space}'...")
+            reembedded, offset = 0, 0
+            while True:
+                page = self.collection.get(include=["documents", "metadatas"], limit=page_size, offset=offset)
+                if not page["ids"]:
+                    break
+                offset += len(page["ids"])
+                stale = [
+                    i for i, metadata in enumerate(page["metadatas"])
+                    if (metadata or {}).get("embedding_space", self.stored_embedding_space) != self.embedding_space
+                ]
+                if not stale:
+                    continue
+                # update() keeps the row order, so the offset stays valid
+                self.collection.update(
+                    ids=[page["ids"][i] for i in stale],
+                    embeddings=self.embed_texts([page["documents"][i] for i in stale]),
+                    metadatas=[{**(page["metadatas"][i] or {}), "embedding_space": self.embedding_space} for i in stale]
+                )
+                reembedded += len(stale)
+                print(f"Re-embedded {reembedded} chunks...")
+
+            self._stamp_collection()
+            self.needs_reindex = False
+            print(f"✅ Re-index finished: {reembedded} chunks re-embedded.")
+            return reembedded
+
+    def encode(self, texts, batch_size: int = 32):
+        """Encodes a string or a list of strings with the shared model."""
+        with self._encode_lock:
+            return self.model.encode(texts, batch_size=batch_size)
+
+    def embed_texts(self, texts: List[str], batch_size: Optional[int] = None) -> List[List[float]]:
+        """
+        Returns one vector per text, encoding only texts that aren't in the
+        embedding cache (and duplicates within the batch only once).
+        """
+        hashes = [hashlib.sha256(text.encode("utf-8")).hexdigest() for text in texts]
+        with span("knowledge_store", "embedding_cache"):
+            vectors = self.embedding_cache.get_many(self.model.encoder_id, set(hashes))
+
+        missing = {text_hash: text for text_hash, text in zip(hashes, texts) if text_hash not in vectors}
+        if missing:
+            with span("knowledge_store", "encode"):
+                encoded = self.encode(list(missing.values()), batch_size=batch_size or settings.EMBEDDING_BATCH_SIZE)
+            new_vectors = dict(zip(missing.keys(), encoded))
+            with span("knowledge_store", "embedding_cache"):
+                self.embedding_cache.put_many(self.model.encoder_id, new_vectors)
+            vectors.update(new_vectors)
+        return [vectors[text_hash].tolist() for text_hash in hashes]
+
+    def add_upsert_listener(self, listener: Callable[[List[str]], None]):
+        """Registers a callback that receives the thread IDs of every upserted batch."""
+        self._upsert_listeners.append(listener)
+
+    def warm_up(self):
+        """Runs a throwaway encode so the first real query doesn't pay for lazy init."""
+        self.encode("warm-up query")
+        print("Embedding model warmed up.")
+        if len(self.lexical_index) == 0 and self.collection.count() > 0:
+            self.rebuild_lexical_index()
+
+    def rebuild_lexical_index(self, page_size: int = 1000):
+        """Re-creates the BM25 index from the documents already in the collection."""
+        print("Rebuilding BM25 index from the vector store...")
+        # Window chunks of one thread can land on different pages, so group everything first.
+        threads: Dict[str, List[str]] = {}
+        offset = 0
+        while True:
+            page = self.collection.get(include=["documents", "metadatas"], limit=page_size, offset=offset)
+            if not page["ids"]:
+                break
+            for doc_id, document, metadata in zip(page["ids"], page["documents"], page["metadatas"]):
+                threads.setdefault((metadata or {}).get("thread_id", doc_id), []).append(document)
+            offset += page_size
+        self.lexical_index.upsert({thread_id: "\n".join(chunks) for thread_id, chunks in threads.items()})
+        print(f"BM25 index rebuilt with {len(threads)} threads.")
+
     def _create_chunk_from_thread(self, thread: Dict) -> str:
         """
         Creates a single text document from a Slack thread for embedding.
@@ -39,47 +215,378 @@ class KnowledgeStore:
         
         return text.strip()
 
-    def add_thread(self, thread: Dict):
+    def _create_chunks_from_thread(self, thread: Dict) -> List[str]:
         """
-        Processes a single Slack thread, creates an embedding, and stores it.
+        Splits a thread into the documents that get embedded, according to CHUNKING_MODE.
+
+        'thread' keeps one document per thread. 'window' exists because
+        all-MiniLM-L6-v2 only looks at the first 256 word pieces: every chunk
+        repeats the (shortened) parent for context and then covers a window of
+        replies of at most CHUNK_MAX_WORDS words, overlapping the previous
+        window by CHUNK_REPLY_OVERLAP replies, so late replies get embedded too.
         """
-        thread_id = thread['ts'] # Use the thread timestamp as a unique ID
-        
-        document = self._create_chunk_from_thread(thread)
-        
-        # ChromaDB can handle embedding internally, but doing it explicitly
-        # gives us more control and allows using any model.
-        vector = self.model.encode(document).tolist()
-        
+        if settings.CHUNKING_MODE != "window" or not thread['replies']:
+            return [self._create_chunk_from_thread(thread)]
+
+        parent_text = _truncate_words(thread['text'], settings.CHUNK_PARENT_MAX_WORDS)
+        header = f"User '{thread['user']}' started a thread:\n{parent_text}\n\n{_REPLIES_MARKER}\n"
+        replies = [f"User '{reply['user']}' replied:\n{reply['text']}\n" for reply in thread['replies']]
+        reply_budget = max(settings.CHUNK_MAX_WORDS - len(header.split()), 1)
+
+        chunks, start = [], 0
+        while start < len(replies):
+            end, words = start, 0
+            # Always take at least one reply, even if it alone is over budget.
+            while end < len(replies) and (end == start or words + len(replies[end].split()) <= reply_budget):
+                words += len(replies[end].split())
+                end += 1
+            chunks.append((header + "".join(replies[start:end])).strip())
+            if end == len(replies):
+                break
+            start = max(end - settings.CHUNK_REPLY_OVERLAP, start + 1)
+        return chunks
+
+    def _chunk_id(self, thread_id: str, index: int) -> str:
+        # Thread-level documents keep the bare thread ts as their ID, as before.
+        return thread_id if settings.CHUNKING_MODE != "window" else f"{thread_id}#{index}"
+
+    def _metadata_for_thread(self, thread: Dict, document: str, chunk_index: int = 0, channel_id: Optional[str] = None) -> Dict:
         metadata = {
             "user": thread['user'],
             "datetime_utc": thread['datetime_utc'],
+            "ts_epoch": float(thread['ts']), # Numeric copy of the timestamp for range filters
             "reply_count": thread['reply_count'],
-            "source": "slack"
+            "has_jira_ticket": any(message.get('jira_tickets') for message in [thread, *thread['replies']]),
+            "source": "slack",
+            "thread_id": thread['ts'],
+            "chunk_index": chunk_index,
+            "content_hash": hashlib.sha256(document.encode("utf-8")).hexdigest(),
+            "embedding_space": self.embedding_space
         }
-        
-        # 'Upsert' will add the document if the ID doesn't exist, 
+        # Chroma metadata values can't be None
+        if channel_id:
+            metadata["channel_id"] = channel_id
+        return metadata
+
+    def _delete_stale_chunks(self, thread_ids: List[str], keep_ids: set):
+        """Removes chunks of these threads that the new chunking no longer produces."""
+        existing = set(self.collection.get(ids=thread_ids, include=[])["ids"])
+        existing.update(self.collection.get(where={"thread_id": {"$in": thread_ids}}, include=[])["ids"])
+        stale = list(existing - keep_ids)
+        if stale:
+            self.collection.delete(ids=stale)
+
+    def _existing_metadata(self, ids: List[str]) -> Dict[str, Dict]:
+        """Looks up the metadata (including the content hash) already stored for each of the given IDs."""
+        existing = self.collection.get(ids=ids, include=["metadatas"])
+        return {
+            doc_id: meta or {}
+            for doc_id, meta in zip(existing["ids"], existing["metadatas"])
+        }
+
+    def add_thread(self, thread: Dict):
+        """
+        Processes a single Slack thread, creates an embedding, and stores it.
+        """
+        self.add_threads([thread])
+
+    def add_threads(self, threads: List[Dict], channel_id: Optional[str] = None, batch_size: Optional[int] = None) -> int:
+        """
+        Embeds and stores a batch of Slack threads with one encode call and one upsert.
+        Threads whose document text is unchanged since the last upsert are not
+        re-embedded; only their metadata is refreshed if it differs.
+        Returns the number of threads (re-)embedded.
+        """
+        if not threads:
+            return 0
+
+        ids, documents, metadatas = [], [], []
+        for thread in threads:
+            # IDs derive from the thread timestamp, which is unique per thread
+            for index, chunk in enumerate(self._create_chunks_from_thread(thread)):
+                ids.append(self._chunk_id(thread['ts'], index))
+                documents.append(chunk)
+                metadatas.append(self._metadata_for_thread(thread, chunk, index, channel_id))
+
+        with span("knowledge_store", "change_detection"):
+            self._delete_stale_chunks([thread['ts'] for thread in threads], set(ids))
+            stored = self._existing_metadata(ids)
+        # A chunk is re-embedded when its text changed or it was embedded by another model
+        unchanged = {
+            doc_id for doc_id, meta in zip(ids, metadatas)
+            if doc_id in stored
+            and stored[doc_id].get("content_hash") == meta["content_hash"]
+            and stored[doc_id].get("embedding_space", self.stored_embedding_space) == self.embedding_space
+        }
+        changed = [i for i, doc_id in enumerate(ids) if doc_id not in unchanged]
+        # Same text but new metadata (e.g. fields added since it was stored): no re-embed needed
+        refreshed = [i for i, (doc_id, meta) in enumerate(zip(ids, metadatas)) if doc_id in unchanged and stored[doc_id] != meta]
+        if refreshed:
+            self.collection.update(ids=[ids[i] for i in refreshed], metadatas=[metadatas[i] for i in refreshed])
+        if not changed:
+            print(f"All {len(threads)} threads unchanged; nothing to re-embed.")
+            return 0
+        ids = [ids[i] for i in changed]
+        documents = [documents[i] for i in changed]
+        metadatas = [metadatas[i] for i in changed]
+        changed_threads = list(dict.fromkeys(meta["thread_id"] for meta in metadatas))
+
+        # ChromaDB can handle embedding internally, but doing it explicitly
+        # gives us more control and allows using any model.
+        vectors = self.embed_texts(documents, batch_size=batch_size)
+
+        # 'Upsert' will add the document if the ID doesn't exist,
         # or update it if it does.
-        self.collection.upsert( # CHANGED from .add() to .upsert()
-            ids=[thread_id],
-            embeddings=[vector],
-            documents=[document],
-            metadatas=[metadata]
-        )
-        print(f"Upserted thread {thread_id} in knowledge base.")
+        with span("knowledge_store", "vector_upsert"):
+            self.collection.upsert(
+                ids=ids,
+                embeddings=vectors,
+                documents=documents,
+                metadatas=metadatas
+            )
+        # BM25 has no input limit, so it indexes the whole thread rather than its windows
+        changed_set = set(changed_threads)
+        with span("knowledge_store", "bm25_upsert"):
+            self.lexical_index.upsert({
+                thread['ts']: self._create_chunk_from_thread(thread)
+                for thread in threads if thread['ts'] in changed_set
+            })
+        print(f"Upserted {len(ids)} chunks of {len(changed_threads)} threads in knowledge base ({len(threads) - len(changed_threads)} unchanged).")
+        for listener in self._upsert_listeners:
+            listener(changed_threads)
+        return len(changed_threads)
+
+
+    def embed_query(self, query_text: str) -> List[float]:
+        """Creates the embedding for a user's query."""
+        return self.embed_texts([query_text])[0]
 
+    @staticmethod
+    def _merge_chunks(chunks: List[str]) -> str:
+        """Rebuilds one thread document from its matched chunks, without repeating overlapping replies."""
+        merged = chunks[0]
+        seen = set(_split_replies(chunks[0]))
+        for chunk in chunks[1:]:
+            new_replies = [reply for reply in _split_replies(chunk) if reply not in seen]
+            seen.update(new_replies)
+            if new_replies:
+                merged += "\n[...]\n" + "\n".join(new_replies)
+        return merged
 
-    def query_knowledge(self, query_text: str, n_results: int = 5) -> Dict:
+    def _aggregate_by_thread(self, results: Dict, n_results: int) -> Dict:
         """
-        Searches the knowledge base for relevant documents.
+        Collapses chunk-level hits into thread-level results (same shape as
+        collection.query): each thread is ranked by its best chunk's distance and
+        its document is built from all of its matched chunks.
         """
-        # Create an embedding for the user's query
-        query_vector = self.model.encode(query_text).tolist()
-        
-        # Query the collection
-        results = self.collection.query(
-            query_embeddings=[query_vector],
-            n_results=n_results
-        )
-        
-        return results
\ No newline at end of file
+        threads = {}
+        for doc_id, document, metadata, distance in zip(results['ids'][0], results['documents'][0], results['metadatas'][0], results['distances'][0]):
+            metadata = metadata or {}
+            thread_id = metadata.get("thread_id", doc_id)
+            hit = threads.setdefault(thread_id, {"metadata": metadata, "distance": distance, "chunks": []})
+            hit["chunks"].append((metadata.get("chunk_index", 0), document))
+            if distance < hit["distance"]:
+                hit["metadata"], hit["distance"] = metadata, distance
+
+        ranked = sorted(threads.items(), key=lambda item: item[1]["distance"])[:n_results]
+        return {
+            "ids": [[thread_id for thread_id, _ in ranked]],
+            "documents": [[self._merge_chunks([doc for _, doc in sorted(hit["chunks"])]) for _, hit in ranked]],
+            "metadatas": [[hit["metadata"] for _, hit in ranked]],
+            "distances": [[hit["distance"] for _, hit in ranked]]
+        }
+
+    @staticmethod
+    def build_where(filters: Optional[Dict]) -> Optional[Dict]:
+        """
+        Translates query filters into a Chroma `where` clause, so the vector
+        search only considers matching threads. Supported keys: channel_id,
+        since / until (datetimes), has_jira_ticket and min_replies.
+        """
+        filters = filters or {}
+        conditions = []
+        if filters.get("channel_id"):
+            conditions.append({"channel_id": filters["channel_id"]})
+        if filters.get("since"):
+            conditions.append({"ts_epoch": {"$gte": _utc_epoch(filters["since"])}})
+        if filters.get("until"):
+            conditions.append({"ts_epoch": {"$lte": _utc_epoch(filters["until"])}})
+        if filters.get("has_jira_ticket") is not None:
+            conditions.append({"has_jira_ticket": filters["has_jira_ticket"]})
+        if filters.get("min_replies"):
+            conditions.append({"reply_count": {"$gte": filters["min_replies"]}})
+        if not conditions:
+            return None
+        return conditions[0] if len(conditions) == 1 else {"$and": conditions}
+
+    def _dense_search_many(self, query_vectors: List[List[float]], n_results: int, where: Optional[Dict] = None) -> List[Dict]:
+        """One Chroma query for all vectors; returns thread-level results per vector."""
+        # Several chunks can belong to one thread, so ask for more and collapse them.
+        n_chunks = n_results * settings.CHUNK_QUERY_OVERFETCH if settings.CHUNKING_MODE == "window" else n_results
+        with span("knowledge_store", "vector_search"):
+            results = self.collection.query(
+                query_embeddings=query_vectors,
+                n_results=n_chunks,
+                where=where
+            )
+        per_query = []
+        for i in range(len(query_vectors)):
+            single = {key: [results[key][i]] for key in ("ids", "documents", "metadatas", "distances")}
+            single = self._aggregate_by_thread(single, n_results)
+            # Embeddings are unit-length, so the squared L2 distance maps onto cosine similarity.
+            single["scores"] = [[1 - distance / 2 for distance in single["distances"][0]]]
+            per_query.append(single)
+        return per_query
+
+    def _get_threads(self, thread_ids: List[str], where: Optional[Dict] = None) -> Dict[str, Dict]:
+        """Loads the stored document and metadata of threads (that match `where`), by thread ID."""
+        # Chunks are matched by their thread_id metadata; rows written before chunking by their ID.
+        by_thread = {"thread_id": {"$in": thread_ids}}
+        ids, documents, metadatas = [], [], []
+        for page in (
+            self.collection.get(where={"$and": [by_thread, where]} if where else by_thread, include=["documents", "metadatas"]),
+            self.collection.get(ids=thread_ids, where=where, include=["documents", "metadatas"])
+        ):
+            for doc_id, document, metadata in zip(page["ids"], page["documents"], page["metadatas"]):
+                if doc_id not in ids:
+                    ids.append(doc_id)
+                    documents.append(document)
+                    metadatas.append(metadata)
+        results = {"ids": [ids], "documents": [documents], "metadatas": [metadatas], "distances": [[0.0] * len(ids)]}
+        aggregated = self._aggregate_by_thread(results, len(thread_ids))
+        return {
+            thread_id: {"document": document, "metadata": metadata}
+            for thread_id, document, metadata in zip(aggregated["ids"][0], aggregated["documents"][0], aggregated["metadatas"][0])
+        }
+
+    def _hybrid_search_many(self, query_texts: List[str], dense_results: List[Dict], n_results: int, n_lexical: int, where: Optional[Dict] = None) -> List[Dict]:
+        """
+        Fuses each query's dense and BM25 rankings with reciprocal rank fusion,
+        so threads that match an exact identifier surface even when their
+        embedding doesn't. BM25-only hits have no vector distance and report None.
+        """
+        hits = {}
+        for dense in dense_results:
+            for thread_id, document, metadata, distance in zip(dense["ids"][0], dense["documents"][0], dense["metadatas"][0], dense["distances"][0]):
+                hits.setdefault(thread_id, {"document": document, "metadata": metadata, "distance": None})
+
+        # BM25 knows nothing about metadata, so its candidates are filtered through
+        # Chroma; threads shared by several queries are fetched once.
+        with span("knowledge_store", "bm25_search"):
+            lexical = [[doc_id for doc_id, _ in self.lexical_index.search(text, n_lexical)] for text in query_texts]
+        missing = list(dict.fromkeys(thread_id for ranking in lexical for thread_id in ranking if thread_id not in hits))
+        if missing:
+            with span("knowledge_store", "bm25_fetch"):
+                for thread_id, hit in self._get_threads(missing, where).items():
+                    hits[thread_id] = {**hit, "distance": None}
+
+        fused_results = []
+        for dense, ranking in zip(dense_results, lexical):
+            distances = dict(zip(dense["ids"][0], dense["distances"][0]))
+            ranking = [thread_id for thread_id in ranking if thread_id in hits]
+            fused = reciprocal_rank_fusion([dense["ids"][0], ranking], k=settings.RRF_K)[:n_results]
+            fused_results.append({
+                "ids": [[thread_id for thread_id, _ in fused]],
+                "documents": [[hits[thread_id]["document"] for thread_id, _ in fused]],
+                "metadatas": [[hits[thread_id]["metadata"] for thread_id, _ in fused]],
+                "distances": [[distances.get(thread_id) for thread_id, _ in fused]],
+                "scores": [[score for _, score in fused]]
+            })
+        return fused_results
+
+    @staticmethod
+    def _apply_recency_decay(results: Dict, half_life_days: float, n_results: int) -> Dict:
+        """Re-ranks by score * 0.5 ** (age / half-life) and keeps the top n_results."""
+        now = time.time()
+        decayed = []
+        for i, (metadata, score) in enumerate(zip(results["metadatas"][0], results["scores"][0])):
+            metadata = metadata or {}
+            thread_ts = metadata.get("ts_epoch")
+            if thread_ts is None and metadata.get("datetime_utc"):
+                thread_ts = _utc_epoch(datetime.fromisoformat(metadata["datetime_utc"]))
+            age_days = max(now - thread_ts, 0) / 86400 if thread_ts is not None else 0
+            decayed.append((score * 0.5 ** (age_days / half_life_days), i))
+
+        ranked = sorted(decayed, key=lambda item: item[0], reverse=True)[:n_results]
+        reranked = {key: [[results[key][0][i] for _, i in ranked]] for key in ("ids", "documents", "metadatas", "distances")}
+        reranked["scores"] = [[score for score, _ in ranked]]
+        return reranked
+
+    def query_knowledge(
+        self,
+        query_text: str,
+        n_results: int = 5,
+        query_vector: Optional[List[float]] = None,
+        retrieval_mode: str = "dense",
+        filters: Optional[Dict] = None,
+        recency_half_life_days: Optional[float] = None
+    ) -> Dict:
+        """
+        Searches the knowledge base for relevant threads.
+        Pass query_vector to reuse an embedding the caller already computed.
+        retrieval_mode is "dense" (vectors only) or "hybrid" (vectors + BM25, fused).
+        filters are pushed down into the Chroma query (see build_where), and
+        recency_half_life_days re-ranks a wider candidate set so fresher threads win ties.
+        """
+        return self.query_knowledge_many(
+            [query_text],
+            n_results=n_results,
+            query_vectors=[query_vector] if query_vector is not None else None,
+            retrieval_mode=retrieval_mode,
+            filters=filters,
+            recency_half_life_days=recency_half_life_days
+        )[0]
+
+    def query_knowledge_many(
+        self,
+        query_texts: List[str],
+        n_results: int = 5,
+        query_vectors: Optional[List[List[float]]] = None,
+        retrieval_mode: str = "dense",
+        filters: Optional[Dict] = None,
+        recency_half_life_days: Optional[float] = None
+    ) -> List[Dict]:
+        """
+        query_knowledge for several queries sharing the same options: one
+        embedding batch and one Chroma query for all of them. Returns one
+        result dict per query, in order.
+        """
+        # Create embeddings for the user's queries
+        if query_vectors is None:
+            query_vectors = self.embed_texts(query_texts)
+
+        where = self.build_where(filters)
+        n_candidates = n_results * settings.RECENCY_CANDIDATES_PER_RESULT if recency_half_life_days else n_results
+        if retrieval_mode == "hybrid":
+            pool = n_candidates * settings.HYBRID_CANDIDATES_PER_RESULT
+            dense = self._dense_search_many(query_vectors, pool, where)
+            results = self._hybrid_search_many(query_texts, dense, n_candidates, pool, where)
+        else:
+            results = self._dense_search_many(query_vectors, n_candidates, where)
+
+        if recency_half_life_days:
+            results = [self._apply_recency_decay(result, recency_half_life_days, n_results) for result in results]
+        return results
+
+
+# --- Shared instance (one per worker process) ---
+_store: Optional[KnowledgeStore] = None
+_store_lock = threading.Lock()
+
+def get_knowledge_store() -> KnowledgeStore:
+    """Returns the process-wide KnowledgeStore, creating it on first use."""
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                _store = KnowledgeStore(
+                    path=settings.CHROMA_DB_PATH,
+                    model_name=settings.EMBEDDING_MODEL_NAME,
+                    bm25_path=settings.BM25_INDEX_PATH,
+                    backend=settings.EMBEDDING_BACKEND
+                )
+    return _store
+
+def peek_knowledge_store() -> Optional[KnowledgeStore]:
+    """Returns the KnowledgeStore if it has been created, without loading it."""
+    return _store
@@ -1,19 +1,24 @@
 # src/services/llm_handler.py
 
-import google.generativeai as genai # CHANGED: Import Google's library
-from typing import List, Dict
-from ..config import settings
-from .slack_extractor import usergroup_cache, _load_usergroups
+from typing import List, Dict, AsyncIterator
+from .block_kit import BlockStreamParser, BLOCK_KIT_RESPONSE_SCHEMA, parse_blocks_response, repair_stats
+from .gemini_client import gemini_client
+from .metrics import span
+from .user_directory import usergroup_cache # Loaded in the background at startup
 from datetime import datetime
 import json
-from .slack_extractor import usergroup_cache
-# CHANGED: Configure the Gemini client with the API key
-genai.configure(api_key=settings.GOOGLE_API_KEY)
 
-if not usergroup_cache:
-    headers = {"Authorization": f"Bearer {settings.SLACK_BOT_TOKEN}"}
-    _load_usergroups(headers)
+ANSWER_MODEL = 'gemini-1.5-flash-latest'
+BLOCK_KIT_MODEL = 'gemini-2.0-flash-lite-001'
 
+# JSON mode constrained to the Block Kit subset we accept, for the v2 answers.
+BLOCK_KIT_GENERATION_CONFIG = {
+    "response_mime_type": "application/json",
+    "response_schema": BLOCK_KIT_RESPONSE_SCHEMA
+}
+
+# Returned instead of an answer when generation fails; callers must not cache it.
+GENERATION_ERROR_MESSAGE = "Sorry, I encountered an error while generating the answer."
 
 
 # def generate_answer(question: str, context: List[Dict]):
@@ -92,10 +97,8 @@ if not usergroup_cache:
 #         return "Sorry, I encountered an error while generating the answer."
 
 
-def generate_answer(question: str, context: List[Dict], user_name: str = "Team Member"):
-    """
-    Uses Google's Gemini model to generate an answer based on the provided context.
-    """
+def _build_prompt(question: str, context: List[Dict], user_name: str) -> str:
+    """Builds the markdown-analysis prompt used by generate_answer and stream_answer."""
     
     context_documents = context
     
@@ -154,30 +157,36 @@ Hi {user_name}, I've received your query. Here is my analysis based on past inci
 **Begin your response now.**
     """
 
+    # Pass the full context to the model using .format()
+    return prompt.format(
+        question=question,
+        context_documents=json.dumps(context_documents, indent=2),
+        usergroup_cache=json.dumps(usergroup_cache, indent=2),
+        user_name=user_name
+    )
+
+
+async def generate_answer(question: str, context: List[Dict], user_name: str = "Team Member"):
+    """
+    Uses Google's Gemini model to generate an answer based on the provided context.
+    """
     try:
-        model = genai.GenerativeModel('gemini-1.5-flash-latest')
-        
-        # Pass the full context to the model using .format()
-        full_prompt_with_context = prompt.format(
-            question=question,
-            context_documents=json.dumps(context_documents, indent=2),
-            usergroup_cache=json.dumps(usergroup_cache, indent=2),
-            user_name=user_name
-        )
-
-        response = model.generate_content(full_prompt_with_context)
-        
-        return response.text
+        return await gemini_client.generate(ANSWER_MODEL, _build_prompt(question, context, user_name))
     except Exception as e:
         print(f"Error calling Google API: {e}")
-        return "Sorry, I encountered an error while generating the answer."
+        return GENERATION_ERROR_MESSAGE
 
 
-def generate_answer_v2(question: str, context: List[Dict], user_name: str = "Team Member"):
+async def stream_answer(question: str, context: List[Dict], user_name: str = "Team Member") -> AsyncIterator[str]:
     """
-    Uses Google's Gemini model to generate a rich Slack Block Kit JSON object,
-    which is then parsed into a Python dictionary.
+    Same as generate_answer, but yields the answer text chunk by chunk as Gemini produces it.
     """
+    async for text in gemini_client.stream(ANSWER_MODEL, _build_prompt(question, context, user_name)):
+        yield text
+
+
+def _build_prompt_v2(question: str, context: List[Dict], user_name: str) -> str:
+    """Builds the Block Kit prompt used by generate_answer_v2 and stream_answer_v2."""
     
     context_documents = context
 
@@ -229,14 +238,23 @@ __USERGROUP_CACHE__
 **Begin your JSON output now.**
     """
 
+    # Safely build the prompt using chained .replace() calls.
+    return (prompt_template
+        .replace("__QUESTION__", json.dumps(question, ensure_ascii=False))
+        .replace("__CONTEXT_DOCUMENTS__", json.dumps(context_documents, ensure_ascii=False))
+        .replace("__USER_NAME__", json.dumps(user_name, ensure_ascii=False))
+        .replace("__USERGROUP_CACHE__", json.dumps(usergroup_cache, ensure_ascii=False))
+    )
+
+
+async def generate_answer_v2(question: str, context: List[Dict], user_name: str = "Team Member"):
+    """
+    Uses Google's Gemini model to generate a rich Slack Block Kit JSON object,
+    which is then parsed into a Python dictionary.
+    """
+    response_text = None
     try:
-        # Safely build the prompt using chained .replace() calls.
-        full_prompt = (prompt_template
-            .replace("__QUESTION__", json.dumps(question, ensure_ascii=False))
-            .replace("__CONTEXT_DOCUMENTS__", json.dumps(context_documents, ensure_ascii=False))
-            .replace("__USER_NAME__", json.dumps(user_name, ensure_ascii=False))
-            .replace("__USERGROUP_CACHE__", json.dumps(usergroup_cache, ensure_ascii=False))
-        )
+        full_prompt = _build_prompt_v2(question, context, user_name)
         
         # # --- Crucial Debugging Step ---
         # print("\n--- PROMPT SENT TO GEMINI ---\n")
@@ -244,20 +262,34 @@ __USERGROUP_CACHE__
         # print("\n-----------------------------\n")
         # # --------------------------------
 
-        genai.configure(api_key=settings.GOOGLE_API_KEY)
-        model = genai.GenerativeModel('gemini-2.0-flash-lite-001')
-        
-        response_text = model.generate_content(full_prompt).text
-        
-        if response_text.strip().startswith("```json"):
-            response_text = response_text.strip()[7:-3].strip()
-
-        return json.loads(response_text)
-
-    except json.JSONDecodeError as e:
-        print(f"❌ LLM did not return valid JSON: {e}")
-        print(f"Raw response from LLM:\n---\n{response_text}\n---")
-        return {"blocks": [{"type": "section", "text": {"type": "mrkdwn", "text": "Sorry, the AI returned an invalid response. Please check the server logs."}}]}
+        response_text = await gemini_client.generate(BLOCK_KIT_MODEL, full_prompt, generation_config=BLOCK_KIT_GENERATION_CONFIG)
+
+        with span("llm", "parse_blocks"):
+            answer_json, repaired = parse_blocks_response(response_text)
+        if repaired:
+            print("⚠️ LLM response needed local repair before it was valid Block Kit.")
+        return answer_json
+
+    except ValueError as e:
+        if response_text is None:
+            # response.text raises ValueError when the candidate was blocked or came back empty
+            repair_stats["failed"] += 1
+            print(f"❌ LLM returned no usable text: {e}")
+        else:
+            print(f"❌ LLM did not return usable Block Kit JSON: {e}")
+            print(f"Raw response from LLM:\n---\n{response_text}\n---")
+        return {"error": True, "blocks": [{"type": "section", "text": {"type": "mrkdwn", "text": "Sorry, the AI returned an invalid response. Please check the server logs."}}]}
     except Exception as e:
         print(f"An error occurred during the API call: {e}")
-        return {"blocks": [{"type": "section", "text": {"type": "mrkdwn", "text": "An unexpected error occurred while generating the analysis."}}]}
\ No newline at end of file
+        return {"error": True, "blocks": [{"type": "section", "text": {"type": "mrkdwn", "text": "An unexpected error occurred while generating the analysis."}}]}
+
+
+async def stream_answer_v2(question: str, context: List[Dict], user_name: str = "Team Member") -> AsyncIterator[Dict]:
+    """
+    Streams the Block Kit answer: yields each block as soon as it is complete
+    in Gemini's output and passes validation.
+    """
+    parser = BlockStreamParser()
+    async for text in gemini_client.stream(BLOCK_KIT_MODEL, _build_prompt_v2(question, context, user_name), generation_config=BLOCK_KIT_GENERATION_CONFIG):
+        for block in parser.feed(text):
+            yield block
@@ -0,0 +1,147 @@
+# src/services/metrics.py
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import List, Optional, Tuple
+from urllib.parse import urlsplit
+
+from prometheus_client import Counter, Histogram, REGISTRY
+from prometheus_client.core import CounterMetricFamily, GaugeMetricFamily
+
+from ..config import settings
+
+# Spans from 1 ms (cache hits) to 2 min (long Gemini generations or Slack backoffs).
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+
+STAGE_SECONDS = Histogram(
+    "synapse_stage_seconds",
+    "Time spent in each stage of the query and extraction pipelines.",
+    ["pipeline", "stage"],
+    buckets=LATENCY_BUCKETS
+)
+EXTERNAL_CALLS = Counter(
+    "synapse_external_calls_total",
+    "Outbound HTTP calls by service and outcome (HTTP status, or 'error').",
+    ["service", "outcome"]
+)
+EXTERNAL_CALL_SECONDS = Histogram(
+    "synapse_external_call_seconds",
+    "Latency of outbound HTTP calls, retries included.",
+    ["service"],
+    buckets=LATENCY_BUCKETS
+)
+RETRIES = Counter(
+    "synapse_retries_total",
+    "Retried outbound calls by service.",
+    ["service"]
+)
+RATE_LIMIT_SLEEP_SECONDS = Counter(
+    "synapse_rate_limit_sleep_seconds_total",
+    "Time callers spent blocked by the Slack rate limiter, by tier.",
+    ["tier"]
+)
+RATE_LIMITED = Counter(
+    "synapse_rate_limited_total",
+    "Responses that told us to back off (HTTP 429 or Slack 'ratelimited'), by service.",
+    ["service"]
+)
+LLM_TOKENS = Counter(
+    "synapse_llm_tokens_total",
+    "Gemini tokens by model and kind (prompt or completion).",
+    ["model", "kind"]
+)
+
+# Server-Timing entries for the current request; None when the header is off.
+_server_timings: ContextVar[Optional[List[Tuple[str, float]]]] = ContextVar("server_timings", default=None)
+
+
+def service_for_url(url: str) -> str:
+    """Groups outbound calls into slack / jira / gemini / <host>."""
+    host = urlsplit(url).hostname or "unknown"
+    if host.endswith("slack.com") or url.startswith(settings.SLACK_API_BASE_URL):
+        return "slack"
+    if host.endswith("atlassian.net") or "jira" in host or (settings.JIRA_BASE_URL and url.startswith(settings.JIRA_BASE_URL)):
+        return "jira"
+    if host.endswith("googleapis.com"):
+        return "gemini"
+    return host
+
+
+@contextmanager
+def span(pipeline: str, stage: str):
+    """Times a block into synapse_stage_seconds (and the Server-Timing header, if enabled)."""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - started
+        STAGE_SECONDS.labels(pipeline, stage).observe(elapsed)
+        timings = _server_timings.get()
+        if timings is not None:
+            timings.append((stage, elapsed))
+
+
+def start_server_timing() -> List[Tuple[str, float]]:
+    """Starts collecting spans for the current request; returns the list they go into."""
+    timings: List[Tuple[str, float]] = []
+    _server_timings.set(timings)
+    return timings
+
+
+def format_server_timing(timings: List[Tuple[str, float]]) -> str:
+    # Repeated stages (e.g. one per batch item) are summed into one entry
+    totals = {}
+    for stage, elapsed in timings:
+        totals[stage] = totals.get(stage, 0.0) + elapsed
+    return ", ".join(f"{stage};dur={elapsed * 1000:.1f}" for stage, elapsed in totals.items())
+
+
+def record_llm_usage(model: str, usage) -> None:
+    """Counts tokens from a Gemini response's usage_metadata, when present."""
+    if usage is None:
+        return
+    LLM_TOKENS.labels(model, "prompt").inc(getattr(usage, "prompt_token_count", 0) or 0)
+    LLM_TOKENS.labels(model, "completion").inc(getattr(usage, "candidates_token_count", 0) or 0)
+
+
+class _ComponentStatsCollector:
+    """
+    Exposes the counters the caches, Gemini client and Block Kit parser keep
+    themselves, read at scrape time so those components stay metrics-agnostic.
+    """
+    def collect(self):
+        from .answer_cache import answer_cache
+        from .block_kit import repair_stats
+        from .gemini_client import gemini_client
+        from .knowledge_store import peek_knowledge_store
+
+        cache_lookups = CounterMetricFamily("synapse_cache_lookups", "Cache lookups by cache and result.", labels=["cache", "result"])
+        cache_lookups.add_metric(["answer", "hit"], answer_cache.hits)
+        cache_lookups.add_metric(["answer", "miss"], answer_cache.misses)
+        store = peek_knowledge_store()
+        if store is not None:
+            cache_lookups.add_metric(["embedding", "hit"], store.embedding_cache.hits)
+            cache_lookups.add_metric(["embedding", "miss"], store.embedding_cache.misses)
+        yield cache_lookups
+
+        block_kit = CounterMetricFamily("synapse_block_kit_responses", "Block Kit answers by parse outcome.", labels=["outcome"])
+        for outcome, count in repair_stats.items():
+            block_kit.add_metric([outcome], count)
+        yield block_kit
+
+        stats = gemini_client.stats
+        gemini = CounterMetricFamily("synapse_gemini_events", "Gemini client calls, failures, retries, timeouts and hedges.", labels=["event"])
+        for event in ("calls", "failures", "retries", "timeouts", "hedges", "hedge_wins"):
+            gemini.add_metric([event], stats[event])
+        yield gemini
+        seconds = CounterMetricFamily("synapse_gemini_seconds", "Gemini time spent queueing for a slot vs. waiting on the model.", labels=["phase"])
+        seconds.add_metric(["queue_wait"], stats["queue_wait_seconds"])
+        seconds.add_metric(["model"], stats["model_seconds"])
+        yield seconds
+
+        size = GaugeMetricFamily("synapse_answer_cache_entries", "Entries in the semantic answer cache.")
+        size.add_metric([], len(answer_cache))
+        yield size
+
+
+REGISTRY.register(_ComponentStatsCollector())
@@ -0,0 +1,67 @@
+# src/services/readiness.py
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Optional
+
+
+class Readiness:
+    """
+    Tracks the worker's startup: each heavy resource is loaded as a named
+    stage, and the worker is ready once every required stage has succeeded.
+    Optional stages (e.g. the Slack directory) may fail without blocking traffic.
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.started_at = time.monotonic()
+        self.components: Dict[str, Dict] = {}
+        self.cold_start_seconds: Optional[float] = None
+
+    def expect(self, name: str, required: bool = True):
+        """Declares a stage up front so /readyz reports it as pending until it runs."""
+        with self._lock:
+            self.components.setdefault(name, {"status": "pending", "required": required, "seconds": None, "error": None})
+
+    def record(self, name: str, seconds: float, required: bool = False):
+        """Records a stage that was timed elsewhere (e.g. module imports)."""
+        with self._lock:
+            self.components[name] = {"status": "ready", "required": required, "seconds": round(seconds, 3), "error": None}
+
+    @contextmanager
+    def stage(self, name: str, required: bool = True):
+        """Times a startup stage and records whether it succeeded. Failures are re-raised."""
+        self.expect(name, required)
+        with self._lock:
+            self.components[name]["status"] = "loading"
+        started = time.monotonic()
+        try:
+            yield
+        except Exception as e:
+            with self._lock:
+                self.components[name].update(status="failed", error=str(e), seconds=round(time.monotonic() - started, 3))
+            raise
+        with self._lock:
+            self.components[name].update(status="ready", seconds=round(time.monotonic() - started, 3))
+
+    @property
+    def ready(self) -> bool:
+        with self._lock:
+            return all(c["status"] == "ready" for c in self.components.values() if c["required"])
+
+    def finish(self, budget_seconds: float):
+        """Stamps the cold-start time and warns when it exceeds the budget."""
+        self.cold_start_seconds = round(time.monotonic() - self.started_at, 3)
+        within = self.cold_start_seconds <= budget_seconds
+        print(f"{'✅' if within else '⚠️'} Cold start took {self.cold_start_seconds}s (budget {budget_seconds}s).")
+
+    def snapshot(self) -> Dict:
+        with self._lock:
+            return {
+                "ready": all(c["status"] == "ready" for c in self.components.values() if c["required"]),
+                "cold_start_seconds": self.cold_start_seconds,
+                "components": {name: dict(component) for name, component in self.components.items()}
+            }
+
+
+# --- Shared instance (one per worker process) ---
+readiness = Readiness()
@@ -1,51 +1,33 @@
 import requests
 import time
 import re
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
-from typing import List, Dict, Optional
+from typing import List, Dict, Optional, Iterable, Iterator, Tuple, Callable
 
 from ..config import settings
-from .jira_enricher import fetch_jira_ticket_details
-from .knowledge_store import KnowledgeStore
-
-
-# --- Caching (Module-level for a single worker process) ---
-user_cache = {}
-usergroup_cache = {}
+from .http_client import get_session, slack_api_url
+from .jira_enricher import fetch_jira_tickets_bulk
+from .knowledge_store import get_knowledge_store
+from .metrics import span
+from .slack_rate_limiter import slack_rate_limiter
+from .sync_state import load_watermark, save_watermark, thread_state, is_unchanged
+# user_cache / usergroup_cache are re-exported here for existing importers.
+from .user_directory import user_cache, usergroup_cache, load_directory, lookup_user
 
 # --- Slack Helper Functions ---
 
 def _get_user_name(user_id: str, headers: Dict) -> str:
-    """Fetches a user's real name from their ID, using a cache."""
+    """Fetches a user's real name from their ID, using the bulk-loaded directory."""
     if not user_id:
         return "Unknown"
-    if user_id in user_cache:
-        return user_cache[user_id]
-    try:
-        resp = requests.get("https://slack.com/api/users.info", headers=headers, params={"user": user_id})
-        resp.raise_for_status()
-        data = resp.json()
-        if data.get("ok"):
-            name = data["user"].get("real_name") or data["user"].get("name", user_id)
-            user_cache[user_id] = name
-            return name
-    except requests.exceptions.RequestException as e:
-        print(f"Error fetching user {user_id}: {e}")
-    return user_id
+    return lookup_user(user_id, headers)
 
 def _load_usergroups(headers: Dict):
-    """Loads all usergroups into a cache for mention resolution."""
-    if usergroup_cache:
-        return
-    try:
-        resp = requests.get("https://slack.com/api/usergroups.list", headers=headers)
-        resp.raise_for_status()
-        data = resp.json()
-        if data.get("ok"):
-            for g in data.get("usergroups", []):
-                usergroup_cache[g["id"]] = g["handle"]
-    except requests.exceptions.RequestException as e:
-        print(f"Error loading usergroups: {e}")
+    """Loads the user and usergroup directories for mention resolution."""
+    load_directory(headers)
 
 def _resolve_mentions(text: str, headers: Dict) -> str:
     """Replaces Slack-specific mention syntax with human-readable names."""
@@ -72,20 +54,31 @@ def _extract_links(text: str) -> List[Dict]:
         classified_links.append({"url": url, "type": link_type})
     return classified_links
 
-def _process_message(msg: Dict, headers: Dict, is_reply: bool = False) -> Optional[Dict]:
-    """Processes a single message, extracting all relevant data."""
+def _find_ticket_ids(text: str) -> List[str]:
+    """Finds the distinct Jira ticket keys mentioned in a message."""
+    # Use a more specific regex to avoid false positives
+    return list(set(re.findall(r'\b([A-Z]{2,6}-\d{1,6})\b', text or "")))
+
+def _fetch_jira_tickets(ticket_ids: List[str], known_tickets: Optional[Dict[str, Dict]] = None) -> List[Dict]:
+    """Builds a message's 'jira_tickets' list, resolving tickets not already in known_tickets."""
+    if known_tickets is None:
+        known_tickets = fetch_jira_tickets_bulk(ticket_ids)
+    return [
+        {"ticket_id": ticket_id, **known_tickets[ticket_id]}
+        for ticket_id in ticket_ids if ticket_id in known_tickets
+    ]
+
+def _process_message(msg: Dict, headers: Dict, is_reply: bool = False, enrich_jira: bool = True) -> Optional[Dict]:
+    """
+    Processes a single message, extracting all relevant data.
+    With enrich_jira=False, 'jira_tickets' is left empty for a later enrichment stage.
+    """
     if "subtype" in msg and msg["subtype"] not in ["file_share", "thread_broadcast"]:
         return None
 
     text_content = _resolve_mentions(msg.get("text", ""), headers)
     
-    # Use a more specific regex to avoid false positives
-    ticket_ids = re.findall(r'\b([A-Z]{2,6}-\d{1,6})\b', text_content)
-    jira_tickets = []
-    for ticket_id in set(ticket_ids):
-        details = fetch_jira_ticket_details(ticket_id)
-        if details:
-            jira_tickets.append({"ticket_id": ticket_id, **details})
+    jira_tickets = _fetch_jira_tickets(_find_ticket_ids(text_content)) if enrich_jira else []
             
     files = [{"id": f.get("id"), "name": f.get("name")} for f in msg.get("files", [])]
 
@@ -102,93 +95,284 @@ def _process_message(msg: Dict, headers: Dict, is_reply: bool = False) -> Option
         "replies": []
     }
 
-def _fetch_paginated_data(api_method: str, params: Dict, headers: Dict) -> List[Dict]:
-    """Generic function to fetch paginated data from a Slack API."""
-    all_items = []
-    cursor = None
+def _iter_paginated_pages(api_method: str, params: Dict, headers: Dict, cursor: Optional[str] = None) -> Iterator[Tuple[Optional[str], List[Dict]]]:
+    """
+    Generic generator over the pages of a paginated Slack API.
+    Yields (cursor used to request the page, messages on the page) as each page arrives.
+    """
     while True:
         try:
             request_params = {**params, "limit": 200}
             if cursor:
                 request_params["cursor"] = cursor
             
-            resp = requests.get(f"https://slack.com/api/{api_method}", headers=headers, params=request_params)
+            # Pacing comes from the shared per-tier limiter rather than a fixed sleep.
+            with span("extraction", "rate_limit_wait"):
+                slack_rate_limiter.acquire(api_method)
+            with span("extraction", api_method):
+                resp = get_session().get(slack_api_url(api_method), headers=headers, params=request_params)
+            if resp.status_code == 429:
+                slack_rate_limiter.pause(api_method, int(resp.headers.get("Retry-After", "20")))
+                continue
             resp.raise_for_status()
             data = resp.json()
 
             if not data.get("ok"):
                 error = data.get("error", "unknown")
                 if error == "ratelimited":
-                    retry_after = int(resp.headers.get("Retry-After", "20"))
-                    print(f"Rate limited. Retrying after {retry_after} seconds...")
-                    time.sleep(retry_after)
+                    slack_rate_limiter.pause(api_method, int(resp.headers.get("Retry-After", "20")))
                     continue
                 raise Exception(f"Error from {api_method}: {error}")
             
-            all_items.extend(data.get("messages", []))
+            yield cursor, data.get("messages", [])
             cursor = data.get("response_metadata", {}).get("next_cursor")
             if not cursor:
                 break
-            time.sleep(1.2)
         except requests.exceptions.RequestException as e:
             print(f"Network error during fetch: {e}")
             break
+
+def _fetch_paginated_data(api_method: str, params: Dict, headers: Dict) -> List[Dict]:
+    """Generic function to fetch all pages of a paginated Slack API into one list."""
+    all_items = []
+    for _, items in _iter_paginated_pages(api_method, params, headers):
+        all_items.extend(items)
     return all_items
 
+def _fetch_thread_replies(thread_obj: Dict, channel_id: str, headers: Dict) -> Tuple[Dict, bool]:
+    """
+    Fetches and processes all replies of a thread into thread_obj['replies'].
+    Returns (thread_obj, whether every reply Slack announced came back).
+    """
+    complete = True
+    if thread_obj['reply_count'] > 0:
+        print(f"Fetching {thread_obj['reply_count']} replies for thread {thread_obj['ts']}...")
+        reply_messages_data = _fetch_paginated_data(
+            "conversations.replies",
+            {"channel": channel_id, "ts": thread_obj['ts']},
+            headers
+        )
+
+        # The first message in the replies API is the parent itself, so we skip it.
+        for reply_msg_data in reply_messages_data[1:]:
+            processed_reply = _process_message(reply_msg_data, headers, is_reply=True, enrich_jira=False)
+            if processed_reply:
+                thread_obj['replies'].append(processed_reply)
+        # A network error ends pagination early; counted on the raw messages, since
+        # _process_message drops some subtypes on purpose.
+        complete = len(reply_messages_data) - 1 >= thread_obj['reply_count']
+        if not complete:
+            print(f"⚠️ Only got {max(len(reply_messages_data) - 1, 0)} of {thread_obj['reply_count']} replies for thread {thread_obj['ts']}; it will be re-fetched next run.")
+    return thread_obj, complete
+
+def _enrich_threads_with_jira(threads: List[Dict]):
+    """
+    Fills 'jira_tickets' on every parent and reply of a batch of threads,
+    resolving all tickets mentioned anywhere in the batch with one bulk lookup.
+    """
+    messages = [msg for thread_obj in threads for msg in [thread_obj, *thread_obj['replies']]]
+    ticket_ids_by_msg = [_find_ticket_ids(msg['text']) for msg in messages]
+    known_tickets = fetch_jira_tickets_bulk([t for ids in ticket_ids_by_msg for t in ids])
+    for msg, ticket_ids in zip(messages, ticket_ids_by_msg):
+        msg['jira_tickets'] = _fetch_jira_tickets(ticket_ids, known_tickets)
+
+# --- Streaming pipeline ---
+
+# Items a stage may run ahead of the stage consuming it. Together with the
+# ingest batch size this bounds peak memory, independent of channel length.
+PIPELINE_QUEUE_DEPTH = 2
+
+_END_OF_STREAM = object()
+
+def _prefetch(iterable: Iterable, maxsize: int = PIPELINE_QUEUE_DEPTH) -> Iterator:
+    """
+    Runs `iterable` on a background thread and hands its items over through a
+    bounded queue, so the producing stage keeps working while the consumer does.
+    Exceptions raised by the producer are re-raised in the consumer.
+    """
+    handoff = queue.Queue(maxsize=maxsize)
+    stopped = threading.Event()
+
+    def put(item) -> bool:
+        while not stopped.is_set():
+            try:
+                handoff.put(item, timeout=0.5)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def produce():
+        try:
+            for item in iterable:
+                if not put((item, None)):
+                    return
+            put((_END_OF_STREAM, None))
+        except BaseException as e:
+            put((_END_OF_STREAM, e))
+        finally:
+            # Closing the stage also tears down any upstream stages it owns.
+            if hasattr(iterable, "close"):
+                iterable.close()
+
+    threading.Thread(target=produce, daemon=True).start()
+    try:
+        while True:
+            item, error = handoff.get()
+            if error is not None:
+                raise error
+            if item is _END_OF_STREAM:
+                return
+            yield item
+    finally:
+        stopped.set()
+
+def _iter_parents_to_process(pages: Iterable, watermark: Dict, stats: Dict) -> Iterator[Tuple[Optional[str], Dict]]:
+    """
+    Stage: filters raw history messages down to thread parents that need (re-)processing.
+    Yields (cursor of the page the parent came from, parent message).
+    """
+    for page_cursor, messages in pages:
+        print(f"Fetched a page of {len(messages)} messages.")
+        for parent_msg_data in messages:
+            # Skip messages that are replies themselves; we'll fetch them under their parent.
+            if parent_msg_data.get("thread_ts") and parent_msg_data.get("ts") != parent_msg_data.get("thread_ts"):
+                continue
+
+            # Already stored and no new replies since the last run: nothing to do.
+            if is_unchanged(watermark, parent_msg_data):
+                stats["threads_skipped"] += 1
+                continue
+
+            yield page_cursor, parent_msg_data
+
+def _iter_thread_batches(parents: Iterable[Tuple[Optional[str], Dict]], channel_id: str, headers: Dict, reply_pool: ThreadPoolExecutor) -> Iterator[Tuple[List[Dict], Dict, Optional[str]]]:
+    """
+    Stage: assembles parents into complete, Jira-enriched threads, one ingest batch at a time.
+    Yields (threads, watermark states keyed by thread ts, cursor of the page holding the last thread).
+    """
+    def assemble(batch: List[Dict], states: Dict, page_cursor: Optional[str]):
+        # Replies for the whole batch are fetched concurrently; the shared rate
+        # limiter, not round-trip latency, bounds how fast this goes.
+        with span("extraction", "assemble_threads"):
+            fetched = list(reply_pool.map(
+                lambda thread_obj: _fetch_thread_replies(thread_obj, channel_id, headers),
+                batch
+            ))
+        threads = [thread_obj for thread_obj, _ in fetched]
+        # Partially fetched threads are stored, but without a watermark state,
+        # so the next incremental run fetches them again.
+        incomplete = {thread_obj['ts'] for thread_obj, complete in fetched if not complete}
+        states = {ts: state for ts, state in states.items() if ts not in incomplete}
+        with span("extraction", "jira_enrich"):
+            _enrich_threads_with_jira(threads)
+        return threads, states, page_cursor
+
+    batch, states, page_cursor = [], {}, None
+    for page_cursor, parent_msg_data in parents:
+        thread_obj = _process_message(parent_msg_data, headers, is_reply=False, enrich_jira=False)
+        if not thread_obj:
+            continue
+        batch.append(thread_obj)
+        states[thread_obj['ts']] = thread_state(parent_msg_data)
+        if len(batch) >= settings.INGEST_BATCH_SIZE:
+            yield assemble(batch, states, page_cursor)
+            batch, states = [], {}
+    if batch:
+        yield assemble(batch, states, page_cursor)
+
 # --- Main Export Logic ---
 
-def extract_and_store_knowledge(channel_id: str, months_history: int) -> dict:
+def extract_and_store_knowledge(
+    channel_id: str,
+    months_history: int,
+    full_resync: bool = False,
+    oldest_ts: Optional[float] = None,
+    resume_cursor: Optional[str] = None,
+    on_checkpoint: Optional[Callable[[Optional[str], Dict, float], None]] = None,
+    should_stop: Optional[Callable[[], bool]] = None
+) -> dict:
     """
     Main function to export a channel's history, including all thread replies,
     and store it in the vector database.
+
+    Runs incrementally against the channel's watermark: parents already stored
+    whose thread has no new replies are skipped entirely, unless full_resync is set.
+
+    The work is a streaming pipeline (page fetch -> thread assembly -> Jira
+    enrichment -> embedding + upsert) with bounded queues between stages, so
+    batches are stored while later pages are still being fetched.
+
+    For background jobs: after every stored batch, on_checkpoint(cursor, stats,
+    progress_ts) is called with the history cursor to resume from; passing that
+    cursor back as resume_cursor (with the same oldest_ts) continues the run.
+    should_stop() is polled between batches to stop early.
     """
     headers = {"Authorization": f"Bearer {settings.SLACK_BOT_TOKEN}"}
-    knowledge_store = KnowledgeStore()
+    knowledge_store = get_knowledge_store()
     
-    print("Loading usergroups...")
+    print("Loading user directory...")
     _load_usergroups(headers)
     
-    oldest_ts = (datetime.now() - timedelta(days=months_history * 30)).timestamp()
+    if oldest_ts is None:
+        oldest_ts = (datetime.now() - timedelta(days=months_history * 30)).timestamp()
+    watermark = {"last_ts": None, "threads": {}} if full_resync else load_watermark(channel_id)
     
-    print(f"Fetching parent messages for channel {channel_id}...")
-    parent_messages = _fetch_paginated_data(
-        "conversations.history", 
-        {"channel": channel_id, "oldest": oldest_ts}, 
-        headers
-    )
-    
-    threads_processed = 0
-    print(f"Found {len(parent_messages)} total messages. Processing threads...")
-    for parent_msg_data in parent_messages:
-        # Skip messages that are replies themselves; we'll fetch them under their parent.
-        if parent_msg_data.get("thread_ts") and parent_msg_data.get("ts") != parent_msg_data.get("thread_ts"):
-            continue
+    stats = {"threads_processed": 0, "threads_embedded": 0, "threads_skipped": 0}
+    stopped = False
+    started_at = time.monotonic()
+
+    print(f"Streaming parent messages for channel {channel_id}...")
+    with ThreadPoolExecutor(max_workers=settings.SLACK_REPLY_FETCH_WORKERS) as reply_pool:
+        # Each stage owns the one before it, so closing `batches` shuts the whole chain down.
+        batches = _prefetch(_iter_thread_batches(
+            _iter_parents_to_process(
+                _prefetch(_iter_paginated_pages(
+                    "conversations.history",
+                    {"channel": channel_id, "oldest": oldest_ts},
+                    headers,
+                    cursor=resume_cursor
+                )),
+                watermark,
+                stats
+            ),
+            channel_id,
+            headers,
+            reply_pool
+        ))
+
+        try:
+            for threads, states, page_cursor in batches:
+                with span("extraction", "store_batch"):
+                    stats["threads_embedded"] += knowledge_store.add_threads(threads, channel_id=channel_id)
+                stats["threads_processed"] += len(threads)
+
+                # Only advance the watermark once the batch is safely stored.
+                for ts, state in states.items():
+                    watermark["threads"][ts] = state
+                    if not watermark["last_ts"] or float(ts) > float(watermark["last_ts"]):
+                        watermark["last_ts"] = ts
+                save_watermark(channel_id, watermark, oldest_ts)
+
+                if on_checkpoint:
+                    # History is newest-first, so the last thread is how far back we've got.
+                    on_checkpoint(page_cursor, dict(stats), float(threads[-1]['ts']))
+                if should_stop and should_stop():
+                    print(f"Extraction for channel {channel_id} stopped early.")
+                    stopped = True
+                    break
+        finally:
+            batches.close()
+
+    elapsed = time.monotonic() - started_at
+    threads_processed = stats["threads_processed"]
 
-        thread_obj = _process_message(parent_msg_data, headers, is_reply=False)
-        if not thread_obj:
-            continue
-            
-        # If the parent message has replies, fetch them in a separate, dedicated API call.
-        if thread_obj['reply_count'] > 0:
-            print(f"Fetching {thread_obj['reply_count']} replies for thread {thread_obj['ts']}...")
-            reply_messages_data = _fetch_paginated_data(
-                "conversations.replies",
-                {"channel": channel_id, "ts": thread_obj['ts']},
-                headers
-            )
-            
-            # The first message in the replies API is the parent itself, so we skip it.
-            for reply_msg_data in reply_messages_data[1:]:
-                processed_reply = _process_message(reply_msg_data, headers, is_reply=True)
-                if processed_reply:
-                    thread_obj['replies'].append(processed_reply)
-        
-        # Now that the thread object is complete, store it.
-        knowledge_store.add_thread(thread_obj)
-        threads_processed += 1
-    
     return {
-        "status": "success",
+        "status": "stopped" if stopped else "success",
         "threads_processed": threads_processed,
-        "message": "Knowledge base updated successfully."
+        "message": "Extraction stopped before completion." if stopped else "Knowledge base updated successfully.",
+        "threads_embedded": stats["threads_embedded"],
+        "threads_skipped": stats["threads_skipped"],
+        "elapsed_seconds": round(elapsed, 2),
+        "threads_per_second": round(threads_processed / elapsed, 2) if elapsed > 0 else 0.0
     }
\ No newline at end of file
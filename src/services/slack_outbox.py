@@ -0,0 +1,204 @@
+# src/services/slack_outbox.py
+import asyncio
+import hashlib
+import json
+import random
+import sqlite3
+import time
+from contextlib import contextmanager
+from typing import Dict, Optional
+
+from ..config import settings
+from .slack_poster import send_slack_message_async
+
+# Sent rows are kept this long (for dedupe and debugging) before being pruned.
+SENT_RETENTION_SECONDS = 24 * 3600
+# A row claimed for sending by a worker that died mid-post goes back to pending after this long.
+SENDING_LEASE_SECONDS = 300
+
+
+@contextmanager
+def _connect():
+    """Opens a short-lived connection, committing on success and always closing it."""
+    conn = sqlite3.connect(settings.SLACK_OUTBOX_PATH, timeout=30)
+    conn.row_factory = sqlite3.Row
+    try:
+        with conn:
+            yield conn
+    finally:
+        conn.close()
+
+
+def _dedupe_key(payload: Dict) -> str:
+    return hashlib.sha256(json.dumps(payload, sort_keys=True, ensure_ascii=False).encode("utf-8")).hexdigest()
+
+
+class SlackOutbox:
+    """
+    A persisted queue of outbound chat.postMessage payloads with one background
+    worker, so API responses never wait on Slack.
+
+    Messages are written to SQLite before enqueue() returns and survive restarts.
+    The worker paces posts, backs off with jitter on failures, pauses for the
+    whole Retry-After window on rate limits, and gives up after
+    SLACK_OUTBOX_MAX_ATTEMPTS. Identical payloads enqueued within
+    SLACK_OUTBOX_DEDUPE_SECONDS are dropped.
+
+    Several workers may share SLACK_OUTBOX_PATH: each row is claimed ('sending')
+    before it is posted, so only one of them posts it.
+    """
+    def __init__(self):
+        self._task: Optional[asyncio.Task] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._wakeup: Optional[asyncio.Event] = None
+        self._paused_until = 0.0
+        self._last_sent_at = 0.0
+
+    def init_store(self):
+        with _connect() as conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS slack_outbox (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    dedupe_key TEXT NOT NULL,
+                    payload TEXT NOT NULL,
+                    status TEXT NOT NULL DEFAULT 'pending',
+                    attempts INTEGER NOT NULL DEFAULT 0,
+                    next_attempt_at REAL NOT NULL,
+                    created_at REAL NOT NULL,
+                    last_error TEXT
+                )
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_outbox_due ON slack_outbox (status, next_attempt_at)")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_outbox_dedupe ON slack_outbox (dedupe_key, created_at)")
+
+    def enqueue(self, payload: Optional[Dict]) -> bool:
+        """
+        Queues a payload for posting. Returns False if it was empty or a recent
+        duplicate. Writes to SQLite, so call it from the threadpool in async code.
+        """
+        if not payload:
+            return False
+        key = _dedupe_key(payload)
+        now = time.time()
+        with _connect() as conn:
+            duplicate = conn.execute(
+                "SELECT 1 FROM slack_outbox WHERE dedupe_key = ? AND created_at >= ? LIMIT 1",
+                (key, now - settings.SLACK_OUTBOX_DEDUPE_SECONDS)
+            ).fetchone()
+            if duplicate:
+                print("Skipping duplicate Slack escalation.")
+                return False
+            conn.execute(
+                "INSERT INTO slack_outbox (dedupe_key, payload, next_attempt_at, created_at) VALUES (?, ?, ?, ?)",
+                (key, json.dumps(payload, ensure_ascii=False), now, now)
+            )
+        if self._wakeup is not None:
+            self._loop.call_soon_threadsafe(self._wakeup.set)
+        return True
+
+    def _next_due(self) -> Optional[sqlite3.Row]:
+        with _connect() as conn:
+            # Claims that outlived their lease belong to a worker that stopped mid-post
+            conn.execute(
+                "UPDATE slack_outbox SET status = 'pending' WHERE status = 'sending' AND next_attempt_at <= ?",
+                (time.time(),)
+            )
+            return conn.execute(
+                "SELECT * FROM slack_outbox WHERE status = 'pending' ORDER BY next_attempt_at, id LIMIT 1"
+            ).fetchone()
+
+    def _claim(self, row_id: int) -> bool:
+        """Atomically takes a pending row for this worker; False if another worker got it first."""
+        with _connect() as conn:
+            claimed = conn.execute(
+                "UPDATE slack_outbox SET status = 'sending', next_attempt_at = ? WHERE id = ? AND status = 'pending'",
+                (time.time() + SENDING_LEASE_SECONDS, row_id)
+            ).rowcount
+        return claimed == 1
+
+    def _mark(self, row_id: int, **fields):
+        assignments = ", ".join(f"{name} = ?" for name in fields)
+        with _connect() as conn:
+            conn.execute(f"UPDATE slack_outbox SET {assignments} WHERE id = ?", (*fields.values(), row_id))
+
+    def _prune(self):
+        with _connect() as conn:
+            conn.execute(
+                "DELETE FROM slack_outbox WHERE status = 'sent' AND created_at < ?",
+                (time.time() - SENT_RETENTION_SECONDS,)
+            )
+
+    async def _deliver(self, row: sqlite3.Row):
+        # Stay under chat.postMessage's ~1 message/second/channel limit.
+        wait = max(self._paused_until, self._last_sent_at + settings.SLACK_OUTBOX_MIN_INTERVAL_SECONDS) - time.time()
+        if wait > 0:
+            await asyncio.sleep(wait)
+        if not self._claim(row["id"]):
+            return
+
+        result = await send_slack_message_async(json.loads(row["payload"]))
+        self._last_sent_at = time.time()
+        attempts = row["attempts"] + 1
+
+        if result["status"] == "success":
+            self._mark(row["id"], status="sent", attempts=attempts, last_error=None)
+            return
+        if not result.get("retryable") or attempts >= settings.SLACK_OUTBOX_MAX_ATTEMPTS:
+            print(f"❌ Giving up on Slack message {row['id']} after {attempts} attempt(s): {result['message']}")
+            self._mark(row["id"], status="failed", attempts=attempts, last_error=result["message"])
+            return
+
+        if "retry_after" in result:
+            # A rate limit applies to every queued message, not just this one.
+            delay = result["retry_after"]
+            self._paused_until = time.time() + delay
+        else:
+            delay = min(settings.SLACK_OUTBOX_MAX_BACKOFF_SECONDS, 2 ** attempts) * random.uniform(0.5, 1.5)
+        self._mark(row["id"], status="pending", attempts=attempts, next_attempt_at=time.time() + delay, last_error=result["message"])
+
+    async def _run(self):
+        last_pruned_at = 0.0
+        while True:
+            try:
+                if time.time() - last_pruned_at > 3600:
+                    self._prune()
+                    last_pruned_at = time.time()
+
+                row = self._next_due()
+                now = time.time()
+                if row is not None and row["next_attempt_at"] <= now:
+                    await self._deliver(row)
+                    continue
+
+                # Sleep until the next retry is due or a new message arrives.
+                timeout = (row["next_attempt_at"] - now) if row is not None else 60
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=timeout)
+                except asyncio.TimeoutError:
+                    pass
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"Slack outbox worker error: {e}")
+                await asyncio.sleep(5)
+
+    def start(self):
+        """Starts the worker on the running event loop; pending messages from earlier runs go first."""
+        self.init_store()
+        self._loop = asyncio.get_running_loop()
+        self._wakeup = asyncio.Event()
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+
+# --- Shared instance (one per worker process) ---
+slack_outbox = SlackOutbox()
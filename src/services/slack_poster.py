@@ -1,19 +1,63 @@
 import requests
+import httpx
 from ..config import settings
-from typing import Dict
+from typing import Dict, Optional
+from .http_client import get_session, async_request, slack_api_url
 
-def post_escalation_to_slack(original_query: str, llm_analysis: str, on_call_team: str, sources: list):
-    """
-    Formats and posts a detailed escalation message to a specified Slack channel.
-    """
-    slack_token = settings.SLACK_BOT_TOKEN
-    channel_id = settings.SLACK_ESCALATION_CHANNEL_ID
+POST_MESSAGE_URL = slack_api_url("chat.postMessage")
 
-    headers = {
-        "Authorization": f"Bearer {slack_token}",
+def _slack_headers() -> Dict:
+    return {
+        "Authorization": f"Bearer {settings.SLACK_BOT_TOKEN}",
         "Content-Type": "application/json; charset=utf-8"
     }
 
+# Slack API errors worth retrying; anything else (e.g. channel_not_found) is permanent.
+RETRYABLE_SLACK_ERRORS = {"ratelimited", "internal_error", "fatal_error", "service_unavailable", "request_timeout"}
+
+def _handle_post_response(response_data: Dict, channel_id: str) -> Dict:
+    if response_data.get("ok"):
+        print(f"✅ Successfully posted message to channel {channel_id}.")
+        return {"status": "success", "message": "Posted to Slack."}
+    error_msg = response_data.get('error')
+    print(f"❌ Failed to post to Slack: {error_msg}")
+    return {"status": "error", "message": error_msg, "retryable": error_msg in RETRYABLE_SLACK_ERRORS}
+
+def send_slack_message(payload: Dict) -> Dict:
+    """Posts a chat.postMessage payload on the shared pooled session."""
+    try:
+        response = get_session().post(POST_MESSAGE_URL, headers=_slack_headers(), json=payload)
+        response.raise_for_status()
+        return _handle_post_response(response.json(), payload["channel"])
+    except requests.exceptions.RequestException as e:
+        print(f"❌ Network error while posting to Slack: {e}")
+        return {"status": "error", "message": str(e)}
+
+async def send_slack_message_async(payload: Dict) -> Dict:
+    """
+    Posts a chat.postMessage payload on the shared async client. Only connection
+    failures (the message never left) are retried here; everything else is left
+    to the caller: the result carries "retryable" and, for rate limits,
+    "retry_after" (seconds).
+    """
+    try:
+        response = await async_request("POST", POST_MESSAGE_URL, retry_statuses=(), headers=_slack_headers(), json=payload)
+        if response.status_code == 429:
+            retry_after = int(response.headers.get("Retry-After", "30"))
+            print(f"❌ Rate limited while posting to Slack; retry after {retry_after}s.")
+            return {"status": "error", "message": "ratelimited", "retryable": True, "retry_after": retry_after}
+        response.raise_for_status()
+        return _handle_post_response(response.json(), payload["channel"])
+    except httpx.HTTPError as e:
+        print(f"❌ Network error while posting to Slack: {e}")
+        return {"status": "error", "message": str(e), "retryable": True}
+
+def build_escalation_payload(original_query: str, llm_analysis: str, on_call_team: str, sources: list) -> Dict:
+    """
+    Formats a detailed escalation message for the escalation channel.
+    """
+    channel_id = settings.SLACK_ESCALATION_CHANNEL_ID
+
     # --- Build a rich message using Slack's Block Kit ---
     
     # Extract the most relevant source for context
@@ -69,59 +113,44 @@ def post_escalation_to_slack(original_query: str, llm_analysis: str, on_call_tea
         }
     ]
 
-    payload = {
+    return {
         "channel": channel_id,
         "blocks": blocks,
         "text": f"New Escalation: {original_query}" # Fallback text for notifications
     }
 
-    try:
-        response = requests.post("https://slack.com/api/chat.postMessage", headers=headers, json=payload)
-        response.raise_for_status()
-        response_data = response.json()
-        if response_data.get("ok"):
-            print(f"✅ Successfully posted escalation to channel {channel_id}.")
-            return {"status": "success", "message": "Posted to Slack."}
-        else:
-            print(f"❌ Failed to post to Slack: {response_data.get('error')}")
-            return {"status": "error", "message": response_data.get('error')}
-    except requests.exceptions.RequestException as e:
-        print(f"❌ Network error while posting to Slack: {e}")
-        return {"status": "error", "message": str(e)}
-
 
-def post_escalation_to_slack_v2(llm_json_response: Dict, original_query: str):
+def build_escalation_payload_v2(llm_json_response: Dict, original_query: str) -> Optional[Dict]:
     """
-    Posts a pre-formatted Block Kit JSON message to a specified Slack channel.
+    Wraps a pre-formatted Block Kit JSON message for the escalation channel.
+    Returns None if the LLM response has no blocks.
     """
-    slack_token = settings.SLACK_BOT_TOKEN
-    channel_id = settings.SLACK_ESCALATION_CHANNEL_ID
-    headers = {"Authorization": f"Bearer {slack_token}", "Content-Type": "application/json; charset=utf-8"}
-
     # Extract the 'blocks' from the LLM's JSON response
     blocks_to_post = llm_json_response.get("blocks", [])
 
     if not blocks_to_post:
         print("❌ LLM response contained no blocks to post.")
-        return {"status": "error", "message": "No blocks found in LLM response."}
+        return None
 
-    payload = {
-        "channel": channel_id,
+    return {
+        "channel": settings.SLACK_ESCALATION_CHANNEL_ID,
         "blocks": blocks_to_post,
         "text": f"Synapse AI Analysis for: {original_query}" # Fallback for notifications
     }
 
-    try:
-        response = requests.post("https://slack.com/api/chat.postMessage", headers=headers, json=payload)
-        response.raise_for_status()
-        response_data = response.json()
-        if response_data.get("ok"):
-            print(f"✅ Successfully posted Block Kit message to channel {channel_id}.")
-            return {"status": "success"}
-        else:
-            error_msg = response_data.get('error')
-            print(f"❌ Failed to post to Slack: {error_msg}")
-            return {"status": "error", "message": error_msg}
-    except Exception as e:
-        print(f"❌ Network error while posting to Slack: {e}")
-        return {"status": "error", "message": str(e)}
\ No newline at end of file
+
+def post_escalation_to_slack(original_query: str, llm_analysis: str, on_call_team: str, sources: list):
+    """
+    Formats and posts a detailed escalation message to a specified Slack channel.
+    """
+    return send_slack_message(build_escalation_payload(original_query, llm_analysis, on_call_team, sources))
+
+
+def post_escalation_to_slack_v2(llm_json_response: Dict, original_query: str):
+    """
+    Posts a pre-formatted Block Kit JSON message to a specified Slack channel.
+    """
+    payload = build_escalation_payload_v2(llm_json_response, original_query)
+    if payload is None:
+        return {"status": "error", "message": "No blocks found in LLM response."}
+    return send_slack_message(payload)
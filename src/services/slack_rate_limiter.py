@@ -0,0 +1,103 @@
+# src/services/slack_rate_limiter.py
+import threading
+import time
+from typing import Dict
+
+from .metrics import RATE_LIMIT_SLEEP_SECONDS
+
+# Slack publishes per-method limits as "tiers" (requests per minute, per workspace).
+# https://api.slack.com/docs/rate-limits
+TIER_REQUESTS_PER_MINUTE = {
+    1: 1,
+    2: 20,
+    3: 50,
+    4: 100,
+    "post": 60, # chat.postMessage: roughly one message per second per channel
+}
+
+METHOD_TIERS = {
+    "conversations.history": 3,
+    "conversations.replies": 3,
+    "users.info": 4,
+    "users.list": 2,
+    "usergroups.list": 2,
+    "chat.postMessage": "post",
+}
+
+DEFAULT_TIER = 3
+
+
+class TokenBucket:
+    """
+    A classic token bucket: holds up to `capacity` tokens and refills at
+    `rate_per_minute`. acquire() blocks until a token is available; the time
+    spent blocked is exported per bucket `name`.
+    """
+    def __init__(self, rate_per_minute: float, capacity: float, name: str = "default"):
+        self.name = name
+        self.rate_per_second = rate_per_minute / 60.0
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated_at = time.monotonic()
+        self.paused_until = 0.0
+        self._lock = threading.Lock()
+
+    def _refill(self, now: float):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate_per_second)
+        self.updated_at = now
+
+    def acquire(self):
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                if now < self.paused_until:
+                    wait = self.paused_until - now
+                else:
+                    self._refill(now)
+                    if self.tokens >= 1:
+                        self.tokens -= 1
+                        return
+                    wait = (1 - self.tokens) / self.rate_per_second
+            RATE_LIMIT_SLEEP_SECONDS.labels(self.name).inc(wait)
+            time.sleep(wait)
+
+    def pause(self, seconds: float):
+        """Blocks every caller of this bucket for `seconds` and drains it, e.g. after a 429."""
+        with self._lock:
+            now = time.monotonic()
+            self.paused_until = max(self.paused_until, now + seconds)
+            self.tokens = 0
+            self.updated_at = max(now, self.paused_until)
+
+
+class SlackRateLimiter:
+    """
+    One token bucket per Slack rate-limit tier, shared by every worker thread
+    in the process, so concurrent fetchers stay under the tier limit together
+    and a Retry-After from any of them stalls all of them.
+    """
+    def __init__(self, burst: int = 5):
+        self.burst = burst
+        self._buckets: Dict = {}
+        self._lock = threading.Lock()
+
+    def _bucket(self, api_method: str) -> TokenBucket:
+        tier = METHOD_TIERS.get(api_method, DEFAULT_TIER)
+        with self._lock:
+            if tier not in self._buckets:
+                rate = TIER_REQUESTS_PER_MINUTE[tier]
+                self._buckets[tier] = TokenBucket(rate, capacity=min(self.burst, rate), name=str(tier))
+            return self._buckets[tier]
+
+    def acquire(self, api_method: str):
+        """Waits until a request to `api_method` is allowed."""
+        self._bucket(api_method).acquire()
+
+    def pause(self, api_method: str, seconds: float):
+        """Honors a Retry-After for every worker calling a method in the same tier."""
+        print(f"Rate limited on {api_method}. Pausing its tier for {seconds} seconds...")
+        self._bucket(api_method).pause(seconds)
+
+
+# --- Shared instance (one per worker process) ---
+slack_rate_limiter = SlackRateLimiter()
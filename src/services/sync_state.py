@@ -0,0 +1,61 @@
+# src/services/sync_state.py
+import json
+import os
+import threading
+from typing import Dict
+
+from ..config import settings
+
+# Serializes writers within this process; each channel has its own file.
+_state_lock = threading.Lock()
+
+
+def _watermark_path(channel_id: str) -> str:
+    return os.path.join(settings.SYNC_STATE_DIR, f"{channel_id}.json")
+
+
+def load_watermark(channel_id: str) -> Dict:
+    """
+    Returns the persisted sync watermark for a channel:
+    {"last_ts": <newest parent ts seen>, "threads": {ts: {"latest_reply", "reply_count", "edited"}}}
+    """
+    path = _watermark_path(channel_id)
+    if not os.path.exists(path):
+        return {"last_ts": None, "threads": {}}
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, json.JSONDecodeError) as e:
+        print(f"Could not read watermark for {channel_id}, starting fresh: {e}")
+        return {"last_ts": None, "threads": {}}
+
+
+def save_watermark(channel_id: str, watermark: Dict, oldest_ts: float = 0.0):
+    """Atomically writes a channel's watermark, dropping threads that fell out of the window."""
+    watermark["threads"] = {
+        ts: state for ts, state in watermark["threads"].items() if float(ts) >= oldest_ts
+    }
+    path = _watermark_path(channel_id)
+    with _state_lock:
+        os.makedirs(settings.SYNC_STATE_DIR, exist_ok=True)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(watermark, f)
+        os.replace(tmp_path, path)
+
+
+def thread_state(msg: Dict) -> Dict:
+    """The parts of a conversations.history parent that change when a thread gets new replies or its parent is edited."""
+    return {
+        "latest_reply": msg.get("latest_reply"),
+        "reply_count": msg.get("reply_count", 0),
+        "edited": msg.get("edited", {}).get("ts")
+    }
+
+
+def is_unchanged(watermark: Dict, msg: Dict) -> bool:
+    """True if this parent was already stored and its thread has had no new replies or edits since."""
+    last_ts = watermark.get("last_ts")
+    if not last_ts or float(msg["ts"]) > float(last_ts):
+        return False
+    return watermark["threads"].get(msg["ts"]) == thread_state(msg)
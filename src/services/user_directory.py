@@ -0,0 +1,137 @@
+# src/services/user_directory.py
+import json
+import os
+import threading
+import time
+from typing import Dict, List
+
+import requests
+
+from ..config import settings
+from .http_client import get_session, slack_api_url
+from .slack_rate_limiter import slack_rate_limiter
+
+# --- Caching (Module-level for a single worker process) ---
+# These dicts are updated in place so modules that imported them keep seeing fresh data.
+user_cache: Dict[str, str] = {}
+usergroup_cache: Dict[str, str] = {}
+
+_directory_lock = threading.Lock()
+_loaded_at = 0.0
+
+
+def _display_name(user: Dict) -> str:
+    return user.get("real_name") or user.get("profile", {}).get("real_name") or user.get("name", user["id"])
+
+
+def _fetch_all(api_method: str, items_key: str, headers: Dict, params: Dict = None) -> List[Dict]:
+    """Fetches every page of a cursor-paginated Slack list method."""
+    items, cursor = [], None
+    while True:
+        request_params = {**(params or {}), "limit": 200}
+        if cursor:
+            request_params["cursor"] = cursor
+        slack_rate_limiter.acquire(api_method)
+        resp = get_session().get(slack_api_url(api_method), headers=headers, params=request_params)
+        if resp.status_code == 429:
+            slack_rate_limiter.pause(api_method, int(resp.headers.get("Retry-After", "20")))
+            continue
+        resp.raise_for_status()
+        data = resp.json()
+        if not data.get("ok"):
+            raise Exception(f"Error from {api_method}: {data.get('error', 'unknown')}")
+        items.extend(data.get(items_key, []))
+        cursor = data.get("response_metadata", {}).get("next_cursor")
+        if not cursor:
+            return items
+
+
+def _read_snapshot() -> Dict:
+    if not os.path.exists(settings.SLACK_DIRECTORY_PATH):
+        return {}
+    try:
+        with open(settings.SLACK_DIRECTORY_PATH, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, json.JSONDecodeError) as e:
+        print(f"Could not read the Slack directory snapshot: {e}")
+        return {}
+
+
+def _write_snapshot():
+    tmp_path = f"{settings.SLACK_DIRECTORY_PATH}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump({"loaded_at": _loaded_at, "users": user_cache, "usergroups": usergroup_cache}, f)
+    os.replace(tmp_path, settings.SLACK_DIRECTORY_PATH)
+
+
+def _replace_contents(cache: Dict, fresh: Dict):
+    # Update before pruning so concurrent readers never see an empty directory.
+    cache.update(fresh)
+    for stale_id in set(cache) - set(fresh):
+        cache.pop(stale_id, None)
+
+
+def _apply(loaded_at: float, users: Dict, usergroups: Dict):
+    global _loaded_at
+    _replace_contents(user_cache, users)
+    _replace_contents(usergroup_cache, usergroups)
+    _loaded_at = loaded_at
+
+
+def load_directory(headers: Dict, force: bool = False):
+    """
+    Makes sure the user and usergroup directories are loaded and no older than
+    SLACK_DIRECTORY_REFRESH_HOURS: from memory, then the on-disk snapshot, and
+    only then with a bulk users.list / usergroups.list refresh.
+    """
+    max_age = settings.SLACK_DIRECTORY_REFRESH_HOURS * 3600
+    with _directory_lock:
+        if not force and user_cache and time.time() - _loaded_at < max_age:
+            return
+
+        snapshot = _read_snapshot()
+        if not force and snapshot and time.time() - snapshot.get("loaded_at", 0) < max_age:
+            _apply(snapshot["loaded_at"], snapshot.get("users", {}), snapshot.get("usergroups", {}))
+            print(f"Loaded {len(user_cache)} users and {len(usergroup_cache)} usergroups from the directory snapshot.")
+            return
+
+        try:
+            print("Refreshing the Slack user directory...")
+            members = _fetch_all("users.list", "members", headers)
+            # usergroups.list isn't paginated; the limit param is simply ignored.
+            groups = _fetch_all("usergroups.list", "usergroups", headers)
+        except Exception as e:
+            print(f"Error refreshing the Slack user directory: {e}")
+            # A stale directory is far better than none; unknown IDs still fall back to users.info.
+            if snapshot and not user_cache:
+                _apply(snapshot.get("loaded_at", 0), snapshot.get("users", {}), snapshot.get("usergroups", {}))
+            return
+
+        _apply(
+            time.time(),
+            {m["id"]: _display_name(m) for m in members},
+            {g["id"]: g["handle"] for g in groups}
+        )
+        _write_snapshot()
+        print(f"Loaded {len(user_cache)} users and {len(usergroup_cache)} usergroups from Slack.")
+
+
+def lookup_user(user_id: str, headers: Dict) -> str:
+    """
+    Returns a user's display name: an O(1) directory lookup, falling back to a
+    single users.info call for users that joined since the last refresh.
+    """
+    if user_id in user_cache:
+        return user_cache[user_id]
+    try:
+        slack_rate_limiter.acquire("users.info")
+        resp = get_session().get(slack_api_url("users.info"), headers=headers, params={"user": user_id})
+        resp.raise_for_status()
+        data = resp.json()
+        if data.get("ok"):
+            name = _display_name(data["user"])
+            user_cache[user_id] = name
+            return name
+    except requests.exceptions.RequestException as e:
+        print(f"Error fetching user {user_id}: {e}")
+    return user_id